@@ -27,13 +27,48 @@ def create_app(config_class=Config):
     flask_app.config.from_object(config_class)
 
     db.init_app(flask_app)
+    db_uri = flask_app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if db_uri.startswith('sqlite'):
+        # SQLite only honours ON DELETE CASCADE with foreign keys switched on
+        with flask_app.app_context():
+            _enable_sqlite_foreign_keys(db.engine)
+    elif db_uri.startswith('postgres'):
+        # Pooled connections are shared by greenlets; queries must yield
+        _make_psycopg2_cooperative()
+    if flask_app.config.get('METRICS_ENABLED', True):
+        # Per-endpoint latency and SQL cost, served on /metrics
+        from app.services.metrics.http import init_request_metrics
+        with flask_app.app_context():
+            init_request_metrics(flask_app, db.engine)
     bcrypt.init_app(flask_app)
     login_manager.init_app(flask_app)
     migrate.init_app(flask_app, db)
     CORS(flask_app, supports_credentials=True, origins=allowed_origins)
 
-    # Initialize Socket.IO after app is created
-    socketio.init_app(flask_app, cors_allowed_origins=allowed_origins)
+    # Initialize Socket.IO after app is created. With a message queue, emits
+    # fan out to sockets held by every worker/node sharing that queue; with
+    # REALTIME_GATEWAY_IPC they are forwarded to the asyncio gateway process.
+    from app.services.realtime.pubsub import create_client_manager
+    from app.services.realtime.store import init_store
+    message_queue = flask_app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    init_store(flask_app.config.get('PRESENCE_STORE_URL') or message_queue)
+    # Snapshot caches are keyed by game id, which is only unique per database
+    from app.services.games.state import reset_state_cache
+    from app.services.games.codes import reset_code_allocators
+    from app.services.games.encoding import socketio_serializer_options
+    from app.services.realtime.compression import socketio_compression_options
+    reset_state_cache()
+    reset_code_allocators()
+    socketio.init_app(
+        flask_app,
+        cors_allowed_origins=allowed_origins,
+        client_manager=create_client_manager(flask_app.config.get('REALTIME_GATEWAY_IPC') or message_queue),
+        **socketio_serializer_options(flask_app),
+        **socketio_compression_options(flask_app),
+    )
+    if flask_app.config.get('METRICS_ENABLED', True):
+        from app.services.metrics.realtime import instrument_socketio
+        instrument_socketio(socketio)
 
     # Import and register blueprints here
     from app.main import main
@@ -43,6 +78,10 @@ def create_app(config_class=Config):
     # Mount game routes under /api to match frontend API client
     flask_app.register_blueprint(games, url_prefix='/api/games')
 
+    if flask_app.config.get('METRICS_ENABLED', True):
+        from app.api.metrics import metrics
+        flask_app.register_blueprint(metrics)
+
     # Register Socket.IO event handlers
     # Importing here ensures the handlers bind to the initialized socketio instance
     # Use importlib to avoid shadowing the local Flask app variable name
@@ -80,4 +119,68 @@ def create_app(config_class=Config):
 
     flask_app.cli.add_command(db_reset_command)
 
-    return flask_app
\ No newline at end of file
+    # Re-arm stage timers and start the game reaper once the process actually
+    # serves traffic, so CLI commands, migrations and the dev reloader's
+    # watcher process never run them
+    if not flask_app.config.get('TESTING'):
+        started = []
+
+        @flask_app.before_request
+        def _start_background_services_once():
+            if started:
+                return
+            started.append(True)
+            if flask_app.config.get('REHYDRATE_TIMERS_ON_START'):
+                from app.services.games.scheduler import rehydrate_stage_timers
+                socketio.start_background_task(
+                    rehydrate_stage_timers,
+                    flask_app,
+                    int(flask_app.config.get('TIMER_REHYDRATE_CONCURRENCY', 8)),
+                )
+            from app.services.games.teardown import start_game_reaper
+            start_game_reaper(flask_app)
+
+    return flask_app
+
+
+def _enable_sqlite_foreign_keys(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def _make_psycopg2_cooperative():
+    """Under gevent, make psycopg2 wait for the server through the hub.
+
+    Without a wait callback a query blocks the whole worker (every greenlet)
+    until Postgres answers. This is the callback psycogreen installs.
+    """
+    try:
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            return
+        import psycopg2
+        from psycopg2 import extensions
+        from gevent.socket import wait_read, wait_write
+    except ImportError:
+        return
+    if extensions.get_wait_callback() is not None:
+        return
+
+    def _gevent_wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(_gevent_wait_callback)
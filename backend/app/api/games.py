@@ -1,55 +1,50 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, abort
+from sqlalchemy.exc import IntegrityError
 from app import db, socketio
-from app.models import Game, Player, Story, Guess
+from app.models import Game, Player, Story, Guess, RoundResult, generate_game_code
+import hmac
 import json
 import time
-from typing import Set, Tuple
-from app.services.games.scoring import score_current_round as svc_score_current_round
-from app.services.games.scheduler import schedule_stage_timer as svc_schedule_stage_timer
-from collections import defaultdict
+from app.services.games.audience import game_rooms
+from app.services.games.compression import (
+    coded_etag,
+    compress_body,
+    compress_response,
+    negotiate_content_coding,
+    worth_compressing,
+)
+from app.services.games.encoding import MSGPACK_MIMETYPES, encode_state, negotiate_state_format
+from app.services.games.guesses import record_guess
+from app.services.games.scheduler import arm_stage_timer, cancel_stage_timer, stage_deadline
+from app.services.games.snapshot import (
+    add_replay_vote,
+    build_state_payload,
+    clear_replay_votes,
+    load_game_for_snapshot,
+    replay_voter_ids,
+    resolve_state_fields,
+    state_view_key,
+)
+from app.services.games.teardown import end_session
+from app.services.games.transitions import advance_stage
+from app.services.games.state import (
+    bump_state_version,
+    cache_snapshot,
+    emit_state_update,
+    forget_game,
+    get_cached_snapshot,
+    known_state_version,
+    loaded_state_version,
+    note_state_version,
+    state_etag,
+)
 
 
 games = Blueprint('games', __name__)
+# gzip/brotli for large JSON bodies (GET /state compresses and caches its own)
+games.after_request(compress_response)
 
-# Centralized stage timer scheduler (runtime-only; disabled in tests)
-_scheduled_stage_keys: Set[Tuple[int, str, int]] = set()
 _last_controller_action: dict[str, float] = {}
-_replay_votes: dict[str, set[int]] = defaultdict(set)  # keyed by game_code -> set of player ids
-
-def _score_current_round(game: Game) -> None:
-    svc_score_current_round(game)
-
-def _set_next_round_or_finish(game: Game) -> None:
-    prev_round = int(game.current_round or 0)
-    if game.current_round < (game.total_rounds or 0):
-        game.current_round += 1
-        game.stage = 'round_intro'
-        try:
-            order = json.loads(game.play_order or '[]')
-        except Exception:
-            order = []
-        idx = (game.current_round - 1) if game.current_round else 0
-        next_author_id = order[idx] if 0 <= idx < len(order) else None
-        next_story = Story.query.filter_by(game_id=game.id, author_id=next_author_id).first() if next_author_id else None
-        game.current_story_id = next_story.id if next_story else None
-        try:
-            current_app.logger.info(f"[next_round] game={game.id} advance round {prev_round} -> {game.current_round} author={next_author_id}")
-        except Exception:
-            pass
-    else:
-        game.status = 'finished'
-        game.stage = 'finished'
-        try:
-            current_app.logger.info(f"[finish] game={game.id} finished at round={prev_round}")
-        except Exception:
-            pass
-    db.session.add(game)
-    db.session.commit()
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-
-def _schedule_stage_timer(app, game_id: int) -> None:
-    svc_schedule_stage_timer(app, game_id)
-
 
 @games.route('/create', methods=['POST'])
 def create_game_unauthed():
@@ -64,7 +59,20 @@ def create_game_unauthed():
     if spp is not None and 1 <= spp <= 3:
         new_game.stories_per_player = spp
     db.session.add(new_game)
-    db.session.commit()
+    for _ in range(3):
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another worker took this code; it stays marked used in our pool
+            db.session.rollback()
+            new_game.game_code = generate_game_code()
+            db.session.add(new_game)
+    else:
+        return jsonify({'error': 'Could not allocate a game code'}), 503
+    # A code may be reused after a session ends; start tracking the new game
+    forget_game(new_game.game_code)
+    note_state_version(new_game)
     return jsonify({
         'message': 'New game created!',
         'game_code': new_game.game_code
@@ -88,7 +96,10 @@ def join_game_unauthed():
 
     new_player = Player(name=name, game_id=game.id)
     db.session.add(new_player)
+    bump_state_version(game)
+    db.session.add(game)
     db.session.commit()
+    emit_state_update(game)
 
     return jsonify(new_player.to_dict()), 201
 
@@ -125,36 +136,111 @@ def submit_story(game_code):
     authored_count_after = authored_count + 1
     player.has_submitted_story = authored_count_after >= max_per_player
     db.session.add(player)
+    bump_state_version(game)
+    db.session.add(game)
 
     db.session.commit()
 
     # Emit live update to all clients in the game room
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
+    emit_state_update(game)
 
     return jsonify({'message': 'Story submitted successfully'}), 201
 
 
 @games.route('/<string:game_code>/state', methods=['GET'])
 def get_game_state(game_code):
-    game = Game.query.filter_by(game_code=game_code.upper()).first_or_404()
-    # Include stage durations so clients can show countdowns
+    # Optional projection: ?role=player|controller|display and/or ?fields=a,b
     try:
-        cfg = current_app.config
-        durations = {
-            'round_intro': int(cfg.get('ROUND_INTRO_DURATION_SEC', 5)),
-            'guessing': int(cfg.get('GUESS_DURATION_SEC', 20)),
-            'scoreboard': int(cfg.get('SCOREBOARD_DURATION_SEC', 6)),
-        }
-    except Exception:
-        durations = {'round_intro': 5, 'guessing': 20, 'scoreboard': 6}
-    payload = game.to_dict()
-    payload['durations'] = durations
-    # Attach replay votes count for clients on final screen
+        fields = resolve_state_fields(request.args.get('role'), request.args.get('fields'))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    # JSON unless the client asks for MessagePack; each encoding is cached separately
+    fmt = negotiate_state_format(request.accept_mimetypes)
+    view = state_view_key(fields)
+    if fmt != 'json':
+        view = f"{view};{fmt}"
+    coding = negotiate_content_coding(request.accept_encodings)
+
+    # Fast path: the latest committed version is known and its body is cached
+    known = known_state_version(game_code)
+    if known:
+        etag = state_etag(*known, view)
+        held = _held_etag(etag, coding)
+        if held:
+            return _not_modified(held)
+        body = get_cached_snapshot(*known, view)
+        if body is not None:
+            return _state_response(*known, view, body, etag, fmt, coding)
+
+    game = load_game_for_snapshot(game_code, fields)
+    if not game:
+        abort(404)
+    version = loaded_state_version(game)
+    etag = state_etag(game.id, version, view)
+    held = _held_etag(etag, coding)
+    if held:
+        return _not_modified(held)
+    body, _mimetype = encode_state(build_state_payload(game, fields), fmt)
+    cache_snapshot(game.id, version, body, view)
+    return _state_response(game.id, version, view, body, etag, fmt, coding)
+
+
+def _held_etag(etag: str, coding):
+    """Which of our ETags (plain or compressed) the client revalidates, if any."""
+    candidates = (etag, coded_etag(etag, coding)) if coding else (etag,)
+    return next((c for c in candidates if request.if_none_match.contains(c)), None)
+
+
+def _state_response(game_id: int, version: int, view: str, body: bytes, etag: str, fmt: str = 'json', coding=None):
+    if coding and worth_compressing(body):
+        # Compress each snapshot once per coding, not once per poll
+        packed = get_cached_snapshot(game_id, version, f"{view};{coding}")
+        if packed is None:
+            packed = compress_body(body, coding)
+            cache_snapshot(game_id, version, packed, f"{view};{coding}")
+        body, etag = packed, coded_etag(etag, coding)
+    else:
+        coding = None
+    mimetype = MSGPACK_MIMETYPES[0] if fmt == 'msgpack' else 'application/json'
+    resp = current_app.response_class(body, mimetype=mimetype)
+    if coding:
+        resp.headers['Content-Encoding'] = coding
+    resp.set_etag(etag)
+    # Always revalidate; unchanged snapshots come back as cheap 304s
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.vary.update(('Accept', 'Accept-Encoding'))
+    return resp
+
+
+def _not_modified(etag: str):
+    resp = current_app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.vary.update(('Accept', 'Accept-Encoding'))
+    return resp
+
+
+@games.route('/<string:game_code>/rounds', methods=['GET'])
+def list_round_results(game_code):
+    """Page through a game's round summaries: ?after=<cursor>&limit=<n>."""
+    game = Game.query.filter_by(game_code=game_code.upper()).first_or_404()
     try:
-        payload['replay_votes'] = len(_replay_votes.get(game.game_code, set()))
-    except Exception:
-        payload['replay_votes'] = 0
-    return jsonify(payload)
+        after = int(request.args.get('after', 0))
+        limit = max(1, min(100, int(request.args.get('limit', 20))))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'after and limit must be integers'}), 400
+    rows = (
+        RoundResult.query.options(db.joinedload(RoundResult.guesses))
+        .filter(RoundResult.game_id == game.id, RoundResult.id > after)
+        .order_by(RoundResult.id)
+        .limit(limit + 1)
+        .all()
+    )
+    page = rows[:limit]
+    return jsonify({
+        'rounds': [r.to_dict() for r in page],
+        'next_cursor': page[-1].id if len(rows) > limit else None,
+    })
 
 
 @games.route('/<string:game_code>/start', methods=['POST'])
@@ -215,11 +301,14 @@ def start_game(game_code):
     first_author_id = order[0]
     first_story = Story.query.filter_by(game_id=game.id, author_id=first_author_id, is_read=False).first()
     game.current_story_id = first_story.id if first_story else None
+    app = current_app._get_current_object()
+    game.stage_deadline = stage_deadline(app, game.stage, time.time())
+    bump_state_version(game)
     db.session.add(game)
     db.session.commit()
 
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-    _schedule_stage_timer(current_app._get_current_object(), game.id)
+    emit_state_update(game)
+    arm_stage_timer(app, game)
     return jsonify(game.to_dict())
 
 
@@ -253,92 +342,10 @@ def advance_round(game_code):
     if controller_id != expected_controller:
         return jsonify({'error': 'Only the controller may advance'}), 403
 
-    # Stage pipeline
-    if game.stage == 'round_intro':
-        # Enter guessing phase
-        game.stage = 'guessing'
-        db.session.add(game)
-        db.session.commit()
-        socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-        _schedule_stage_timer(current_app._get_current_object(), game.id)
-        return jsonify(game.to_dict())
-
-    # guessing -> scoreboard OR scoreboard -> next round/finished
-    if game.current_round is None or game.total_rounds is None:
+    # Stage pipeline: round_intro -> guessing -> scoreboard -> next round/finished
+    if game.stage != 'round_intro' and (game.current_round is None or game.total_rounds is None):
         return jsonify({'error': 'Rounds not initialized'}), 400
-    if game.stage == 'guessing':
-        # Score this round
-        if game.current_story_id:
-            story = Story.query.get(game.current_story_id)
-            author = Player.query.get(story.author_id) if story else None
-            if author:
-                guesses = Guess.query.filter_by(story_id=game.current_story_id).all()
-                # Points: +1 to each correct guesser; +1 to author for each non-author who didn't guess author (wrong or no guess)
-                players = Player.query.filter_by(game_id=game.id).all()
-                non_author_ids = {p.id for p in players if p.id != author.id}
-                guessed_by_ids = set()
-                for g in guesses:
-                    guesser = Player.query.get(g.guesser_id)
-                    if not guesser:
-                        continue
-                    guessed_by_ids.add(guesser.id)
-                    if g.guessed_player_id == author.id:
-                        guesser.score += 1
-                        db.session.add(guesser)
-                # Everyone who did not guess the author (either wrong guess or no guess) gives +1 to author
-                wrong_or_missing_ids = non_author_ids - {g.guesser_id for g in guesses if g.guessed_player_id == author.id}
-                if wrong_or_missing_ids:
-                    author.score += len(wrong_or_missing_ids)
-                    db.session.add(author)
-                db.session.commit()
-        # Mark story as read and decide next stage: more stories for this author => round_intro, else scoreboard
-        next_stage = 'scoreboard'
-        next_story_id = None
-        if game.current_story_id:
-            st = Story.query.get(game.current_story_id)
-            if st and not st.is_read:
-                st.is_read = True
-                db.session.add(st)
-                db.session.commit()
-            # Determine if author has remaining unread stories for multi-story rounds
-            if st:
-                spp = int(game.stories_per_player or 1)
-                unread = Story.query.filter_by(game_id=game.id, author_id=st.author_id, is_read=False).count()
-                if unread > 0 and spp > 1:
-                    next_stage = 'round_intro'
-                    next_story = Story.query.filter_by(game_id=game.id, author_id=st.author_id, is_read=False).first()
-                    next_story_id = next_story.id if next_story else None
-        game.stage = next_stage
-        if next_stage == 'round_intro' and next_story_id:
-            game.current_story_id = next_story_id
-        db.session.add(game)
-        db.session.commit()
-        socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-        _schedule_stage_timer(current_app._get_current_object(), game.id)
-        return jsonify(game.to_dict())
-    if game.current_round < game.total_rounds:
-        game.current_round += 1
-        game.stage = 'round_intro'
-        # Update current story to next author per play_order
-        try:
-            order = json.loads(game.play_order or '[]')
-        except Exception:
-            order = []
-        idx = (game.current_round - 1) if game.current_round else 0
-        next_author_id = order[idx] if 0 <= idx < len(order) else None
-        next_story = Story.query.filter_by(game_id=game.id, author_id=next_author_id, is_read=False).first() if next_author_id else None
-        game.current_story_id = next_story.id if next_story else None
-        db.session.add(game)
-        db.session.commit()
-        socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-        _schedule_stage_timer(current_app._get_current_object(), game.id)
-        return jsonify(game.to_dict())
-
-    game.status = 'finished'
-    game.stage = 'finished'
-    db.session.add(game)
-    db.session.commit()
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
+    advance_stage(current_app._get_current_object(), game)
     return jsonify(game.to_dict())
 
 @games.route('/<string:game_code>/guess', methods=['POST'])
@@ -350,62 +357,50 @@ def submit_guess(game_code):
     game = Game.query.filter_by(game_code=game_code.upper()).first_or_404()
     if game.status != 'in_progress' or game.stage != 'guessing':
         return jsonify({'error': 'Not accepting guesses at this time'}), 400
-    players = Player.query.filter_by(game_id=game.id).all()
     guesser = Player.query.filter_by(id=guesser_id, game_id=game.id).first()
     guessed = Player.query.filter_by(id=guessed_player_id, game_id=game.id).first()
     if not (guesser and guessed):
         return jsonify({'error': 'Invalid player(s)'}), 400
+    author_id = game.current_story.author_id if game.current_story else None
     # Cannot guess author
-    if game.current_story and game.current_story.author_id == guesser.id:
+    if author_id == guesser.id:
         return jsonify({'error': 'Author cannot guess'}), 400
     # One guess per player per round
     if Guess.query.filter_by(story_id=game.current_story_id, guesser_id=guesser.id).first():
         return jsonify({'error': 'Already guessed this round'}), 400
-    new_guess = Guess(story_id=game.current_story_id, guesser_id=guesser.id, guessed_player_id=guessed.id)
+    story_id = game.current_story_id
+    new_guess = Guess(story_id=story_id, guesser_id=guesser.id, guessed_player_id=guessed.id)
     db.session.add(new_guess)
-    db.session.commit()
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-    # Early auto-advance: if all eligible guesses submitted, move to scoreboard via scheduler
+    bump_state_version(game)
+    db.session.add(game)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent guess from the same player
+        db.session.rollback()
+        return jsonify({'error': 'Already guessed this round'}), 400
+    emit_state_update(game)
+    # Early auto-advance: once all eligible guesses are in, run the guessing transition now
     # Disabled during tests (to keep deterministic control flow expectations)
     try:
-        if (not current_app.config.get('TESTING')) and game.stage == 'guessing' and game.current_story_id:
-            # Count unique non-author guesses
-            from app.models import Guess as GuessModel
-            author_id = game.current_story.author_id if game.current_story else None
-            non_author_ids = {p.id for p in players if p.id != author_id}
-            guessed_ids = {g.guesser_id for g in GuessModel.query.filter_by(story_id=game.current_story_id).all()}
-            if non_author_ids and non_author_ids.issubset(guessed_ids):
-                gnow = Game.query.filter_by(id=game.id).first()
-                if gnow and gnow.status == 'in_progress' and gnow.stage == 'guessing':
-                    _score_current_round(gnow)
-                    # Determine continuation within author set or scoreboard
-                    next_stage = 'scoreboard'
-                    next_story_id = None
-                    if gnow.current_story_id:
-                        st = Story.query.get(gnow.current_story_id)
-                        if st and not st.is_read:
-                            st.is_read = True
-                            db.session.add(st)
-                            db.session.commit()
-                        if st:
-                            unread = Story.query.filter_by(game_id=gnow.id, author_id=st.author_id, is_read=False).count()
-                            spp = int(gnow.stories_per_player or 1)
-                            if unread > 0 and spp > 1:
-                                next_stage = 'round_intro'
-                                next_story = Story.query.filter_by(game_id=gnow.id, author_id=st.author_id, is_read=False).first()
-                                next_story_id = next_story.id if next_story else None
-                    gnow.stage = next_stage
-                    if next_stage == 'round_intro' and next_story_id:
-                        gnow.current_story_id = next_story_id
-                    db.session.add(gnow)
-                    db.session.commit()
-                    socketio.emit('state_update', {'game_code': gnow.game_code}, to=f"game:{gnow.game_code}", namespace='/ws')
-                    _schedule_stage_timer(current_app._get_current_object(), gnow.id)
+        if (not current_app.config.get('TESTING')) and author_id is not None:
+            if record_guess(game, story_id, author_id, guesser.id) and game.current_story_id == story_id:
+                advance_stage(current_app._get_current_object(), game, 'guessing', game.current_round)
     except Exception:
-        pass
+        db.session.rollback()
     return jsonify({'message': 'Guess submitted'})
 
 
+@games.route('/<string:game_code>/session/end', methods=['POST'])
+def end_session_from_gateway(game_code):
+    """Internal: the realtime gateway ends a session whose owners all left."""
+    token = current_app.config.get('REALTIME_GATEWAY_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Gateway-Token', ''), token):
+        abort(404)
+    end_session(game_code.upper())
+    return jsonify({'message': 'Session ended'})
+
+
 @games.route('/<string:game_code>/replay/vote', methods=['POST'])
 def vote_replay(game_code):
     data = request.get_json() or {}
@@ -415,9 +410,13 @@ def vote_replay(game_code):
         return jsonify({'error': 'Replay voting only available after game finished'}), 400
     if not Player.query.filter_by(id=player_id, game_id=game.id).first():
         return jsonify({'error': 'Invalid player'}), 400
-    _replay_votes.setdefault(game.game_code, set()).add(int(player_id))
-    socketio.emit('state_update', {'game_code': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
-    return jsonify({'ok': True, 'votes': len(_replay_votes.get(game.game_code, set()))})
+    votes = add_replay_vote(game.game_code, player_id)
+    # Vote counts are part of the state payload
+    bump_state_version(game)
+    db.session.add(game)
+    db.session.commit()
+    emit_state_update(game)
+    return jsonify({'ok': True, 'votes': votes})
 
 
 @games.route('/<string:game_code>/replay/start', methods=['POST'])
@@ -434,41 +433,38 @@ def start_replay(game_code):
     if controller_id != expected_controller:
         return jsonify({'error': 'Only the controller may start replay'}), 403
     # Require unanimous consent of players who finished the game
-    voted = _replay_votes.get(game.game_code, set())
+    voted = replay_voter_ids(game.game_code)
     player_ids = {p.id for p in players}
     if not player_ids.issubset(voted):
         return jsonify({'error': 'Not all players voted replay'}), 400
-    # Reset existing game in-place to lobby with same settings
-    # Cleanup dependent rows
+    # Reset existing game in-place to lobby with same settings, in one transaction.
+    # Deleting the stories cascades to their guesses and nulls current_story_id;
+    # deleting round summaries cascades to their guesses.
+    cancel_stage_timer(game.id)
     try:
-        # Clear current story pointer to avoid FK issues
-        if getattr(game, 'current_story_id', None):
-            game.current_story_id = None
-            db.session.add(game)
-            db.session.commit()
-        # Delete guesses and stories
-        for st in Story.query.filter_by(game_id=game.id).all():
-            Guess.query.filter_by(story_id=st.id).delete()
-        Story.query.filter_by(game_id=game.id).delete()
+        Story.query.filter_by(game_id=game.id).delete(synchronize_session=False)
+        RoundResult.delete_for_game(game.id)
+        Player.query.filter_by(game_id=game.id).update(
+            {'has_submitted_story': False, 'score': 0}, synchronize_session=False
+        )
+        game.status = 'lobby'
+        game.stage = None
+        game.current_story_id = None
+        game.current_round = None
+        game.total_rounds = None
+        game.play_order = None
+        game.stage_deadline = None
+        game.round_history = None
+        bump_state_version(game)
+        db.session.add(game)
         db.session.commit()
-    except Exception:
+    except Exception as exc:
         db.session.rollback()
-    # Reset players and round scaffolding
-    for p in Player.query.filter_by(game_id=game.id).all():
-        p.has_submitted_story = False
-        p.score = 0
-        db.session.add(p)
-    game.status = 'lobby'
-    game.stage = None
-    game.current_round = None
-    game.total_rounds = None
-    game.play_order = None
-    game.stage_deadline = None
-    game.round_history = json.dumps([])
-    db.session.add(game)
-    db.session.commit()
+        current_app.logger.exception(f"[replay] game={game.id} reset failed: {exc}")
+        return jsonify({'error': 'Could not reset game'}), 500
+    note_state_version(game)
     # Notify all clients in the same room; reuse same code
-    socketio.emit('replay_started', {'from': game.game_code, 'to': game.game_code}, to=f"game:{game.game_code}", namespace='/ws')
+    socketio.emit('replay_started', {'from': game.game_code, 'to': game.game_code}, to=game_rooms(game.game_code), namespace='/ws')
     # Clear votes
-    _replay_votes.pop(game.game_code, None)
+    clear_replay_votes(game.game_code)
     return jsonify({'game_code': game.game_code})
@@ -0,0 +1,16 @@
+import hmac
+
+from flask import Blueprint, abort, current_app, request
+
+from app.services.metrics.registry import registry
+
+metrics = Blueprint('metrics', __name__)
+
+
+@metrics.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """This process's metrics in the Prometheus text format."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(404)
+    return current_app.response_class(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -2,8 +2,7 @@ from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
-import string
-import random
+import time
 
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
@@ -27,12 +26,12 @@ class Player(db.Model):
     __tablename__ = 'player'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
-    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=False, index=True)
     score = db.Column(db.Integer, default=0)
     has_submitted_story = db.Column(db.Boolean, default=False, nullable=False)
     team = db.Column(db.String(32), nullable=True)
     game = db.relationship('Game', back_populates='players')
-    stories = db.relationship('Story', backref='author', uselist=True)
+    stories = db.relationship('Story', backref='author', uselist=True, passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -44,68 +43,101 @@ class Player(db.Model):
             'team': self.team
         }
 
-def generate_game_code(length=4):
-    """Generate a unique, short game code."""
-    while True:
-        code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-        if not Game.query.filter_by(game_code=code).first():
-            return code
+def generate_game_code(length=None):
+    """Allocate a free game code (GAME_CODE_LENGTH characters by default)."""
+    from app.services.games.codes import allocate_game_code
+    return allocate_game_code(length)
 
 class Game(db.Model):
     __tablename__ = 'game'
+    __table_args__ = (
+        # Startup timer rehydration: in-progress games with pending deadlines
+        db.Index('ix_game_status_stage_deadline', 'status', 'stage_deadline'),
+        # Reaper: finished/idle games by last activity
+        db.Index('ix_game_status_updated_at', 'status', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    game_code = db.Column(db.String(4), unique=True, index=True)
+    game_code = db.Column(db.String(8), unique=True, index=True)
     status = db.Column(db.String(64), default='lobby') # lobby, in_progress, finished
     stage = db.Column(db.String(64), nullable=True) # round_intro, guessing, scoreboard, finished (when status is finished)
     game_mode = db.Column(db.String(32), default='free_for_all')
     stories_per_player = db.Column(db.Integer, default=1)
-    players = db.relationship('Player', back_populates='game')
-    stories = db.relationship('Story', foreign_keys='Story.game_id', backref='game', lazy='dynamic')
-    current_story_id = db.Column(db.Integer, db.ForeignKey('story.id', name='fk_game_current_story_id', use_alter=True), nullable=True)
+    players = db.relationship('Player', back_populates='game', passive_deletes=True)
+    stories = db.relationship('Story', foreign_keys='Story.game_id', backref='game', lazy='dynamic', passive_deletes=True)
+    current_story_id = db.Column(db.Integer, db.ForeignKey('story.id', name='fk_game_current_story_id', use_alter=True, ondelete='SET NULL'), nullable=True)
     # Round scaffolding
     current_round = db.Column(db.Integer, nullable=True)
     total_rounds = db.Column(db.Integer, nullable=True)
     play_order = db.Column(db.Text, nullable=True)  # JSON-encoded list of player ids
     stage_deadline = db.Column(db.Float, nullable=True) # Unix timestamp seconds
-    round_history = db.Column(db.Text, nullable=True)  # JSON-encoded list of per-round summaries
+    round_history = db.Column(db.Text, nullable=True)  # legacy JSON round summaries; superseded by RoundResult
+    state_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped on every client-visible change
+    updated_at = db.Column(db.Float, nullable=True, default=time.time)  # Unix timestamp of the last version bump; drives the reaper
     
+    # Eager-loadable handle on the current story; see app.services.games.snapshot
+    current_story_ref = db.relationship('Story', foreign_keys=[current_story_id], viewonly=True)
+
     @property
     def current_story(self):
-        if self.current_story_id:
-            return Story.query.get(self.current_story_id)
-        return None
+        if not self.current_story_id:
+            return None
+        ref = self.current_story_ref
+        if ref is not None and ref.id == self.current_story_id:
+            return ref
+        # Pointer changed in-session without a refresh; identity map lookup first
+        return db.session.get(Story, self.current_story_id)
 
     def __init__(self, **kwargs):
         super(Game, self).__init__(**kwargs)
         if not self.game_code:
             self.game_code = generate_game_code()
 
-    def to_dict(self):
+    def recent_round_results(self, limit=None):
+        """Round summaries in play order; with `limit`, only the latest ones."""
+        if self.id is None:
+            return []
+        query = RoundResult.query.options(db.joinedload(RoundResult.guesses)).filter_by(game_id=self.id)
+        if limit is None:
+            return query.order_by(RoundResult.id).all()
+        return list(reversed(query.order_by(RoundResult.id.desc()).limit(limit).all()))
+
+    def to_dict(self, fields=None):
+        """Serialize the game state from memory.
+
+        Issues at most one query for the current story's guesses (plus the
+        lazy loads of players/current story when not eagerly loaded), so the
+        cost does not grow with the number of players. With `fields` (a set
+        of top-level keys) only those are built, and the guesses, players,
+        story and round queries run only when a requested field needs them.
+        """
+        def want(*keys):
+            return fields is None or any(k in fields for k in keys)
+
+        needs_guesses = want('players', 'current_story_guess_count', 'current_round_results')
+        story = self.current_story if want('current_story', 'current_round_results') else None
+        story_id = story.id if story else self.current_story_id
+        guesses = Guess.query.filter_by(story_id=story_id).all() if story_id and needs_guesses else []
+        guessed_ids = {g.guesser_id for g in guesses}
+
         players_serialized = []
-        for p in self.players:
-            pd = p.to_dict()
-            if self.current_story_id:
-                try:
-                    pd['has_guessed_current'] = Guess.query.filter_by(story_id=self.current_story_id, guesser_id=p.id).first() is not None
-                except Exception:
-                    pd['has_guessed_current'] = False
-            players_serialized.append(pd)
+        if want('players', 'winners'):
+            for p in self.players:
+                pd = p.to_dict()
+                if self.current_story_id:
+                    pd['has_guessed_current'] = p.id in guessed_ids
+                players_serialized.append(pd)
 
         # Build per-round results if story exists
         round_results = []
-        if self.current_story_id and self.current_story:
-            try:
-                author_id = self.current_story.author_id
-                for g in Guess.query.filter_by(story_id=self.current_story_id).all():
-                    round_results.append({
-                        'guesser_id': g.guesser_id,
-                        'guessed_player_id': g.guessed_player_id,
-                        'correct': (g.guessed_player_id == author_id)
-                    })
-            except Exception:
-                round_results = []
-
-        return {
+        if story and want('current_round_results'):
+            for g in guesses:
+                round_results.append({
+                    'guesser_id': g.guesser_id,
+                    'guessed_player_id': g.guessed_player_id,
+                    'correct': (g.guessed_player_id == story.author_id)
+                })
+
+        data = {
             'id': self.id,
             'game_code': self.game_code,
             'status': self.status,
@@ -113,16 +145,24 @@ class Game(db.Model):
             'game_mode': self.game_mode,
             'stories_per_player': self.stories_per_player,
             'stage_deadline': self.stage_deadline,
+            'state_version': self.state_version,
             'players': players_serialized,
-            'current_story': self.current_story.to_dict() if self.current_story else None,
-            'current_story_guess_count': Guess.query.filter_by(story_id=self.current_story_id).count() if self.current_story_id else 0,
+            'current_story': story.to_dict() if story else None,
+            'current_story_guess_count': len(guesses),
             'current_round_results': round_results,
             'current_round': self.current_round,
             'total_rounds': self.total_rounds,
             'play_order': json.loads(self.play_order) if self.play_order else None,
-            'round_history': json.loads(self.round_history) if self.round_history else [],
+            'round_history': None,
             'winners': _compute_winners(players_serialized) if self.status == 'finished' else None,
         }
+        if want('round_history'):
+            # The recap needs every round; during play only the latest is shown
+            rounds = self.recent_round_results(limit=None if self.status == 'finished' else 1)
+            data['round_history'] = [r.to_dict() for r in rounds]
+        if fields is not None:
+            data = {k: v for k, v in data.items() if k in fields}
+        return data
 
 
 def _compute_winners(players_serialized):
@@ -136,12 +176,16 @@ def _compute_winners(players_serialized):
 
 class Story(db.Model):
     __tablename__ = 'story'
+    __table_args__ = (
+        # Next-story lookups and per-author counts filter on all three
+        db.Index('ix_story_game_author_read', 'game_id', 'author_id', 'is_read'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
-    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
-    author_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
-    guesses = db.relationship('Guess', backref='story', lazy='dynamic')
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('player.id', ondelete='CASCADE'), nullable=False)
+    guesses = db.relationship('Guess', backref='story', lazy='dynamic', passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -152,10 +196,54 @@ class Story(db.Model):
 
 class Guess(db.Model):
     __tablename__ = 'guess'
+    __table_args__ = (
+        # One guess per player per story; also serves story_id-only lookups
+        db.Index('uq_guess_story_guesser', 'story_id', 'guesser_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    story_id = db.Column(db.Integer, db.ForeignKey('story.id'), nullable=False)
-    guesser_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
-    guessed_player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    story_id = db.Column(db.Integer, db.ForeignKey('story.id', ondelete='CASCADE'), nullable=False)
+    guesser_id = db.Column(db.Integer, db.ForeignKey('player.id', ondelete='CASCADE'), nullable=False)
+    guessed_player_id = db.Column(db.Integer, db.ForeignKey('player.id', ondelete='CASCADE'), nullable=False)
 
     guesser = db.relationship('Player', foreign_keys=[guesser_id])
-    guessed_player = db.relationship('Player', foreign_keys=[guessed_player_id]) 
\ No newline at end of file
+    guessed_player = db.relationship('Player', foreign_keys=[guessed_player_id]) 
+
+
+class RoundResult(db.Model):
+    """Summary of one scored story: appended once per round by scoring."""
+    __tablename__ = 'round_result'
+    __table_args__ = (
+        db.Index('ix_round_result_game_id_id', 'game_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id', ondelete='CASCADE'), nullable=False)
+    round = db.Column(db.Integer, nullable=False)
+    # Historical snapshot; stories/players may be reset by a replay
+    story_id = db.Column(db.Integer, nullable=True)
+    author_id = db.Column(db.Integer, nullable=True)
+    author_points_awarded = db.Column(db.Integer, nullable=False, default=0)
+    guesses = db.relationship('RoundGuess', backref='round_result', order_by='RoundGuess.id', passive_deletes=True)
+
+    @classmethod
+    def delete_for_game(cls, game_id):
+        """Bulk-delete a game's round summaries; their guesses cascade (caller commits)."""
+        cls.query.filter(cls.game_id == game_id).delete(synchronize_session=False)
+
+    def to_dict(self):
+        return {
+            'round': self.round,
+            'story_id': self.story_id,
+            'author_id': self.author_id,
+            'guesses': [{'guesser_id': g.guesser_id, 'guessed_player_id': g.guessed_player_id} for g in self.guesses],
+            'correct_guessers': [g.guesser_id for g in self.guesses if g.correct],
+            'author_points_awarded': self.author_points_awarded,
+        }
+
+
+class RoundGuess(db.Model):
+    __tablename__ = 'round_guess'
+    id = db.Column(db.Integer, primary_key=True)
+    round_result_id = db.Column(db.Integer, db.ForeignKey('round_result.id', ondelete='CASCADE'), nullable=False, index=True)
+    guesser_id = db.Column(db.Integer, nullable=False)
+    guessed_player_id = db.Column(db.Integer, nullable=False)
+    correct = db.Column(db.Boolean, nullable=False, default=False)
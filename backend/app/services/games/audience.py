@@ -0,0 +1,63 @@
+"""Spectators: sockets that watch a game without a Player row.
+
+A spectator sends `join_game` with `role: 'spectator'` and lands in the
+game's audience room (`game:<code>:audience`), not the players' room, so it
+never receives `state_update` patches and never refetches over HTTP.
+Instead each state change is broadcast once to the whole audience as an
+`audience_state` frame: the serialized full state (the `GET /state` body),
+which `emit_state_update` has already built and cached for that version.
+The frame is sent as a binary attachment, so Socket.IO does not re-encode
+it; clients `JSON.parse` the decoded bytes. The work per state change is
+the same for one viewer or thousands.
+
+Viewer counts are counters in the shared store, adjusted on join and
+leave; nothing ever walks the audience.
+"""
+
+from typing import Optional
+
+from flask import current_app
+
+from app import socketio
+from app.services.realtime.store import get_store
+
+AUDIENCE_EVENT = 'audience_state'
+SPECTATOR_ROLE = 'spectator'
+
+# Spectators connected to this process
+local_viewers = 0
+
+
+def audience_room(game_code: str) -> str:
+    return f"game:{game_code}:audience"
+
+
+def game_rooms(game_code: str) -> list:
+    """Players' and audience rooms, for events everyone watching needs."""
+    return [f"game:{game_code}", audience_room(game_code)]
+
+
+def viewer_count(game_code: str) -> int:
+    return get_store().get_int(f"viewers:{game_code}")
+
+
+def add_viewer(game_code: str) -> int:
+    global local_viewers
+    local_viewers += 1
+    return get_store().incr(f"viewers:{game_code}")
+
+
+def remove_viewer(game_code: str) -> int:
+    global local_viewers
+    local_viewers = max(0, local_viewers - 1)
+    return get_store().decr(f"viewers:{game_code}")
+
+
+def broadcast_audience_frame(game_code: str, body: Optional[bytes]) -> None:
+    """Send one pre-serialized state frame to every spectator of a game."""
+    if not body:
+        return
+    # Behind the realtime gateway the sockets (and their count) live there
+    if not current_app.config.get('REALTIME_GATEWAY_IPC') and viewer_count(game_code) == 0:
+        return
+    socketio.emit(AUDIENCE_EVENT, body, to=audience_room(game_code), namespace='/ws')
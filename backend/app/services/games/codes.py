@@ -0,0 +1,184 @@
+"""Game code allocation.
+
+Codes come from a lazily walked shuffled pool: pool slot `i` holds code
+number ``permute(i)``, a keyed permutation of ``[0, 36**length)`` (a
+four-round Feistel network keyed with a random per-process secret, cycle
+walked back into the keyspace). Walking the slots visits every code exactly
+once without materializing the pool, and seeing some codes says nothing
+about the next ones, so codes of other people's games cannot be guessed. `allocate` hands out a released code when
+there is one and otherwise the next slot; `release` returns a code when its
+session ends. Both are O(1) and never query in steady state.
+
+Codes held by existing games are loaded from the database once per process
+(and again if the pool runs dry). Each process walks its own permutation,
+so workers rarely pick the same code; the unique index on `game.game_code`
+remains the final guard.
+"""
+
+import hashlib
+import random
+import string
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import current_app
+
+
+ALPHABET = string.ascii_uppercase + string.digits
+DEFAULT_CODE_LENGTH = 4
+MAX_CODE_LENGTH = 8  # width of game.game_code
+FEISTEL_ROUNDS = 4
+
+
+class CodeAllocator:
+    def __init__(self, length: int = DEFAULT_CODE_LENGTH, load_used: Optional[Callable[[], Iterable[str]]] = None, rng=None):
+        if not 1 <= length <= MAX_CODE_LENGTH:
+            raise ValueError(f"game code length must be between 1 and {MAX_CODE_LENGTH}")
+        rng = rng or random.SystemRandom()
+        self.length = length
+        self.size = len(ALPHABET) ** length
+        # Feistel halves of `half_bits` each cover the keyspace
+        self._half_bits = ((self.size - 1).bit_length() + 1) // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._key = rng.getrandbits(128).to_bytes(16, 'big')
+        self._load_used = load_used
+        self._cursor = 0
+        self._free: deque = deque()
+        self._used = set()
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def encode(self, number: int) -> str:
+        chars = []
+        for _ in range(self.length):
+            number, rem = divmod(number, len(ALPHABET))
+            chars.append(ALPHABET[rem])
+        return ''.join(reversed(chars))
+
+    def decode(self, code: str) -> Optional[int]:
+        if not code or len(code) != self.length:
+            return None
+        number = 0
+        for ch in code.upper():
+            idx = ALPHABET.find(ch)
+            if idx < 0:
+                return None
+            number = number * len(ALPHABET) + idx
+        return number
+
+    def permute(self, index: int) -> int:
+        """Keyed bijection on [0, size): slot `index` -> code number."""
+        number = self._feistel(index)
+        # Cycle walking: values past the keyspace go around again; the
+        # network is a bijection on its wider domain, so this terminates
+        while number >= self.size:
+            number = self._feistel(number)
+        return number
+
+    def _feistel(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for rnd in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(
+                rnd.to_bytes(1, 'big') + right.to_bytes(8, 'big'), key=self._key, digest_size=8
+            ).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'big') & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def allocate(self) -> str:
+        with self._lock:
+            if not self._seeded:
+                self._reseed()
+            number = self._take()
+            if number is None:
+                # Pool walked through: codes released by other workers are
+                # only known to the database, so reload and walk again
+                self._reseed()
+                number = self._take()
+            if number is None:
+                raise RuntimeError(f"No free game codes of length {self.length}")
+            self._used.add(number)
+            return self.encode(number)
+
+    def release(self, code: str) -> None:
+        number = self.decode(code)
+        if number is None:
+            return
+        with self._lock:
+            if number in self._used:
+                self._used.discard(number)
+                self._free.append(number)
+
+    def in_use(self) -> int:
+        return len(self._used)
+
+    def _take(self) -> Optional[int]:
+        while self._free:
+            number = self._free.popleft()
+            if number not in self._used:
+                return number
+        while self._cursor < self.size:
+            number = self.permute(self._cursor)
+            self._cursor += 1
+            if number not in self._used:
+                return number
+        return None
+
+    def _reseed(self) -> None:
+        if self._load_used is not None:
+            # The database is the source of truth for which codes are held
+            used = set()
+            for code in self._load_used():
+                number = self.decode(code)
+                if number is not None:
+                    used.add(number)
+            self._used = used
+        self._free.clear()
+        self._cursor = 0
+        self._seeded = True
+
+
+# code length -> allocator for this process
+_allocators: Dict[int, CodeAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def _codes_in_db() -> Iterable[str]:
+    from app import db
+    from app.models import Game
+
+    return [code for (code,) in db.session.query(Game.game_code).filter(Game.game_code.isnot(None))]
+
+
+def _allocator(length: Optional[int] = None) -> CodeAllocator:
+    if length is None:
+        try:
+            length = int(current_app.config.get('GAME_CODE_LENGTH', DEFAULT_CODE_LENGTH))
+        except Exception:
+            length = DEFAULT_CODE_LENGTH
+    with _allocators_lock:
+        allocator = _allocators.get(length)
+        if allocator is None:
+            allocator = _allocators[length] = CodeAllocator(length, load_used=_codes_in_db)
+        return allocator
+
+
+def allocate_game_code(length: Optional[int] = None) -> str:
+    """Return a code no other game in this process holds (GAME_CODE_LENGTH chars)."""
+    return _allocator(length).allocate()
+
+
+def release_game_code(game_code: Optional[str]) -> None:
+    """Return the code of a deleted game to the pool."""
+    if not game_code:
+        return
+    with _allocators_lock:
+        allocator = _allocators.get(len(game_code))
+    if allocator is not None:
+        allocator.release(game_code)
+
+
+def reset_code_allocators() -> None:
+    """Forget every pool; called when an app (and its DB) is created."""
+    with _allocators_lock:
+        _allocators.clear()
@@ -0,0 +1,79 @@
+"""Negotiated gzip/brotli compression for games API responses.
+
+`compress_response` runs after every request of the `games` blueprint and
+compresses JSON (and MessagePack) bodies of at least COMPRESS_MIN_BYTES
+when the client's Accept-Encoding allows it. Brotli is preferred when the
+optional `brotli` package is installed, otherwise gzip. A compressed
+response gets its own ETag (`<etag>-<coding>`), since its bytes differ.
+
+`GET /state` compresses on its own so the compressed bytes can be cached
+per state version next to the encoded snapshot; the hook skips responses
+that already carry a Content-Encoding.
+"""
+
+import gzip
+from typing import Optional
+
+from flask import current_app, request
+
+from .encoding import JSON_MIMETYPE, MSGPACK_MIMETYPES
+
+COMPRESSIBLE_MIMETYPES = frozenset((JSON_MIMETYPE,) + MSGPACK_MIMETYPES)
+
+
+def brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401  (optional dependency)
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate_content_coding(accept_encodings) -> Optional[str]:
+    """'br' or 'gzip' as the client allows (`request.accept_encodings`), else None."""
+    if not current_app.config.get('COMPRESS_RESPONSES', True):
+        return None
+    offers = ('br', 'gzip') if brotli_available() else ('gzip',)
+    return accept_encodings.best_match(offers)
+
+
+def worth_compressing(body: bytes) -> bool:
+    """Small bodies cost more to compress than they save on the wire."""
+    return len(body) >= int(current_app.config.get('COMPRESS_MIN_BYTES', 1024))
+
+
+def compress_body(body: bytes, coding: str) -> bytes:
+    if coding == 'br':
+        import brotli
+
+        return brotli.compress(body, quality=int(current_app.config.get('COMPRESS_BROTLI_QUALITY', 5)))
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=int(current_app.config.get('COMPRESS_GZIP_LEVEL', 6)), mtime=0)
+
+
+def coded_etag(etag: str, coding: Optional[str]) -> str:
+    return f"{etag}-{coding}" if coding else etag
+
+
+def compress_response(response):
+    """after_request hook: compress an eligible response in place."""
+    if (
+        response.direct_passthrough
+        or not 200 <= response.status_code < 300
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate_content_coding(request.accept_encodings)
+    if not coding:
+        return response
+    body = response.get_data()
+    if not worth_compressing(body):
+        return response
+    response.set_data(compress_body(body, coding))
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(coded_etag(etag, coding), weak)
+    return response
@@ -0,0 +1,59 @@
+"""Wire encodings for state payloads.
+
+JSON is the default everywhere. Clients that send
+`Accept: application/msgpack` on `GET /state` get the same payload as
+MessagePack, which is smaller and faster to encode for large rosters. It
+needs the optional `msgpack` package; without it every client gets JSON.
+For `/ws`, `SOCKETIO_SERIALIZER=msgpack` switches the Socket.IO server to
+the msgpack parser (clients then need `socket.io-msgpack-parser`).
+"""
+
+from typing import Any, Tuple
+
+from flask import current_app
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401  (optional dependency)
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate_state_format(accept) -> str:
+    """'msgpack' when the client prefers it (and it is installed), else 'json'.
+
+    `accept` is a werkzeug MIMEAccept (`request.accept_mimetypes`); JSON
+    wins ties, so `*/*` and browsers keep getting JSON.
+    """
+    if not msgpack_available():
+        return 'json'
+    best = accept.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return 'msgpack' if best in MSGPACK_MIMETYPES else 'json'
+
+
+def encode_state(payload: Any, fmt: str = 'json') -> Tuple[bytes, str]:
+    """Serialize a state payload; returns (body, mimetype)."""
+    if fmt == 'msgpack':
+        import msgpack
+
+        return msgpack.packb(payload, use_bin_type=True), MSGPACK_MIMETYPES[0]
+    return current_app.json.dumps(payload).encode('utf-8'), JSON_MIMETYPE
+
+
+def socketio_serializer_options(app) -> dict:
+    """`socketio.init_app` options for SOCKETIO_SERIALIZER.
+
+    Always names the serializer: Flask-SocketIO keeps options across
+    `init_app` calls, so leaving it out would inherit the previous app's.
+    """
+    serializer = (app.config.get('SOCKETIO_SERIALIZER') or 'default').lower()
+    if serializer == 'msgpack':
+        if msgpack_available():
+            return {'serializer': 'msgpack'}
+        app.logger.warning('SOCKETIO_SERIALIZER=msgpack needs the msgpack package; using JSON')
+    return {'serializer': 'default'}
@@ -0,0 +1,53 @@
+"""Per-round guess tracking for the early auto-advance check.
+
+For the story being guessed the shared store holds the number of eligible
+guessers (every non-author player) and the set of players who have guessed.
+Each committed guess adds itself to the set, so deciding whether everyone
+has guessed is O(1) and needs no queries. When the entry is missing (a new
+round, a restarted process or an evicted key) it is seeded from the
+database once; seeding only ever adds members, so concurrent guesses that
+seed and record at the same time still converge on the full set.
+"""
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Game, Guess, Player
+from app.services.realtime.store import get_store
+
+
+def _keys(game_code: str, story_id: int):
+    return f"guessers:{game_code}:{story_id}", f"eligible_guessers:{game_code}:{story_id}"
+
+
+def record_guess(game: Game, story_id: int, author_id: int, guesser_id: int) -> bool:
+    """Record a committed guess on `story_id`; returns True once every
+    non-author has guessed it."""
+    store = get_store()
+    guessed_key, eligible_key = _keys(game.game_code, story_id)
+    eligible = store.get(eligible_key)
+    if eligible is None:
+        eligible = _seed(game, story_id, author_id)
+    store.sadd(guessed_key, str(guesser_id))
+    eligible = int(eligible)
+    return eligible > 0 and store.scard(guessed_key) >= eligible
+
+
+def _seed(game: Game, story_id: int, author_id: int) -> int:
+    store = get_store()
+    guessed_key, eligible_key = _keys(game.game_code, story_id)
+    eligible = (
+        db.session.query(func.count(Player.id))
+        .filter(Player.game_id == game.id, Player.id != author_id)
+        .scalar()
+    ) or 0
+    for (guesser_id,) in db.session.query(Guess.guesser_id).filter(Guess.story_id == story_id):
+        store.sadd(guessed_key, str(guesser_id))
+    store.set(eligible_key, str(eligible))
+    return eligible
+
+
+def clear_guess_tracker(game_code: str, story_id) -> None:
+    """Drop the tracker of a story that is no longer being guessed."""
+    if story_id:
+        get_store().delete(*_keys(game_code, story_id))
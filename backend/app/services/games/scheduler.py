@@ -1,173 +1,236 @@
 import time
-import json
-from typing import Set, Tuple
 
 from app import db, socketio
-from app.models import Game, Story
-from .scoring import score_current_round
-
-
-_scheduled_stage_keys: Set[Tuple[int, str, int]] = set()
+from app.models import Game
+from app.services.metrics.registry import registry
+from app.services.realtime.store import get_store
+from .timers import TimerScheduler
+
+
+# One loop and one heap entry per in-progress game, keyed by game id
+stage_timers = TimerScheduler()
+
+# Lag grows when the loop (or the workers running transitions) saturate,
+# well before countdowns visibly freeze
+TIMER_FIRE_LAG = registry.histogram(
+    'stage_timer_fire_lag_seconds',
+    'How late stage timers fired compared with stage_deadline.',
+    ('stage',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+TIMER_TRANSITION_SECONDS = registry.histogram(
+    'stage_timer_transition_seconds', 'Duration of timer-driven stage transitions.', ('stage',)
+)
+TIMER_FIRES = registry.counter(
+    'stage_timer_fires_total', 'Stage timer firings by outcome (advanced, mismatch, missing, error).', ('stage', 'outcome')
+)
+registry.gauge('stage_timers_pending', 'Timers pending on the scheduler loop.', func=lambda: stage_timers.pending())
+
+
+TIMED_STAGES = ('round_intro', 'guessing', 'scoreboard')
+
+# `expected_story_id` default: whatever story the game is on (None is a story id
+# in its own right, for stages without one)
+CURRENT_STORY = object()
+
+
+def timers_enabled(app) -> bool:
+    """Stage timers are off in TESTING unless a test opts in."""
+    return not app.config.get('TESTING') or bool(app.config.get('ENABLE_SCHEDULER_IN_TESTS'))
+
+
+def stage_deadline(app, stage: str, now: float):
+    """Client-visible deadline for a stage entered at `now`, or None when the
+    stage is not timed (or timers are disabled)."""
+    if not timers_enabled(app):
+        return None
+    if stage == 'round_intro':
+        duration = int(app.config.get('ROUND_INTRO_DURATION_SEC', 5))
+    elif stage == 'guessing':
+        duration = int(app.config.get('GUESS_DURATION_SEC', 20))
+    elif stage == 'scoreboard':
+        duration = int(app.config.get('SCOREBOARD_DURATION_SEC', 6))
+    elif stage == 'finished':
+        duration = int(app.config.get('FINAL_SCREEN_DURATION_SEC', 20))
+    else:
+        return None
+    return now + duration
 
 
-def schedule_stage_timer(app, game_id: int) -> None:
-    """Schedule auto-advance for the current stage of the given game.
+def arm_stage_timer(app, game: Game) -> None:
+    """Arm auto-advance for the committed stage and deadline of `game`.
 
-    - No-ops in TESTING mode
-    - Sets game.stage_deadline so clients can render countdowns
-    - Ensures a single timer per (game_id, stage, round)
-    - Advances through the pipeline: round_intro -> guessing -> scoreboard -> next/finished
+    - No-ops in TESTING mode (unless ENABLE_SCHEDULER_IN_TESTS)
+    - Does not write to the database: the deadline is set by the same
+      transaction that entered the stage (see `transitions.advance_stage`)
+    - Keeps a single timer per game; re-arming for a new stage replaces it
     """
-    if app.config.get('TESTING') and not app.config.get('ENABLE_SCHEDULER_IN_TESTS'):
+    if not timers_enabled(app):
         return
+    stage = game.stage
+    round_idx = int(game.current_round or 0)
+    story_id = game.current_story_id
+    deadline = game.stage_deadline
+    if game.status != 'in_progress' or stage not in TIMED_STAGES or deadline is None:
+        cancel_stage_timer(game.id)
+        return
+    try:
+        app.logger.info(f"[timer-set] game={game.id} stage={stage} round={round_idx} deadline={deadline}")
+    except Exception:
+        pass
 
-    with app.app_context():
-        game = Game.query.filter_by(id=game_id).first()
-        if not game or game.status != 'in_progress' or not game.stage:
-            return
+    if app.config.get('TESTING'):
+        # Deterministic, synchronous firing for tests that opt in
+        time.sleep(max(0.0, deadline - time.time()))
+        _fire_stage_timer(app, game.id, stage, round_idx, story_id)
+        return
 
-        stage = game.stage
-        round_idx = int(game.current_round or 0)
-        key = (game.id, stage, round_idx)
-
-        if stage == 'round_intro':
-            duration = int(app.config.get('ROUND_INTRO_DURATION_SEC', 5))
-        elif stage == 'guessing':
-            duration = int(app.config.get('GUESS_DURATION_SEC', 20))
-        elif stage == 'scoreboard':
-            duration = int(app.config.get('SCOREBOARD_DURATION_SEC', 6))
-        else:
-            return
+    stage_timers.schedule(
+        game.id, deadline, _fire_stage_timer, app, game.id, stage, round_idx, story_id, tag=(stage, round_idx, story_id)
+    )
+    _ensure_scheduler_running(app)
 
-        if key in _scheduled_stage_keys:
-            try:
-                app.logger.info(f"[timer-skip] game={game.id} stage={stage} round={round_idx} already scheduled")
-            except Exception:
-                pass
-            return
 
-        _scheduled_stage_keys.add(key)
+def cancel_stage_timer(game_id: int) -> None:
+    """Drop the pending stage timer for a game (finished, ended or reset)."""
+    stage_timers.cancel(game_id)
 
-        # Expose a client-visible deadline for countdowns
+
+def _ensure_scheduler_running(app) -> None:
+    def _log_error(exc):
         try:
-            game.stage_deadline = time.time() + duration
-            db.session.add(game)
-            db.session.commit()
+            app.logger.exception(f"[timer-error] {exc}")
         except Exception:
-            db.session.rollback()
+            pass
+
+    stage_timers.ensure_started(socketio.start_background_task, _log_error)
+    try:
+        hb = int(app.config.get('TIMER_HEARTBEAT_SEC', 0))
+    except Exception:
+        hb = 0
+    if hb > 0 and stage_timers.pending_tag('heartbeat') is None:
+        stage_timers.schedule('heartbeat', time.time() + hb, _heartbeat, app, hb, tag='heartbeat')
+
+
+def _heartbeat(app, hb: int) -> None:
+    try:
+        app.logger.info(f"[timer-heartbeat] pending={stage_timers.pending()} next_deadline={stage_timers.next_deadline()}")
+    except Exception:
+        pass
+    if stage_timers.pending() > 0:
+        stage_timers.schedule('heartbeat', time.time() + hb, _heartbeat, app, hb, tag='heartbeat')
 
+
+def _fire_stage_timer(app, gid: int, expected_stage: str, expected_round: int, expected_story_id=CURRENT_STORY) -> None:
+    from .transitions import advance_stage
+
+    fired_at = time.time()
+    with app.app_context():
+        g = db.session.get(Game, gid)
+        if not g:
+            TIMER_FIRES.inc(stage=expected_stage, outcome='missing')
+            return
+        if g.stage == expected_stage and g.stage_deadline is not None:
+            TIMER_FIRE_LAG.observe(max(0.0, fired_at - g.stage_deadline), stage=expected_stage)
         try:
             app.logger.info(
-                f"[timer-set] game={game.id} stage={stage} round={round_idx} duration={duration}s deadline={game.stage_deadline}"
+                f"[timer-fire] game={gid} expected_stage={expected_stage} expected_round={expected_round} actual_stage={g.stage} actual_round={g.current_round} actual_story={g.current_story_id}"
             )
         except Exception:
             pass
+        started = time.perf_counter()
+        try:
+            advanced = advance_stage(app, g, expected_stage, expected_round, expected_story_id)
+        except Exception:
+            TIMER_FIRES.inc(stage=expected_stage, outcome='error')
+            raise
+        if advanced:
+            TIMER_TRANSITION_SECONDS.observe(time.perf_counter() - started, stage=expected_stage)
+            TIMER_FIRES.inc(stage=expected_stage, outcome='advanced')
+            return
+        TIMER_FIRES.inc(stage=expected_stage, outcome='mismatch')
+        try:
+            app.logger.info(f"[timer-abort] game={gid} mismatch status/stage/round/story")
+        except Exception:
+            pass
+
+
+def rehydrate_stage_timers(app, concurrency: int = 8, spawn=None) -> dict:
+    """Re-arm the stage timers of in-progress games after a restart.
 
-    def _worker(expected_stage: str, gid: int, expected_round: int, delay: int):
-        # heartbeat sleep loop if enabled
+    Loads every pending deadline in one query (served by
+    ix_game_status_stage_deadline), arms the future ones in bulk without
+    touching the rows, and fires the overdue ones right away across at most
+    `concurrency` background tasks so a large backlog drains quickly
+    without opening an unbounded number of DB connections.
+
+    Instances sharing the presence store take the `timer_rehydrate` lock
+    first; while another instance is rehydrating this one skips it, so two
+    instances booting together never race to fire the same stages. The
+    lock is released once the timers are armed and the overdue drain is
+    started; TIMER_REHYDRATE_LOCK_SEC only bounds how long a crashed
+    holder can block the others.
+    """
+    lock_sec = int(app.config.get('TIMER_REHYDRATE_LOCK_SEC', 60))
+    if lock_sec > 0 and not get_store().acquire('timer_rehydrate', lock_sec):
         try:
-            hb = int(app.config.get('TIMER_HEARTBEAT_SEC', 0))
+            app.logger.info("[timer-rehydrate] skipped: another instance is rehydrating")
         except Exception:
-            hb = 0
-        if hb and hb > 0:
-            slept = 0
-            while slept < delay:
-                step = min(hb, delay - slept)
-                time.sleep(step)
-                slept += step
+            pass
+        return {'armed': 0, 'overdue': 0, 'skipped': True}
+    try:
+        return _rehydrate(app, concurrency, spawn or socketio.start_background_task)
+    finally:
+        if lock_sec > 0:
+            get_store().delete('timer_rehydrate')
+
+
+def _rehydrate(app, concurrency: int, spawn) -> dict:
+    now = time.time()
+    with app.app_context():
+        rows = (
+            db.session.query(Game.id, Game.stage, Game.current_round, Game.current_story_id, Game.stage_deadline)
+            .filter(Game.status == 'in_progress', Game.stage_deadline.isnot(None))
+            .all()
+        )
+    overdue = []
+    armed = 0
+    for gid, stage, current_round, story_id, deadline in rows:
+        if stage not in TIMED_STAGES:
+            continue
+        round_idx = int(current_round or 0)
+        if deadline <= now:
+            overdue.append((gid, stage, round_idx, story_id))
+            continue
+        stage_timers.schedule(
+            gid, deadline, _fire_stage_timer, app, gid, stage, round_idx, story_id, tag=(stage, round_idx, story_id)
+        )
+        armed += 1
+    if armed:
+        _ensure_scheduler_running(app)
+
+    if overdue:
+        queue = list(reversed(overdue))
+
+        def _drain():
+            while queue:
                 try:
-                    app.logger.info(f"[timer-heartbeat] game={gid} stage={expected_stage} round={expected_round} remaining={max(0, delay - slept)}s")
-                except Exception:
-                    pass
-        else:
-            time.sleep(delay)
-        with app.app_context():
-            g = Game.query.filter_by(id=gid).first()
-            _scheduled_stage_keys.discard((gid, expected_stage, expected_round))
-            if not g:
-                return
-            try:
-                app.logger.info(
-                    f"[timer-fire] game={gid} expected_stage={expected_stage} expected_round={expected_round} actual_stage={g.stage} actual_round={g.current_round}"
-                )
-            except Exception:
-                pass
-
-            if g.status != 'in_progress' or g.stage != expected_stage or int(g.current_round or 0) != expected_round:
+                    gid, stage, round_idx, story_id = queue.pop()
+                except IndexError:
+                    return
                 try:
-                    app.logger.info(f"[timer-abort] game={gid} mismatch status/stage/round")
-                except Exception:
-                    pass
-                return
-
-            # Perform stage transition
-            if expected_stage == 'round_intro':
-                g.stage = 'guessing'
-                db.session.add(g)
-                db.session.commit()
-                socketio.emit('state_update', {'game_code': g.game_code}, to=f"game:{g.game_code}", namespace='/ws')
-                schedule_stage_timer(app, g.id)
-                return
-
-            if expected_stage == 'guessing':
-                score_current_round(g)
-                # After scoring, either continue with next unread story for same author (round_intro) or show scoreboard
-                next_stage = 'scoreboard'
-                next_story_id = None
-                if g.current_story_id:
-                    st = Story.query.get(g.current_story_id)
-                    if st and not st.is_read:
-                        st.is_read = True
-                        db.session.add(st)
-                        db.session.commit()
-                    if st:
-                        unread = Story.query.filter_by(game_id=g.id, author_id=st.author_id, is_read=False).count()
-                        spp = int(g.stories_per_player or 1)
-                        if unread > 0 and spp > 1:
-                            next_stage = 'round_intro'
-                            next_story = Story.query.filter_by(game_id=g.id, author_id=st.author_id, is_read=False).first()
-                            next_story_id = next_story.id if next_story else None
-                g.stage = next_stage
-                if next_stage == 'round_intro' and next_story_id:
-                    g.current_story_id = next_story_id
-                db.session.add(g)
-                db.session.commit()
-                socketio.emit('state_update', {'game_code': g.game_code}, to=f"game:{g.game_code}", namespace='/ws')
-                schedule_stage_timer(app, g.id)
-                return
-
-            if expected_stage == 'scoreboard':
-                if g.current_round < (g.total_rounds or 0):
-                    g.current_round += 1
-                    g.stage = 'round_intro'
+                    _fire_stage_timer(app, gid, stage, round_idx, story_id)
+                except Exception as exc:
                     try:
-                        order = json.loads(g.play_order or '[]')
-                    except Exception:
-                        order = []
-                    idx = (g.current_round - 1) if g.current_round else 0
-                    next_author_id = order[idx] if 0 <= idx < len(order) else None
-                    next_story = (
-                        Story.query.filter_by(game_id=g.id, author_id=next_author_id, is_read=False).first() if next_author_id else None
-                    )
-                    g.current_story_id = next_story.id if next_story else None
-                else:
-                    g.status = 'finished'
-                    g.stage = 'finished'
-                    try:
-                        final_hold = int(app.config.get('FINAL_SCREEN_DURATION_SEC', 20))
-                        g.stage_deadline = time.time() + final_hold
+                        app.logger.exception(f"[timer-rehydrate] game={gid} failed: {exc}")
                     except Exception:
                         pass
-                db.session.add(g)
-                db.session.commit()
-                socketio.emit('state_update', {'game_code': g.game_code}, to=f"game:{g.game_code}", namespace='/ws')
-                if g.status == 'in_progress':
-                    schedule_stage_timer(app, g.id)
-                return
-
-    if app.config.get('TESTING'):
-        _worker(stage, game.id, round_idx, duration)
-    else:
-        socketio.start_background_task(_worker, stage, game.id, round_idx, duration)
 
+        for _ in range(max(1, min(concurrency, len(overdue)))):
+            spawn(_drain)
 
+    try:
+        app.logger.info(f"[timer-rehydrate] armed={armed} overdue={len(overdue)}")
+    except Exception:
+        pass
+    return {'armed': armed, 'overdue': len(overdue)}
@@ -1,51 +1,66 @@
+from sqlalchemy import func, update
+
 from app import db
-from app.models import Game, Player, Story, Guess
-import json
+from app.models import Game, Player, Story, Guess, RoundGuess, RoundResult
 
 def score_current_round(game: Game) -> None:
     """Apply scoring for the current round.
 
     +1 to each correct guesser; +1 to author for each non-author who didn't
     pick the author (wrong guess or no guess).
+
+    Reads the author, the round's guesses and the non-author count in three
+    small queries and applies the points with two set-based UPDATEs
+    (`score = score + n`), so the cost does not depend on player count and
+    concurrent score writers cannot lose increments. The round summary is
+    appended as a `RoundResult` row instead of rewriting a JSON history.
+
+    Nothing is committed here: the stage transition that scores the round
+    owns the transaction (see `transitions.advance_stage`).
     """
     if not game.current_story_id:
         return
-    story = Story.query.get(game.current_story_id)
-    author = Player.query.get(story.author_id) if story else None
-    if not author:
+    author_id = db.session.query(Story.author_id).filter(Story.id == game.current_story_id).scalar()
+    if author_id is None:
         return
-    guesses = Guess.query.filter_by(story_id=game.current_story_id).all()
-    players = Player.query.filter_by(game_id=game.id).all()
-    non_author_ids = {p.id for p in players if p.id != author.id}
-    correct_guessers = []
-    for g in guesses:
-        guesser = Player.query.get(g.guesser_id)
-        if not guesser:
-            continue
-        if g.guessed_player_id == author.id:
-            guesser.score += 1
-            db.session.add(guesser)
-            correct_guessers.append(guesser.id)
-    wrong_or_missing_ids = non_author_ids - {g.guesser_id for g in guesses if g.guessed_player_id == author.id}
-    if wrong_or_missing_ids:
-        author.score += len(wrong_or_missing_ids)
-        db.session.add(author)
-    # Append round summary to round_history
-    try:
-        history = json.loads(game.round_history) if game.round_history else []
-    except Exception:
-        history = []
-    history.append({
-        'round': int(game.current_round or 0),
-        'story_id': game.current_story_id,
-        'author_id': author.id,
-        'guesses': [{'guesser_id': g.guesser_id, 'guessed_player_id': g.guessed_player_id} for g in guesses],
-        'correct_guessers': correct_guessers,
-        'author_points_awarded': len(wrong_or_missing_ids) if 'wrong_or_missing_ids' in locals() else 0,
-    })
-    game.round_history = json.dumps(history)
-    db.session.add(game)
-    db.session.commit()
-
-
+    guesses = (
+        db.session.query(Guess.guesser_id, Guess.guessed_player_id)
+        .filter(Guess.story_id == game.current_story_id)
+        .order_by(Guess.id)
+        .all()
+    )
+    non_author_count = (
+        db.session.query(func.count(Player.id))
+        .filter(Player.game_id == game.id, Player.id != author_id)
+        .scalar()
+    ) or 0
+    correct_guessers = [g.guesser_id for g in guesses if g.guessed_player_id == author_id]
+    author_points = max(0, non_author_count - len(set(correct_guessers)))
 
+    if correct_guessers:
+        db.session.execute(
+            update(Player)
+            .where(Player.id.in_(correct_guessers), Player.game_id == game.id)
+            .values(score=func.coalesce(Player.score, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+    if author_points:
+        db.session.execute(
+            update(Player)
+            .where(Player.id == author_id)
+            .values(score=func.coalesce(Player.score, 0) + author_points)
+            .execution_options(synchronize_session=False)
+        )
+    # Append this round's summary (one row plus one row per guess)
+    result = RoundResult(
+        game_id=game.id,
+        round=int(game.current_round or 0),
+        story_id=game.current_story_id,
+        author_id=author_id,
+        author_points_awarded=author_points,
+    )
+    result.guesses = [
+        RoundGuess(guesser_id=g.guesser_id, guessed_player_id=g.guessed_player_id, correct=(g.guessed_player_id == author_id))
+        for g in guesses
+    ]
+    db.session.add(result)
@@ -0,0 +1,131 @@
+from typing import FrozenSet, Optional, Set
+
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models import Game
+from app.services.realtime.store import get_store
+
+
+def add_replay_vote(game_code: str, player_id: int) -> int:
+    """Record a replay vote and return the number of distinct voters."""
+    key = f"replay_votes:{game_code}"
+    get_store().sadd(key, str(int(player_id)))
+    return get_store().scard(key)
+
+
+def replay_voter_ids(game_code: str) -> Set[int]:
+    return {int(v) for v in get_store().smembers(f"replay_votes:{game_code}")}
+
+
+def clear_replay_votes(game_code: str) -> None:
+    get_store().delete(f"replay_votes:{game_code}")
+
+
+# Every top-level key of the state payload (`Game.to_dict` plus extras)
+STATE_FIELDS = frozenset({
+    'id', 'game_code', 'status', 'stage', 'game_mode', 'stories_per_player', 'stage_deadline',
+    'state_version', 'players', 'current_story', 'current_story_guess_count', 'current_round_results',
+    'current_round', 'total_rounds', 'play_order', 'round_history', 'winners', 'durations', 'replay_votes',
+})
+_CORE_FIELDS = frozenset({
+    'id', 'game_code', 'status', 'stage', 'stage_deadline', 'state_version', 'current_round', 'total_rounds',
+    'durations',
+})
+# Role projections for `GET /state?role=`: what each client actually renders
+STATE_PROJECTIONS = {
+    # A phone: who to guess, the story, its own progress and the final winners
+    'player': _CORE_FIELDS | {
+        'players', 'current_story', 'current_story_guess_count', 'stories_per_player', 'winners', 'replay_votes',
+    },
+    # The first player also runs the scoreboard and advances rounds
+    'controller': _CORE_FIELDS | {
+        'players', 'current_story', 'current_story_guess_count', 'current_round_results', 'stories_per_player',
+        'round_history', 'winners', 'replay_votes',
+    },
+    # The read-only Electron display
+    'display': _CORE_FIELDS | {
+        'players', 'play_order', 'current_story', 'current_story_guess_count', 'round_history', 'winners',
+        'replay_votes',
+    },
+}
+
+
+def resolve_state_fields(role: Optional[str] = None, fields: Optional[str] = None) -> Optional[FrozenSet[str]]:
+    """Fields selected by a role and/or a comma-separated `fields` list.
+
+    Returns None for the full payload. Both together select the
+    intersection; `id`, `game_code` and `state_version` are always kept so
+    clients can tell which version they hold. Raises ValueError for an
+    unknown role or field.
+    """
+    selected = None
+    if role:
+        if role not in STATE_PROJECTIONS:
+            raise ValueError(f"Unknown role: {role}")
+        selected = STATE_PROJECTIONS[role]
+    if fields:
+        requested = frozenset(f.strip() for f in fields.split(',') if f.strip())
+        unknown = requested - STATE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        selected = requested if selected is None else selected & requested
+    if selected is None:
+        return None
+    return selected | {'id', 'game_code', 'state_version'}
+
+
+def state_view_key(fields: Optional[FrozenSet[str]]) -> str:
+    """Stable cache/ETag key of a field selection ('' for the full payload)."""
+    return '' if fields is None else ','.join(sorted(fields))
+
+
+def load_game_for_snapshot(game_code: str, fields: Optional[FrozenSet[str]] = None) -> Optional[Game]:
+    """Load a game with everything `Game.to_dict` needs.
+
+    Players are selectin-loaded and the current story is joined onto the
+    game row, so serializing costs a fixed number of queries (game + story,
+    players, current guesses) regardless of player count. With `fields`,
+    players and the story are only loaded when a selected field uses them.
+    """
+    options = []
+    if fields is None or fields & {'players', 'winners'}:
+        options.append(selectinload(Game.players))
+    if fields is None or fields & {'current_story', 'current_round_results'}:
+        options.append(joinedload(Game.current_story_ref))
+    return Game.query.options(*options).filter_by(game_code=game_code.upper()).first()
+
+
+def build_state_payload(game: Game, fields: Optional[FrozenSet[str]] = None) -> dict:
+    """Full client state: `Game.to_dict` plus stage durations and replay votes.
+
+    With `fields`, only the selected keys (see `resolve_state_fields`).
+    """
+    payload = game.to_dict(fields=fields)
+    if fields is None or 'durations' in fields:
+        # Include stage durations so clients can show countdowns
+        try:
+            cfg = current_app.config
+            durations = {
+                'round_intro': int(cfg.get('ROUND_INTRO_DURATION_SEC', 5)),
+                'guessing': int(cfg.get('GUESS_DURATION_SEC', 20)),
+                'scoreboard': int(cfg.get('SCOREBOARD_DURATION_SEC', 6)),
+            }
+        except Exception:
+            durations = {'round_intro': 5, 'guessing': 20, 'scoreboard': 6}
+        payload['durations'] = durations
+    if fields is None or 'replay_votes' in fields:
+        # Attach replay votes count for clients on final screen
+        try:
+            payload['replay_votes'] = get_store().scard(f"replay_votes:{game.game_code}")
+        except Exception:
+            payload['replay_votes'] = 0
+    return payload
+
+
+def build_game_snapshot(game_code: str) -> Optional[dict]:
+    """Return the full state payload for a game code, or None if missing."""
+    game = load_game_for_snapshot(game_code)
+    if not game:
+        return None
+    return build_state_payload(game)
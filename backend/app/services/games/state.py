@@ -0,0 +1,338 @@
+"""Per-game state versions, the serialized snapshot cache and state pushes.
+
+Every mutation of a game's client-visible state bumps `Game.state_version`
+inside the same transaction. After commit the new version is recorded here
+so `GET /state` can answer conditional requests (ETag / If-None-Match) and
+repeat polls from memory without touching the database or re-encoding JSON.
+
+`emit_state_update` builds the new state once per event and pushes only the
+fields that changed since the previous broadcast, tagged with the version it
+applies on top of. Clients that detect a gap ask for a full `state_snapshot`
+via the `resync` socket event instead of refetching over HTTP. Spectators
+get the serialized state itself, once per version (see `audience`).
+
+Bursts are coalesced per room: with STATE_EMIT_COALESCE_MS set, a change
+that lands within that window of the room's previous broadcast is not sent
+on its own. One deferred broadcast goes out when the window closes and
+carries whatever version is latest by then. A change of stage or status is
+always sent at once and supersedes a pending deferred broadcast.
+"""
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app import db, socketio
+from app.models import Game
+from app.services.metrics.registry import registry
+from app.services.realtime.store import get_store
+from .audience import broadcast_audience_frame
+from .snapshot import build_state_payload, load_game_for_snapshot
+
+
+# Latest committed (game_id, state_version) per game code lives in the shared
+# store under "state_version:<code>" so every worker agrees on freshness.
+# (game_id, state_version, view) -> serialized JSON body, LRU-bounded; `view`
+# is '' for the full payload, else the key of a field selection
+_snapshot_cache: "OrderedDict[Tuple[int, int, str], bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+SNAPSHOT_CACHE_SIZE = 1024
+# game_id -> (state_version, payload) of the last state this process built
+_last_broadcast: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+# game code -> (monotonic time, game_id, state_version) of its last state_update here
+_last_emit: Dict[str, Tuple[float, int, int]] = {}
+# game code -> token of its pending deferred broadcast
+_pending_emit: Dict[str, object] = {}
+# game code -> [state changes, state_update broadcasts] seen by this process
+room_emits: Dict[str, List[int]] = {}
+_emit_lock = threading.Lock()
+
+STATE_UPDATES = registry.counter(
+    'state_updates_total',
+    'State changes by outcome: emitted as a state_update, or coalesced into a later one.',
+    ('outcome',),
+)
+# Per room over a game's lifetime on this worker, observed when the game is
+# forgotten; the two sums compared show what coalescing saved
+_PER_GAME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+STATE_CHANGES_PER_GAME = registry.histogram(
+    'state_changes_per_game', 'State changes pushed per game on this worker.', buckets=_PER_GAME_BUCKETS
+)
+STATE_UPDATE_EMITS_PER_GAME = registry.histogram(
+    'state_update_emits_per_game', 'state_update broadcasts per game room on this worker.', buckets=_PER_GAME_BUCKETS
+)
+
+
+def bump_state_version(game: Game) -> None:
+    """Increment the game's state version as part of the pending transaction.
+
+    Uses a SQL-side increment so concurrent writers never produce the same
+    version for different states. After commit, call `note_state_version`
+    (or `emit_state_update`) so cached snapshots of the old version stop
+    being served. Also stamps `updated_at`, which the reaper uses to find
+    idle games.
+    """
+    if game.id is None:
+        return
+    game.state_version = Game.state_version + 1
+    game.updated_at = time.time()
+
+
+def note_state_version(game: Game) -> int:
+    """Record the committed version of `game`; call after commit.
+
+    Never moves the recorded version backwards, so a slow writer noting an
+    older version cannot mask a newer one. Game ids only grow, so a new
+    game reusing a released code takes over its key.
+    """
+    version = int(game.state_version or 0)
+    get_store().advance_version(f"state_version:{game.game_code}", game.id, version)
+    return version
+
+
+def loaded_state_version(game: Game) -> int:
+    """Version of a game loaded on a read path.
+
+    Reads only seed the key for games no worker has recorded yet; moving it
+    forward is left to the writers' `note_state_version` after commit.
+    """
+    if known_state_version(game.game_code) is None:
+        return note_state_version(game)
+    return int(game.state_version or 0)
+
+
+def known_state_version(game_code: str) -> Optional[Tuple[int, int]]:
+    raw = get_store().get(f"state_version:{game_code.upper()}")
+    if not raw:
+        return None
+    game_id, _, version = raw.partition(':')
+    return int(game_id), int(version)
+
+
+def forget_game(game_code: str) -> None:
+    """Drop version tracking for a game that no longer exists."""
+    entry = known_state_version(game_code)
+    get_store().delete(f"state_version:{game_code.upper()}")
+    with _emit_lock:
+        for per_room in (_last_emit, _pending_emit):
+            per_room.pop(game_code.upper(), None)
+        counts = room_emits.pop(game_code.upper(), None)
+    if counts:
+        STATE_CHANGES_PER_GAME.observe(counts[0])
+        STATE_UPDATE_EMITS_PER_GAME.observe(counts[1])
+    if not entry:
+        return
+    game_id = entry[0]
+    _last_broadcast.pop(game_id, None)
+    with _cache_lock:
+        for key in [k for k in _snapshot_cache if k[0] == game_id]:
+            _snapshot_cache.pop(key, None)
+
+
+def reset_state_cache() -> None:
+    """Drop every cached snapshot; called when an app (and its DB) is created."""
+    with _cache_lock:
+        _snapshot_cache.clear()
+    _last_broadcast.clear()
+    with _emit_lock:
+        _last_emit.clear()
+        _pending_emit.clear()
+        room_emits.clear()
+
+
+def get_cached_snapshot(game_id: int, version: int, view: str = '') -> Optional[bytes]:
+    key = (game_id, version, view)
+    with _cache_lock:
+        body = _snapshot_cache.get(key)
+        if body is not None:
+            _snapshot_cache.move_to_end(key)
+        return body
+
+
+def cache_snapshot(game_id: int, version: int, body: bytes, view: str = '') -> None:
+    key = (game_id, version, view)
+    with _cache_lock:
+        _snapshot_cache[key] = body
+        _snapshot_cache.move_to_end(key)
+        while len(_snapshot_cache) > SNAPSHOT_CACHE_SIZE:
+            _snapshot_cache.popitem(last=False)
+
+
+def state_etag(game_id: int, version: int, view: str = '') -> str:
+    if not view:
+        return f"{game_id}-{version}"
+    return f"{game_id}-{version}-{zlib.crc32(view.encode('utf-8')):08x}"
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the top-level fields of `new` that differ from `old`.
+
+    Players are diffed per id: `players.upsert` carries only the changed
+    fields of existing players (plus `id`) or whole new players, and
+    `players.remove` lists ids that are gone.
+    """
+    patch: Dict[str, Any] = {}
+    for key, value in new.items():
+        if key == 'players':
+            continue
+        if key not in old or old[key] != value:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+
+    old_players = {p['id']: p for p in old.get('players') or []}
+    new_ids = set()
+    upsert = []
+    for p in new.get('players') or []:
+        new_ids.add(p['id'])
+        prev = old_players.get(p['id'])
+        if prev is None:
+            upsert.append(p)
+            continue
+        changed = {k: v for k, v in p.items() if prev.get(k) != v or k not in prev}
+        if changed:
+            changed['id'] = p['id']
+            upsert.append(changed)
+    removed = [pid for pid in old_players if pid not in new_ids]
+    if upsert or removed:
+        patch['players'] = {'upsert': upsert, 'remove': removed}
+    return patch
+
+
+def _remember_state(game: Game, version: int, payload: Dict[str, Any]) -> bytes:
+    last = _last_broadcast.get(game.id)
+    if not last or last[0] <= version:
+        _last_broadcast[game.id] = (version, payload)
+    body = current_app.json.dumps(payload).encode('utf-8')
+    cache_snapshot(game.id, version, body)
+    return body
+
+
+def current_state(game_code: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Return (version, payload) for a game, from memory when up to date."""
+    known = known_state_version(game_code)
+    if known:
+        last = _last_broadcast.get(known[0])
+        if last and last[0] == known[1]:
+            return last
+    game = load_game_for_snapshot(game_code)
+    if not game:
+        return None
+    version = loaded_state_version(game)
+    payload = build_state_payload(game)
+    _remember_state(game, version, payload)
+    return version, payload
+
+
+def current_state_body(game_code: str) -> Optional[bytes]:
+    """The serialized full state (the `GET /state` body), encoded once per version."""
+    state = current_state(game_code)
+    if not state:
+        return None
+    version, payload = state
+    body = get_cached_snapshot(payload['id'], version)
+    if body is None:
+        body = current_app.json.dumps(payload).encode('utf-8')
+        cache_snapshot(payload['id'], version, body)
+    return body
+
+
+def emit_state_update(game: Game, flush: bool = False) -> None:
+    """Push the committed state of `game` to its room as a patch.
+
+    The message carries `version` and, when this process knows the previous
+    state, `base_version` plus a `patch` of changed fields. Without a known
+    base the full payload is sent as `state`. Within the coalescing window
+    the push is deferred (see the module docstring) unless `flush` is set
+    or the stage or status changed.
+    """
+    version = note_state_version(game)
+    window = float(current_app.config.get('STATE_EMIT_COALESCE_MS', 0)) / 1000.0
+    if window > 0 and not flush and _defer_state_update(game, window):
+        STATE_UPDATES.inc(outcome='coalesced')
+        _count_room(game.game_code, changes=1, emits=0)
+        return
+    _broadcast_state(game, version)
+
+
+def _count_room(game_code: str, changes: int, emits: int) -> None:
+    with _emit_lock:
+        counts = room_emits.setdefault(game_code, [0, 0])
+        counts[0] += changes
+        counts[1] += emits
+
+
+def _defer_state_update(game: Game, window: float) -> bool:
+    """Leave this change to a deferred broadcast; False to send it now."""
+    prev = _last_broadcast.get(game.id)
+    if not prev or prev[1].get('stage') != game.stage or prev[1].get('status') != game.status:
+        return False
+    code = game.game_code
+    now = time.monotonic()
+    with _emit_lock:
+        last = _last_emit.get(code)
+        if last is None or now - last[0] >= window:
+            return False
+        if code in _pending_emit:
+            return True
+        token = _pending_emit[code] = object()
+    socketio.start_background_task(_flush_deferred, current_app._get_current_object(), code, token, last[0] + window - now)
+    return True
+
+
+def _flush_deferred(app, game_code: str, token: object, delay: float) -> None:
+    if delay > 0:
+        socketio.sleep(delay)
+    with _emit_lock:
+        if _pending_emit.get(game_code) is not token:
+            # Already sent by an immediate broadcast
+            return
+    with app.app_context():
+        try:
+            game = load_game_for_snapshot(game_code)
+            version = int(game.state_version or 0) if game else 0
+            if game:
+                _broadcast_state(game, version, deferred=True)
+        except Exception as exc:
+            app.logger.exception(f"[state-update] game={game_code} deferred broadcast failed: {exc}")
+        finally:
+            with _emit_lock:
+                if _pending_emit.get(game_code) is token:
+                    _pending_emit.pop(game_code, None)
+            db.session.remove()
+
+
+def _broadcast_state(game: Game, version: int, deferred: bool = False) -> None:
+    code = game.game_code
+    with _emit_lock:
+        # Emits can arrive out of order; a late older version must never
+        # reach clients after a newer one (they would move backwards)
+        last = _last_emit.get(code)
+        if last and last[1:] >= (game.id, version):
+            return
+        _last_emit[code] = (time.monotonic(), game.id, version)
+    payload = build_state_payload(game)
+    prev = _last_broadcast.get(game.id)
+    body = _remember_state(game, version, payload)
+
+    message: Dict[str, Any] = {'game_code': code, 'version': version}
+    if prev and prev[0] < version:
+        message['base_version'] = prev[0]
+        message['patch'] = diff_state(prev[1], payload)
+    else:
+        message['state'] = payload
+    with _emit_lock:
+        if _last_emit.get(code, ())[1:] != (game.id, version):
+            # A newer version claimed the room while this one was being built
+            return
+        _pending_emit.pop(code, None)
+    # A deferred broadcast carries changes already counted as coalesced
+    _count_room(code, changes=0 if deferred else 1, emits=1)
+    STATE_UPDATES.inc(outcome='emitted')
+    socketio.emit('state_update', message, to=f"game:{code}", namespace='/ws')
+    broadcast_audience_frame(code, body)
@@ -0,0 +1,178 @@
+"""Deleting games and everything hanging off them.
+
+Players, stories, guesses and round summaries reference their game (and
+each other) with ON DELETE CASCADE, so removing any number of games is one
+DELETE on `game` in one transaction. The per-game state outside the
+database (stage timer, guess tracker, presence and version keys, the game
+code) is dropped after the commit.
+
+`reap_dead_games` is the periodic cleanup for games nobody ends explicitly:
+finished games past `GAME_REAP_FINISHED_SEC` and games of any status idle
+(no state version bump) for `GAME_REAP_IDLE_SEC`. It deletes them in
+batches of `GAME_REAP_BATCH_SIZE` per transaction and reports the rows it
+reclaimed on /metrics.
+"""
+
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, func, or_
+
+from app import db, socketio
+from app.models import Game, Guess, Player, RoundResult, Story
+from app.services.metrics.registry import registry
+from app.services.realtime.store import get_store
+from .audience import game_rooms
+from .codes import release_game_code
+from .guesses import clear_guess_tracker
+from .scheduler import cancel_stage_timer, stage_timers, _ensure_scheduler_running
+from .snapshot import clear_replay_votes
+from .state import forget_game
+
+
+REAPER_RUNS = registry.counter('reaper_runs_total', 'Runs of the dead game reaper.')
+REAPER_ROWS = registry.counter('reaper_rows_reclaimed_total', 'Rows deleted by the dead game reaper.', ('table',))
+REAPER_LAST_DURATION = registry.gauge('reaper_last_run_duration_seconds', 'Duration of the last reaper run.')
+REAPER_LAST_RUN = registry.gauge('reaper_last_run_timestamp_seconds', 'Unix time the last reaper run started.')
+
+# `delete_games` count keys -> table names for the `table` label
+_REAPED_TABLES = {
+    'games': Game.__tablename__,
+    'players': Player.__tablename__,
+    'stories': Story.__tablename__,
+    'guesses': Guess.__tablename__,
+    'round_results': RoundResult.__tablename__,
+}
+
+# (id, game_code, current_story_id)
+_GameRef = Tuple[int, str, Optional[int]]
+
+
+def delete_games(games: Iterable[_GameRef]) -> Dict[str, int]:
+    """Delete the given games in one transaction; returns rows removed per table."""
+    games = list(games)
+    if not games:
+        return {'games': 0, 'players': 0, 'stories': 0, 'guesses': 0, 'round_results': 0}
+    ids = [g[0] for g in games]
+    counts = {
+        'players': db.session.query(func.count(Player.id)).filter(Player.game_id.in_(ids)).scalar() or 0,
+        'stories': db.session.query(func.count(Story.id)).filter(Story.game_id.in_(ids)).scalar() or 0,
+        'guesses': (
+            db.session.query(func.count(Guess.id)).join(Story, Guess.story_id == Story.id).filter(Story.game_id.in_(ids)).scalar()
+            or 0
+        ),
+        'round_results': db.session.query(func.count(RoundResult.id)).filter(RoundResult.game_id.in_(ids)).scalar() or 0,
+    }
+    try:
+        counts['games'] = db.session.execute(
+            delete(Game).where(Game.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for game_id, game_code, story_id in games:
+        cancel_stage_timer(game_id)
+        clear_guess_tracker(game_code, story_id)
+        clear_replay_votes(game_code)
+        get_store().delete(f"owners:{game_code}", f"end_deadline:{game_code}", f"viewers:{game_code}")
+        forget_game(game_code)
+        release_game_code(game_code)
+    return counts
+
+
+def end_session(game_code: str) -> None:
+    """End a live session: notify the room and delete the game."""
+    # Use socketio.emit since this may be called from a background task
+    socketio.emit('session_ended', {'game_code': game_code}, room=game_rooms(game_code), namespace='/ws')
+    try:
+        row = (
+            db.session.query(Game.id, Game.game_code, Game.current_story_id)
+            .filter(Game.game_code == game_code)
+            .first()
+        )
+        if row:
+            delete_games([tuple(row)])
+            return
+    except Exception as exc:
+        try:
+            current_app.logger.exception(f"[end-session] game={game_code} delete failed: {exc}")
+        except Exception:
+            pass
+    get_store().delete(f"owners:{game_code}", f"end_deadline:{game_code}", f"viewers:{game_code}")
+    forget_game(game_code)
+
+
+def reap_dead_games(app, now: Optional[float] = None) -> Dict[str, int]:
+    """Delete finished and abandoned games in bounded batches."""
+    started = time.time()
+    now = started if now is None else now
+    cfg = app.config
+    try:
+        batch_size = max(1, int(cfg.get('GAME_REAP_BATCH_SIZE', 500)))
+        finished_cutoff = now - int(cfg.get('GAME_REAP_FINISHED_SEC', 3600))
+        idle_cutoff = now - int(cfg.get('GAME_REAP_IDLE_SEC', 6 * 3600))
+    except Exception:
+        batch_size, finished_cutoff, idle_cutoff = 500, now - 3600, now - 6 * 3600
+
+    totals = {'games': 0, 'players': 0, 'stories': 0, 'guesses': 0, 'round_results': 0}
+    with app.app_context():
+        while True:
+            batch = (
+                db.session.query(Game.id, Game.game_code, Game.current_story_id)
+                .filter(
+                    or_(
+                        Game.updated_at.is_(None),
+                        Game.updated_at < idle_cutoff,
+                        (Game.status == 'finished') & (Game.updated_at < finished_cutoff),
+                    )
+                )
+                .order_by(Game.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            counts = delete_games(batch)
+            for key, value in counts.items():
+                totals[key] += value
+            for _gid, game_code, _sid in batch:
+                socketio.emit('session_ended', {'game_code': game_code}, room=game_rooms(game_code), namespace='/ws')
+            if len(batch) < batch_size:
+                break
+
+    duration = time.time() - started
+    REAPER_RUNS.inc()
+    for key, value in totals.items():
+        REAPER_ROWS.inc(value, table=_REAPED_TABLES[key])
+    REAPER_LAST_RUN.set(started)
+    REAPER_LAST_DURATION.set(duration)
+    try:
+        app.logger.info(
+            f"[reaper] games={totals['games']} players={totals['players']} stories={totals['stories']} "
+            f"guesses={totals['guesses']} round_results={totals['round_results']} "
+            f"duration={duration:.3f}s"
+        )
+    except Exception:
+        pass
+    return totals
+
+
+def start_game_reaper(app) -> None:
+    """Run `reap_dead_games` every GAME_REAPER_INTERVAL_SEC on the timer loop."""
+    try:
+        interval = int(app.config.get('GAME_REAPER_INTERVAL_SEC', 300))
+    except Exception:
+        interval = 0
+    if interval <= 0:
+        return
+
+    def _tick():
+        try:
+            reap_dead_games(app)
+        finally:
+            stage_timers.schedule('reaper', time.time() + interval, _tick, tag='reaper')
+
+    stage_timers.schedule('reaper', time.time() + interval, _tick, tag='reaper')
+    _ensure_scheduler_running(app)
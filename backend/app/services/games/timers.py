@@ -0,0 +1,133 @@
+"""Single-loop deadline scheduler for stage timers.
+
+One background loop owns a min-heap of deadlines instead of one sleeping
+greenlet per game. Each key (a game id for stage timers) has at most one
+pending entry: scheduling again replaces it and `cancel` removes it, both in
+O(log n) amortized (stale heap entries are skipped lazily and compacted when
+they dominate). Wakeups are aligned to a tick so deadlines landing in the
+same tick are fired together as one batch.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+_Entry = Tuple[float, int, Hashable]
+
+
+class TimerScheduler:
+    def __init__(self, tick: float = 0.05, clock: Callable[[], float] = time.time):
+        self.tick = tick
+        self._clock = clock
+        self._heap: List[_Entry] = []
+        # key -> (deadline, seq, tag, callback, args)
+        self._live: Dict[Hashable, Tuple[float, int, Any, Callable[..., None], tuple]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+
+    def schedule(self, key: Hashable, deadline: float, callback: Callable[..., None], *args, tag: Any = None) -> None:
+        """Arm (or re-arm) the timer for `key`, replacing any pending one."""
+        with self._lock:
+            seq = next(self._seq)
+            self._live[key] = (deadline, seq, tag, callback, args)
+            heapq.heappush(self._heap, (deadline, seq, key))
+            self._maybe_compact()
+            is_earliest = self._heap[0][1] == seq
+        if is_earliest:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Drop the pending timer for `key`; returns whether one existed."""
+        with self._lock:
+            return self._live.pop(key, None) is not None
+
+    def pending_tag(self, key: Hashable) -> Any:
+        entry = self._live.get(key)
+        return entry[2] if entry else None
+
+    def pending(self) -> int:
+        return len(self._live)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[Tuple[Hashable, float, Callable[..., None], tuple]]:
+        """Remove and return every live timer whose deadline is <= now."""
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, seq, key = heapq.heappop(self._heap)
+                entry = self._live.get(key)
+                if entry is None or entry[1] != seq:
+                    continue
+                del self._live[key]
+                due.append((key, deadline, entry[3], entry[4]))
+        return due
+
+    def run_due(self, now: Optional[float] = None, on_error: Optional[Callable[[BaseException], None]] = None) -> int:
+        """Fire every due timer in deadline order; returns how many fired."""
+        batch = self.pop_due(now)
+        _fire_batch(batch, on_error)
+        return len(batch)
+
+    def run_forever(self, spawn: Callable[..., Any], on_error: Optional[Callable[[BaseException], None]] = None) -> None:
+        """Scheduler loop: sleep until the next tick-aligned deadline, then
+        hand the due batch to `spawn` so slow transitions never stall it."""
+        while True:
+            nxt = self.next_deadline()
+            now = self._clock()
+            if nxt is None:
+                timeout = None
+            else:
+                # Round up to the tick so neighbouring deadlines share a wakeup
+                wake_at = math.ceil(nxt / self.tick) * self.tick
+                timeout = max(0.0, wake_at - now)
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+            batch = self.pop_due()
+            if batch:
+                spawn(_fire_batch, batch, on_error)
+
+    def ensure_started(self, start_background_task: Callable[..., Any], on_error=None) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        start_background_task(self.run_forever, start_background_task, on_error)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._live.clear()
+
+    def _drop_stale_head(self) -> None:
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            entry = self._live.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [(d, s, k) for k, (d, s, _t, _c, _a) in self._live.items()]
+            heapq.heapify(self._heap)
+
+
+def _fire_batch(batch, on_error) -> None:
+    for _key, _deadline, callback, args in batch:
+        try:
+            callback(*args)
+        except Exception as exc:
+            if on_error:
+                on_error(exc)
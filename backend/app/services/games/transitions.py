@@ -0,0 +1,139 @@
+"""Stage transitions for in-progress games.
+
+Every move along round_intro -> guessing -> scoreboard -> next round/finished
+goes through `advance_stage`, whether it is triggered by the controller, by
+the last guess arriving early or by a stage timer. The whole transition
+(scoring, marking the story read, picking the next story, the new stage and
+its deadline) is applied in one transaction with a single commit; the state
+push and the next timer happen only after that commit.
+"""
+
+import json
+import time
+
+from sqlalchemy import func, update
+
+from app import db
+from app.models import Game, Story
+from .guesses import clear_guess_tracker
+from .scheduler import CURRENT_STORY, arm_stage_timer, cancel_stage_timer, stage_deadline
+from .scoring import score_current_round
+from .state import emit_state_update
+
+
+def advance_stage(app, game: Game, expected_stage=None, expected_round=None, expected_story_id=CURRENT_STORY) -> bool:
+    """Move `game` out of its current stage; returns whether it moved.
+
+    `expected_stage`/`expected_round`/`expected_story_id` default to the
+    game's current values. The transition first claims the row with a
+    conditional UPDATE on (status, stage, round, story) that also bumps
+    `state_version`, so when a timer and a controller race for the same
+    transition only one of them applies it and the other returns False
+    without scoring twice. The story matters in multi-story rounds, where
+    the same (stage, round) comes back for each story: a stale timer for
+    the previous story must not cut the next one short.
+    """
+    stage = game.stage if expected_stage is None else expected_stage
+    round_idx = int(game.current_round or 0) if expected_round is None else int(expected_round)
+    story_id = game.current_story_id if expected_story_id is CURRENT_STORY else expected_story_id
+    if (
+        game.status != 'in_progress'
+        or game.stage != stage
+        or int(game.current_round or 0) != round_idx
+        or game.current_story_id != story_id
+    ):
+        return False
+
+    claimed = db.session.execute(
+        update(Game)
+        .where(
+            Game.id == game.id,
+            Game.status == 'in_progress',
+            Game.stage == stage,
+            func.coalesce(Game.current_round, 0) == round_idx,
+            Game.current_story_id.is_(None) if story_id is None else Game.current_story_id == story_id,
+        )
+        .values(state_version=Game.state_version + 1, updated_at=time.time())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        try:
+            app.logger.info(f"[transition-skip] game={game.id} stage={stage} round={round_idx} story={story_id} already advanced")
+        except Exception:
+            pass
+        return False
+
+    guessed_story_id = game.current_story_id if stage == 'guessing' else None
+    if stage == 'round_intro':
+        game.stage = 'guessing'
+    elif stage == 'guessing':
+        score_current_round(game)
+        _finish_story(game)
+    else:
+        _next_round_or_finish(game)
+    game.stage_deadline = stage_deadline(app, game.stage, time.time())
+    db.session.add(game)
+    db.session.commit()
+
+    try:
+        app.logger.info(
+            f"[transition] game={game.id} {stage} -> {game.stage} round={game.current_round} deadline={game.stage_deadline}"
+        )
+    except Exception:
+        pass
+    clear_guess_tracker(game.game_code, guessed_story_id)
+    emit_state_update(game, flush=True)
+    if game.status == 'in_progress':
+        arm_stage_timer(app, game)
+    else:
+        cancel_stage_timer(game.id)
+    return True
+
+
+def _finish_story(game: Game) -> None:
+    """Mark the current story read; continue with the author's next unread
+    story (multi-story rounds) or show the scoreboard."""
+    game.stage = 'scoreboard'
+    if not game.current_story_id:
+        return
+    story = db.session.get(Story, game.current_story_id)
+    if not story:
+        return
+    story.is_read = True
+    if int(game.stories_per_player or 1) <= 1:
+        return
+    next_story = (
+        Story.query.filter(
+            Story.game_id == game.id,
+            Story.author_id == story.author_id,
+            Story.is_read.is_(False),
+            Story.id != story.id,
+        )
+        .order_by(Story.id)
+        .first()
+    )
+    if next_story:
+        game.stage = 'round_intro'
+        game.current_story_id = next_story.id
+
+
+def _next_round_or_finish(game: Game) -> None:
+    if int(game.current_round or 0) < (game.total_rounds or 0):
+        game.current_round = int(game.current_round or 0) + 1
+        game.stage = 'round_intro'
+        try:
+            order = json.loads(game.play_order or '[]')
+        except Exception:
+            order = []
+        idx = game.current_round - 1
+        next_author_id = order[idx] if 0 <= idx < len(order) else None
+        next_story = (
+            Story.query.filter_by(game_id=game.id, author_id=next_author_id, is_read=False).order_by(Story.id).first()
+            if next_author_id
+            else None
+        )
+        game.current_story_id = next_story.id if next_story else None
+    else:
+        game.status = 'finished'
+        game.stage = 'finished'
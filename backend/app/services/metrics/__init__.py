@@ -0,0 +1,7 @@
+"""Process-local operational metrics, rendered in the Prometheus text format.
+
+`registry` holds counters, gauges and histograms that the HTTP, realtime and
+scheduler code update in place; `GET /metrics` renders them. Each worker
+process keeps its own numbers, so scrape every worker (or run `-w 1`
+instances, as the deployment notes recommend).
+"""
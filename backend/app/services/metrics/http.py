@@ -0,0 +1,86 @@
+"""Per-endpoint request latency and SQL cost.
+
+`init_request_metrics` times every request and, through SQLAlchemy engine
+events, counts the statements it runs and the time spent in them. Results
+are labelled by Flask endpoint (`games.get_game_state`,
+`games.submit_guess`, ...), never by raw path, so game codes do not blow up
+the label space. Statements run outside a request (timers, the reaper,
+socket handlers) are counted as `background`.
+"""
+
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from .registry import COUNT_BUCKETS, registry
+
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint.', ('endpoint', 'method', 'status')
+)
+REQUEST_SQL_STATEMENTS = registry.histogram(
+    'http_request_sql_statements', 'SQL statements per HTTP request by endpoint.', ('endpoint',), buckets=COUNT_BUCKETS
+)
+REQUEST_SQL_SECONDS = registry.histogram(
+    'http_request_sql_seconds', 'Time spent in SQL per HTTP request by endpoint.', ('endpoint',)
+)
+SQL_STATEMENTS = registry.counter('sql_statements_total', 'SQL statements executed.', ('context',))
+SQL_SECONDS = registry.counter('sql_seconds_total', 'Time spent executing SQL statements.', ('context',))
+
+
+def init_request_metrics(app, engine) -> None:
+    """Instrument `app`'s requests and the statements `engine` runs."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    sql = g.get('_metrics_sql') if has_request_context() else None
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+        return
+    SQL_STATEMENTS.inc(context='background')
+    SQL_SECONDS.inc(elapsed, context='background')
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_sql = [0, 0.0]
+
+
+def _record(status_code) -> None:
+    started = g.pop('_metrics_started', None)
+    sql = g.pop('_metrics_sql', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method, status=status_code)
+    if sql is not None:
+        REQUEST_SQL_STATEMENTS.observe(sql[0], endpoint=endpoint)
+        REQUEST_SQL_SECONDS.observe(sql[1], endpoint=endpoint)
+        SQL_STATEMENTS.inc(sql[0], context='request')
+        SQL_SECONDS.inc(sql[1], context='request')
+
+
+def _finish_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # Requests that raised never reach after_request
+    if exc is not None:
+        _record(500)
@@ -0,0 +1,135 @@
+"""Socket.IO fan-out metrics.
+
+`instrument_socketio` wraps the server's `emit`, which every emit goes
+through (`socketio.emit` in services and routes as well as `emit` inside
+socket handlers), and records per event:
+
+- socketio_emits_total{event}
+- socketio_emit_recipients{event}: sockets in the target room on this worker
+- socketio_emit_payload_bytes{event}: size of the packet Socket.IO encoded
+  for the emit (JSON or msgpack, attachments included). Taken from the
+  server's own encoding, so nothing is serialized twice; emits this worker
+  does not encode (no local recipients, or handed to a message queue) are
+  not observed
+- socketio_emit_seconds{event}: time spent in the emit call
+
+Connected sockets, spectators and rooms on /ws are gauges read at scrape
+time. With a message queue, recipients and gauges count this worker's
+sockets only; with the realtime gateway the sockets live in the gateway
+process.
+"""
+
+import threading
+import time
+
+from app.services.games import audience
+from .registry import COUNT_BUCKETS, registry
+
+
+NAMESPACE = '/ws'
+
+EMITS = registry.counter('socketio_emits_total', 'Socket.IO emits by event.', ('event',))
+EMIT_RECIPIENTS = registry.histogram(
+    'socketio_emit_recipients',
+    'Sockets addressed per emit on this worker.',
+    ('event',),
+    buckets=COUNT_BUCKETS + (233, 377, 610, 987),
+)
+EMIT_PAYLOAD_BYTES = registry.histogram(
+    'socketio_emit_payload_bytes',
+    'Encoded size of emitted packets.',
+    ('event',),
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+EMIT_SECONDS = registry.histogram('socketio_emit_seconds', 'Time spent in Socket.IO emit calls.', ('event',))
+
+_server = None
+
+
+def _connected_sockets():
+    rooms = _namespace_rooms()
+    return len(rooms.get(None) or ())
+
+
+def _open_rooms():
+    rooms = _namespace_rooms()
+    sids = rooms.get(None) or {}
+    # Every socket also sits in a room named after its sid; count the others
+    return sum(1 for room in rooms if room is not None and room not in sids)
+
+
+def _namespace_rooms():
+    try:
+        return _server.manager.rooms.get(NAMESPACE) or {}
+    except Exception:
+        return {}
+
+
+registry.gauge('socketio_connected_sockets', 'Sockets connected to /ws on this worker.', func=_connected_sockets)
+registry.gauge('socketio_rooms', 'Rooms (other than per-socket ones) on /ws on this worker.', func=_open_rooms)
+registry.gauge('socketio_spectators', 'Spectators connected to /ws on this worker.', func=lambda: audience.local_viewers)
+
+
+def _recipients(manager, namespace, room) -> int:
+    rooms = manager.rooms.get(namespace or '/') or {}
+    if isinstance(room, (list, tuple, set)):
+        return sum(len(rooms.get(r) or ()) for r in room)
+    return len(rooms.get(room) or ())
+
+
+# Per-thread (per-greenlet under gevent) list collecting the encoded sizes
+# of the packets built during the current emit; None outside an emit
+_encoding = threading.local()
+
+
+def _encoded_size(encoded) -> int:
+    parts = encoded if isinstance(encoded, list) else [encoded]
+    return sum(len(p) for p in parts)
+
+
+def _measured_packet_class(packet_class):
+    """`packet_class` whose `encode` reports its output size to an active emit."""
+
+    class MeasuredPacket(packet_class):
+        def encode(self):
+            encoded = super().encode()
+            sizes = getattr(_encoding, 'sizes', None)
+            if sizes is not None:
+                sizes.append(_encoded_size(encoded))
+            return encoded
+
+    MeasuredPacket.__name__ = packet_class.__name__
+    return MeasuredPacket
+
+
+def instrument_socketio(socketio) -> None:
+    """Record metrics for every emit of `socketio`'s current server."""
+    global _server
+    server = socketio.server
+    if server is None or getattr(server, '_metrics_instrumented', False):
+        return
+    _server = server
+    emit = server.emit
+
+    def measured_emit(event, data=None, to=None, room=None, skip_sid=None, namespace=None, **kwargs):
+        started = time.perf_counter()
+        outer = getattr(_encoding, 'sizes', None)
+        _encoding.sizes = sizes = []
+        try:
+            return emit(event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace, **kwargs)
+        finally:
+            _encoding.sizes = outer
+            elapsed = time.perf_counter() - started
+            try:
+                EMITS.inc(event=event)
+                EMIT_SECONDS.observe(elapsed, event=event)
+                EMIT_RECIPIENTS.observe(_recipients(server.manager, namespace, to or room), event=event)
+                if sizes:
+                    # Room emits encode once for every recipient
+                    EMIT_PAYLOAD_BYTES.observe(sizes[0], event=event)
+            except Exception:
+                pass
+
+    server.packet_class = _measured_packet_class(server.packet_class)
+    server.emit = measured_emit
+    server._metrics_instrumented = True
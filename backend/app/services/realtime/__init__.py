@@ -0,0 +1,7 @@
+"""Cross-process realtime plumbing: Socket.IO message queues and shared presence.
+
+With a single worker everything stays in memory. Setting
+`SOCKETIO_MESSAGE_QUEUE` (and optionally `PRESENCE_STORE_URL`) lets several
+workers or nodes share room fan-out, session-owner presence, replay votes
+and state versions.
+"""
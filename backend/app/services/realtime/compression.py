@@ -0,0 +1,20 @@
+"""Compression on the /ws transport.
+
+Long-polling: Engine.IO gzips/deflates poll responses of at least
+COMPRESS_MIN_BYTES for clients that accept it (`socketio_compression_options`).
+
+WebSocket: frames are compressed with the permessage-deflate extension only
+behind the realtime gateway, whose uvicorn server negotiates it with clients
+that offer it. The Flask worker's websocket driver is left as Engine.IO
+picks it (gevent-websocket under gevent), which does not support the
+extension, so websocket frames served by the worker are not compressed.
+"""
+
+
+def socketio_compression_options(app) -> dict:
+    """`socketio.init_app` options for long-polling compression."""
+    return {
+        'http_compression': bool(app.config.get('COMPRESS_RESPONSES', True)),
+        'compression_threshold': int(app.config.get('COMPRESS_MIN_BYTES', 1024)),
+    }
+
@@ -0,0 +1,330 @@
+"""Standalone asyncio gateway for the /ws namespace (optional).
+
+The gateway is a python-socketio ASGI server in its own process. It owns
+the client sockets, room membership and session-owner presence, so idle
+connections cost an entry in an asyncio loop instead of a greenlet next to
+the ORM work in the Flask workers. The Flask app keeps doing everything
+else and publishes its emits to the gateway over a Unix socket
+(`REALTIME_GATEWAY_IPC=unix:///path.sock`, see `UnixSocketPublisher`).
+
+The gateway never touches the database. Snapshots for `join_game`/`resync`
+(and spectators' first `audience_state` frame) come from the app's
+`GET /state` (served from its snapshot cache), and a
+session whose owners have all gone is ended through the app's internal
+`POST /session/end`, authenticated with `REALTIME_GATEWAY_TOKEN`.
+
+Run it next to the app (requires an ASGI server, e.g. ``pip install
+uvicorn``)::
+
+    REALTIME_GATEWAY_IPC=unix:///tmp/adam-realtime.sock \
+    REALTIME_GATEWAY_APP_URL=http://127.0.0.1:5000 \
+    REALTIME_GATEWAY_TOKEN=... python gateway.py
+"""
+
+import asyncio
+import json
+import os
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Optional
+
+import socketio as python_socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+
+NAMESPACE = '/ws'
+# Mirrors app.services.games.audience, which needs the Flask app to import
+AUDIENCE_EVENT = 'audience_state'
+SPECTATOR_ROLE = 'spectator'
+
+
+def audience_room(game_code: str) -> str:
+    return f"game:{game_code}:audience"
+
+
+def ipc_path(url: str) -> str:
+    """Filesystem path of a ``unix://`` IPC URL."""
+    return url[len('unix://'):] if url.startswith('unix://') else url
+
+
+class AsyncUnixSocketManager(AsyncPubSubManager):
+    """Gateway side of the IPC channel: every line received on the Unix
+    socket is a pub/sub message (emit, close_room, ...) from an app worker.
+
+    The gateway is the only host holding sockets, so its own emits are
+    delivered locally and never need publishing.
+    """
+    name = 'unix-gateway'
+
+    def __init__(self, path: str, channel='flask-socketio', logger=None):
+        super().__init__(channel=channel, write_only=False, logger=logger)
+        self.path = path
+        self._inbox: Optional[asyncio.Queue] = None
+        self._ipc_server = None
+
+    async def _publish(self, data):
+        return None
+
+    async def _listen(self):
+        if self._ipc_server is None:
+            self._inbox = asyncio.Queue()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._ipc_server = await asyncio.start_unix_server(self._read_worker, path=self.path, limit=16 * 1024 * 1024)
+        while True:
+            yield await self._inbox.get()
+
+    async def _read_worker(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                await self._inbox.put(line)
+        finally:
+            writer.close()
+
+    async def close(self) -> None:
+        listener = getattr(self, 'thread', None)
+        if listener is not None:
+            listener.cancel()
+            self.thread = None
+        if self._ipc_server is not None:
+            self._ipc_server.close()
+            await self._ipc_server.wait_closed()
+            self._ipc_server = None
+
+
+class RealtimeGateway:
+    """Socket.IO server for the /ws namespace, mirroring `socketio_events`."""
+
+    def __init__(self, ipc_url: str, app_url: str, token: Optional[str] = None,
+                 cors_allowed_origins=None, end_grace_sec: float = 2.0, serializer: str = 'default'):
+        self.app_url = app_url.rstrip('/')
+        self.token = token or ''
+        self.end_grace_sec = end_grace_sec
+        self.manager = AsyncUnixSocketManager(ipc_path(ipc_url))
+        self.sio = python_socketio.AsyncServer(
+            async_mode='asgi',
+            client_manager=self.manager,
+            cors_allowed_origins=cors_allowed_origins or [],
+            serializer=serializer,
+        )
+        self.asgi_app = python_socketio.ASGIApp(self.sio, on_startup=self.start)
+        # sid -> {'game_code', 'is_session_owner', 'spectator'}
+        self._ctx: Dict[str, Dict[str, Any]] = {}
+        # game code -> connected session owners
+        self._owners: Dict[str, int] = {}
+        # game code -> connected spectators
+        self._viewers: Dict[str, int] = {}
+        # game code -> pending end-of-session task
+        self._pending_end: Dict[str, asyncio.Task] = {}
+
+        for event, handler in (
+            ('connect', self.on_connect),
+            ('disconnect', self.on_disconnect),
+            ('join_game', self.on_join_game),
+            ('leave_game', self.on_leave_game),
+            ('ping', self.on_ping),
+            ('resync', self.on_resync),
+        ):
+            self.sio.on(event, handler, namespace=NAMESPACE)
+
+    async def start(self) -> None:
+        """Open the IPC socket before the first client connects."""
+        if not self.sio.manager_initialized:
+            self.sio.manager_initialized = True
+            self.manager.initialize()
+
+    # ---- Socket.IO handlers ----
+
+    async def on_connect(self, sid, environ, auth=None):
+        await self.sio.emit('connected', {'message': 'Connected to /ws'}, to=sid, namespace=NAMESPACE)
+
+    async def on_disconnect(self, sid, *args):
+        ctx = self._ctx.pop(sid, None)
+        if ctx and ctx.get('spectator'):
+            self._remove_viewer(ctx['game_code'])
+            return
+        if ctx and ctx.get('is_session_owner'):
+            self._release_owner(ctx['game_code'])
+
+    async def on_join_game(self, sid, data):
+        game_code = (data or {}).get('game_code')
+        if not game_code:
+            await self.sio.emit('error', {'message': 'game_code is required'}, to=sid, namespace=NAMESPACE)
+            return
+        game_code = game_code.upper()
+        if (data or {}).get('role') == SPECTATOR_ROLE:
+            await self._join_audience(sid, game_code)
+            return
+        prev = self._ctx.get(sid)
+        if prev and prev.get('spectator'):
+            await self.sio.leave_room(sid, audience_room(prev['game_code']), namespace=NAMESPACE)
+            self._remove_viewer(prev['game_code'])
+        room = f"game:{game_code}"
+        await self.sio.enter_room(sid, room, namespace=NAMESPACE)
+        is_session_owner = bool((data or {}).get('is_session_owner'))
+        self._ctx[sid] = {'game_code': game_code, 'is_session_owner': is_session_owner}
+        if is_session_owner:
+            self._owners[game_code] = self._owners.get(game_code, 0) + 1
+            pending = self._pending_end.pop(game_code, None)
+            if pending:
+                pending.cancel()
+        await self.sio.emit('joined', {'room': room}, to=sid, namespace=NAMESPACE)
+        await self._emit_snapshot(sid, game_code)
+
+    async def _join_audience(self, sid, game_code: str) -> None:
+        ctx = self._ctx.get(sid)
+        if ctx and ctx.get('spectator'):
+            if ctx['game_code'] == game_code:
+                await self._emit_audience_frame(sid, game_code)
+                return
+            await self.sio.leave_room(sid, audience_room(ctx['game_code']), namespace=NAMESPACE)
+            self._remove_viewer(ctx['game_code'])
+        elif ctx:
+            # Was a player or session owner: release that first
+            self._ctx.pop(sid, None)
+            await self.sio.leave_room(sid, f"game:{ctx['game_code']}", namespace=NAMESPACE)
+            if ctx.get('is_session_owner'):
+                self._release_owner(ctx['game_code'])
+        room = audience_room(game_code)
+        await self.sio.enter_room(sid, room, namespace=NAMESPACE)
+        self._ctx[sid] = {'game_code': game_code, 'is_session_owner': False, 'spectator': True}
+        self._viewers[game_code] = self._viewers.get(game_code, 0) + 1
+        await self.sio.emit(
+            'joined',
+            {'room': room, 'role': SPECTATOR_ROLE, 'viewers': self._viewers[game_code]},
+            to=sid,
+            namespace=NAMESPACE,
+        )
+        await self._emit_audience_frame(sid, game_code)
+
+    async def on_leave_game(self, sid, data):
+        game_code = (data or {}).get('game_code')
+        if not game_code:
+            await self.sio.emit('error', {'message': 'game_code is required'}, to=sid, namespace=NAMESPACE)
+            return
+        game_code = game_code.upper()
+        ctx = self._ctx.get(sid)
+        if ctx and ctx.get('spectator') and ctx['game_code'] == game_code:
+            room = audience_room(game_code)
+            await self.sio.leave_room(sid, room, namespace=NAMESPACE)
+            self._ctx.pop(sid, None)
+            self._remove_viewer(game_code)
+            await self.sio.emit('left', {'room': room}, to=sid, namespace=NAMESPACE)
+            return
+        room = f"game:{game_code}"
+        await self.sio.leave_room(sid, room, namespace=NAMESPACE)
+        await self.sio.emit('left', {'room': room}, to=sid, namespace=NAMESPACE)
+        if ctx and ctx.get('is_session_owner') and ctx.get('game_code') == game_code:
+            # Explicit quit: end immediately
+            await self._end_session(game_code)
+
+    async def on_ping(self, sid, data=None):
+        await self.sio.emit('pong', data or {}, to=sid, namespace=NAMESPACE)
+
+    async def on_resync(self, sid, data):
+        game_code = (data or {}).get('game_code')
+        if not game_code:
+            await self.sio.emit('error', {'message': 'game_code is required'}, to=sid, namespace=NAMESPACE)
+            return
+        ctx = self._ctx.get(sid)
+        if ctx and ctx.get('spectator'):
+            await self._emit_audience_frame(sid, game_code.upper())
+            return
+        await self._emit_snapshot(sid, game_code.upper())
+
+    # ---- Helpers ----
+
+    async def _emit_snapshot(self, sid, game_code: str) -> None:
+        payload = await asyncio.get_running_loop().run_in_executor(None, self._fetch_state, game_code)
+        if not payload:
+            return
+        await self.sio.emit(
+            'state_snapshot',
+            {'game_code': game_code, 'version': payload.get('state_version'), 'state': payload},
+            to=sid,
+            namespace=NAMESPACE,
+        )
+
+    async def _emit_audience_frame(self, sid, game_code: str) -> None:
+        body = await asyncio.get_running_loop().run_in_executor(None, self._fetch_state_body, game_code)
+        if body:
+            await self.sio.emit(AUDIENCE_EVENT, body, to=sid, namespace=NAMESPACE)
+
+    def _release_owner(self, game_code: str) -> None:
+        self._owners[game_code] = max(0, self._owners.get(game_code, 0) - 1)
+        if self._owners[game_code] == 0:
+            self._schedule_end(game_code)
+
+    def _remove_viewer(self, game_code: str) -> None:
+        remaining = self._viewers.get(game_code, 0) - 1
+        if remaining > 0:
+            self._viewers[game_code] = remaining
+        else:
+            self._viewers.pop(game_code, None)
+
+    def _fetch_state(self, game_code: str) -> Optional[Dict[str, Any]]:
+        body = self._fetch_state_body(game_code)
+        return json.loads(body) if body else None
+
+    def _fetch_state_body(self, game_code: str) -> Optional[bytes]:
+        url = f"{self.app_url}/api/games/{urllib.parse.quote(game_code)}/state"
+        try:
+            with urllib.request.urlopen(url, timeout=5) as res:
+                return res.read()
+        except Exception:
+            return None
+
+    def _schedule_end(self, game_code: str) -> None:
+        async def _end_later():
+            await asyncio.sleep(self.end_grace_sec)
+            self._pending_end.pop(game_code, None)
+            if self._owners.get(game_code, 0) == 0:
+                await self._end_session(game_code)
+
+        pending = self._pending_end.pop(game_code, None)
+        if pending:
+            pending.cancel()
+        self._pending_end[game_code] = asyncio.ensure_future(_end_later())
+
+    async def _end_session(self, game_code: str) -> None:
+        self._owners.pop(game_code, None)
+        # The app deletes the game and emits session_ended back through the IPC channel
+        await asyncio.get_running_loop().run_in_executor(None, self._post_end_session, game_code)
+
+    def _post_end_session(self, game_code: str) -> bool:
+        url = f"{self.app_url}/api/games/{urllib.parse.quote(game_code)}/session/end"
+        req = urllib.request.Request(url, data=b'', method='POST', headers={'X-Gateway-Token': self.token})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as res:
+                return res.status == 200
+        except Exception:
+            return False
+
+
+def main() -> None:
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('The realtime gateway needs an ASGI server: pip install uvicorn')
+    from app import allowed_origins
+
+    ipc_url = os.environ.get('REALTIME_GATEWAY_IPC') or 'unix:///tmp/adam-realtime.sock'
+    gateway = RealtimeGateway(
+        ipc_url,
+        os.environ.get('REALTIME_GATEWAY_APP_URL') or 'http://127.0.0.1:5000',
+        token=os.environ.get('REALTIME_GATEWAY_TOKEN'),
+        cors_allowed_origins=allowed_origins,
+        # Must match the app's parser so forwarded emits reach clients intact
+        serializer=os.environ.get('SOCKETIO_SERIALIZER') or 'default',
+    )
+    uvicorn.run(
+        gateway.asgi_app,
+        host=os.environ.get('REALTIME_GATEWAY_HOST', '0.0.0.0'),
+        port=int(os.environ.get('REALTIME_GATEWAY_PORT', '8001')),
+        # Compress websocket frames for clients that offer permessage-deflate
+        ws_per_message_deflate=True,
+        log_level='info',
+    )
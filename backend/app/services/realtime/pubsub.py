@@ -0,0 +1,111 @@
+import queue
+import socket
+import threading
+from typing import Dict, List, Optional
+
+import socketio as python_socketio
+
+
+class MemoryPubSubManager(python_socketio.PubSubManager):
+    """In-process stand-in for a Socket.IO message queue.
+
+    Every manager created with the same channel in this process sees the
+    messages published by the others, so several `socketio.Server`
+    instances (or write-only emitters) behave like workers sharing Redis.
+    Intended for tests and single-machine experiments.
+    """
+    name = 'memory'
+
+    _channels: Dict[str, List["queue.Queue"]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, channel='flask-socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox: "queue.Queue" = queue.Queue()
+        if not write_only:
+            with self._lock:
+                self._channels.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        with self._lock:
+            inboxes = list(self._channels.get(self.channel, []))
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+    def close(self) -> None:
+        with self._lock:
+            inboxes = self._channels.get(self.channel, [])
+            if self._inbox in inboxes:
+                inboxes.remove(self._inbox)
+
+
+class UnixSocketPublisher(python_socketio.PubSubManager):
+    """Write-only manager that forwards every emit to the realtime gateway.
+
+    Messages go as newline-delimited JSON over one persistent Unix socket
+    connection (re-opened on failure). The gateway process owns the client
+    sockets and rooms, see `app.services.realtime.gateway`. If the gateway
+    is down the message is dropped and logged; clients resync on reconnect.
+    """
+    name = 'unix'
+
+    def __init__(self, path: str, channel='flask-socketio', write_only=True, logger=None, json=None):
+        super().__init__(channel=channel, write_only=True, logger=logger, json=json)
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._sock_lock = threading.Lock()
+
+    def _publish(self, data):
+        line = (self.json.dumps(data) + '\n').encode('utf-8')
+        with self._sock_lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                        sock.connect(self.path)
+                        self._sock = sock
+                    self._sock.sendall(line)
+                    return
+                except OSError as exc:
+                    self._close_socket()
+                    if attempt:
+                        self._get_logger().warning(f"[gateway-ipc] dropped {data.get('method')} message: {exc}")
+
+    def _listen(self):
+        return iter(())
+
+    def _close_socket(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def close(self) -> None:
+        with self._sock_lock:
+            self._close_socket()
+
+
+def create_client_manager(url: Optional[str], channel: str = 'flask-socketio', write_only: bool = False):
+    """Build the Socket.IO client manager for a message queue URL.
+
+    - ``None``/empty: no queue (single process)
+    - ``memory://[channel]``: `MemoryPubSubManager`
+    - ``redis://``/``rediss://``: python-socketio `RedisManager`
+    - ``unix:///path.sock``: `UnixSocketPublisher` to the realtime gateway
+    - anything else: python-socketio `KombuManager` (AMQP etc.)
+    """
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return MemoryPubSubManager(channel=url[len('memory://'):] or channel, write_only=write_only)
+    if url.startswith('unix://'):
+        return UnixSocketPublisher(url[len('unix://'):], channel=channel)
+    if url.startswith(('redis://', 'rediss://')):
+        return python_socketio.RedisManager(url, channel=channel, write_only=write_only)
+    return python_socketio.KombuManager(url, channel=channel, write_only=write_only)
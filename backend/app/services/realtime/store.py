@@ -0,0 +1,173 @@
+"""Shared key/value store for presence and other cross-worker game state.
+
+`MemoryStore` keeps everything in this process (the default, and what tests
+use). `RedisStore` shares the same keys between workers and nodes. Callers
+go through `get_store()` so the backend can be swapped in `create_app`.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+
+class MemoryStore:
+    """Thread-safe in-process implementation of the store interface."""
+
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+        self._counters: Dict[str, int] = {}
+        self._sets: Dict[str, Set[str]] = {}
+        # key -> expiry (time.monotonic) of locks taken with `acquire`
+        self._leases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def decr(self, key: str) -> int:
+        """Decrement, never going below zero."""
+        with self._lock:
+            value = max(0, self._counters.get(key, 0) - 1)
+            self._counters[key] = value
+            return value
+
+    def get_int(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._values.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def advance_version(self, key: str, owner_id: int, version: int) -> bool:
+        """Store "<owner_id>:<version>" unless a greater pair is already there."""
+        with self._lock:
+            if _version_pair(self._values.get(key)) >= (owner_id, version):
+                return False
+            self._values[key] = f"{owner_id}:{version}"
+            return True
+
+    def acquire(self, key: str, ttl_sec: float) -> bool:
+        """Take `key` for `ttl_sec` unless someone holds it; True if taken."""
+        now = time.monotonic()
+        with self._lock:
+            if self._leases.get(key, 0.0) > now:
+                return False
+            self._leases[key] = now + ttl_sec
+            return True
+
+    def sadd(self, key: str, member: str) -> None:
+        with self._lock:
+            self._sets.setdefault(key, set()).add(member)
+
+    def scard(self, key: str) -> int:
+        return len(self._sets.get(key, ()))
+
+    def smembers(self, key: str) -> Set[str]:
+        with self._lock:
+            return set(self._sets.get(key, ()))
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._counters.pop(key, None)
+                self._sets.pop(key, None)
+                self._leases.pop(key, None)
+
+
+class RedisStore:
+    """Redis-backed store; requires the optional `redis` package."""
+
+    _DECR_FLOOR = (
+        "local v = redis.call('DECR', KEYS[1]) "
+        "if v < 0 then redis.call('SET', KEYS[1], 0) v = 0 end "
+        "return v"
+    )
+    _ADVANCE_VERSION = (
+        "local cur = redis.call('GET', KEYS[1]) "
+        "if cur then "
+        "  local id, ver = string.match(cur, '^(%d+):(%d+)$') "
+        "  if id then "
+        "    id = tonumber(id) ver = tonumber(ver) "
+        "    local nid = tonumber(ARGV[1]) local nver = tonumber(ARGV[2]) "
+        "    if nid < id or (nid == id and nver <= ver) then return 0 end "
+        "  end "
+        "end "
+        "redis.call('SET', KEYS[1], ARGV[1] .. ':' .. ARGV[2]) "
+        "return 1"
+    )
+
+    def __init__(self, url: str, prefix: str = 'adam:'):
+        import redis  # optional dependency
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._decr_floor = self._redis.register_script(self._DECR_FLOOR)
+        self._advance_version = self._redis.register_script(self._ADVANCE_VERSION)
+
+    def _k(self, key: str) -> str:
+        return self._prefix + key
+
+    def incr(self, key: str) -> int:
+        return int(self._redis.incr(self._k(key)))
+
+    def decr(self, key: str) -> int:
+        return int(self._decr_floor(keys=[self._k(key)]))
+
+    def get_int(self, key: str) -> int:
+        return int(self._redis.get(self._k(key)) or 0)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._redis.get(self._k(key))
+
+    def set(self, key: str, value: str) -> None:
+        self._redis.set(self._k(key), value)
+
+    def advance_version(self, key: str, owner_id: int, version: int) -> bool:
+        return bool(self._advance_version(keys=[self._k(key)], args=[int(owner_id), int(version)]))
+
+    def acquire(self, key: str, ttl_sec: float) -> bool:
+        return bool(self._redis.set(self._k(key), '1', nx=True, px=max(1, int(ttl_sec * 1000))))
+
+    def sadd(self, key: str, member: str) -> None:
+        self._redis.sadd(self._k(key), member)
+
+    def scard(self, key: str) -> int:
+        return int(self._redis.scard(self._k(key)))
+
+    def smembers(self, key: str) -> Set[str]:
+        return set(self._redis.smembers(self._k(key)))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._redis.delete(*[self._k(k) for k in keys])
+
+
+def _version_pair(raw: Optional[str]) -> Tuple[int, int]:
+    """(owner_id, version) of an `advance_version` value; (-1, -1) if unset."""
+    owner_id, _, version = (raw or '').partition(':')
+    try:
+        return int(owner_id), int(version)
+    except ValueError:
+        return -1, -1
+
+
+_store = MemoryStore()
+
+
+def get_store():
+    return _store
+
+
+def init_store(url: Optional[str] = None) -> None:
+    """Select the store backend; `None` or ``memory://`` keeps it in-process."""
+    global _store
+    if url and url.startswith(('redis://', 'rediss://')):
+        _store = RedisStore(url)
+    else:
+        _store = MemoryStore()
@@ -1,8 +1,17 @@
 from flask_socketio import join_room, leave_room, emit
-from app import socketio, db
+from app import socketio
 from flask import current_app
-from app.models import Game, Player, Story, Guess
-from typing import Dict, Any
+from app.services.games.audience import (
+    AUDIENCE_EVENT,
+    SPECTATOR_ROLE,
+    add_viewer,
+    audience_room,
+    remove_viewer,
+)
+from app.services.games.state import current_state, current_state_body
+from app.services.games.teardown import end_session
+from app.services.realtime.store import get_store
+from typing import Dict, Any, Optional
 import time
 
 
@@ -17,17 +26,11 @@ def handle_disconnect():
     if not ctx:
         return
     game_code = ctx.get('game_code')
+    if ctx.get('spectator') and game_code:
+        remove_viewer(game_code)
+        return
     if ctx.get('is_session_owner') and game_code:
-        _owner_count[game_code] = max(0, _owner_count.get(game_code, 0) - 1)
-        # In tests, end immediately for determinism; in prod, allow grace period
-        try:
-            if current_app and current_app.config.get('TESTING'):
-                if _owner_count.get(game_code, 0) == 0:
-                    _end_session(game_code)
-                return
-        except Exception:
-            pass
-        _schedule_end_if_no_owner(game_code)
+        _release_owner(game_code)
 
 
 def handle_join_game(data):
@@ -36,14 +39,83 @@ def handle_join_game(data):
     if not game_code:
         emit('error', {'message': 'game_code is required'})
         return
+    if (data or {}).get('role') == SPECTATOR_ROLE:
+        _join_audience(game_code.upper())
+        return
+    prev = _sid_to_ctx.get(_get_sid())
+    if prev and prev.get('spectator'):
+        # Was watching: stop counting towards that audience
+        leave_room(audience_room(prev['game_code']))
+        remove_viewer(prev['game_code'])
     room = f"game:{game_code.upper()}"
     join_room(room)
     # Track session owner presence and socket context
     _sid_to_ctx[_get_sid()] = {'game_code': game_code.upper(), 'is_session_owner': is_session_owner}
     if is_session_owner:
-        _owner_count[game_code.upper()] = _owner_count.get(game_code.upper(), 0) + 1
+        get_store().incr(f"owners:{game_code.upper()}")
         _cancel_scheduled_end(game_code.upper())
     emit('joined', {'room': room})
+    # Seed the client's state so it can apply subsequent patches
+    _emit_snapshot(game_code.upper())
+
+
+def _join_audience(game_code: str) -> None:
+    """Watch a game without a Player row; see `services.games.audience`."""
+    sid = _get_sid()
+    ctx = _sid_to_ctx.get(sid)
+    if ctx and ctx.get('spectator'):
+        if ctx.get('game_code') == game_code:
+            _emit_audience_frame(game_code)
+            return
+        # Switching games: stop counting towards the previous audience
+        leave_room(audience_room(ctx['game_code']))
+        remove_viewer(ctx['game_code'])
+    elif ctx:
+        # Was a player (or session owner): leave the players' room and stop
+        # counting as an owner, or the game would never end without us
+        _sid_to_ctx.pop(sid, None)
+        leave_room(f"game:{ctx['game_code']}")
+        if ctx.get('is_session_owner'):
+            _release_owner(ctx['game_code'])
+    room = audience_room(game_code)
+    join_room(room)
+    _sid_to_ctx[sid] = {'game_code': game_code, 'is_session_owner': False, 'spectator': True}
+    viewers = add_viewer(game_code)
+    emit('joined', {'room': room, 'role': SPECTATOR_ROLE, 'viewers': viewers})
+    _emit_audience_frame(game_code)
+
+
+def _emit_audience_frame(game_code: str) -> None:
+    try:
+        body = current_state_body(game_code)
+    except Exception:
+        body = None
+    if body:
+        emit(AUDIENCE_EVENT, body)
+
+
+def handle_resync(data):
+    """Send a full state snapshot to a client that detected a version gap."""
+    game_code = (data or {}).get('game_code')
+    if not game_code:
+        emit('error', {'message': 'game_code is required'})
+        return
+    ctx = _sid_to_ctx.get(_get_sid())
+    if ctx and ctx.get('spectator'):
+        _emit_audience_frame(game_code.upper())
+        return
+    _emit_snapshot(game_code.upper())
+
+
+def _emit_snapshot(game_code: str) -> None:
+    try:
+        state = current_state(game_code)
+    except Exception:
+        state = None
+    if not state:
+        return
+    version, payload = state
+    emit('state_snapshot', {'game_code': game_code, 'version': version, 'state': payload})
 
 
 def handle_leave_game(data):
@@ -51,11 +123,18 @@ def handle_leave_game(data):
     if not game_code:
         emit('error', {'message': 'game_code is required'})
         return
+    ctx = _sid_to_ctx.get(_get_sid())
+    if ctx and ctx.get('spectator') and ctx.get('game_code') == game_code.upper():
+        room = audience_room(game_code.upper())
+        leave_room(room)
+        _sid_to_ctx.pop(_get_sid(), None)
+        remove_viewer(game_code.upper())
+        emit('left', {'room': room})
+        return
     room = f"game:{game_code.upper()}"
     leave_room(room)
     emit('left', {'room': room})
     # If a session owner leaves explicitly, decrement and possibly end session
-    ctx = _sid_to_ctx.get(_get_sid())
     if ctx and ctx.get('is_session_owner') and ctx.get('game_code') == game_code.upper():
         # Explicit quit: end immediately
         _end_session(game_code.upper())
@@ -68,62 +147,60 @@ def handle_ping(data):
 from flask import request
 from flask_socketio import rooms
 
+# A socket is pinned to the worker that accepted it, so sid context stays
+# local. Owner counts and pending end deadlines are per game and may be
+# touched by any worker, so they live in the shared store.
 _sid_to_ctx: Dict[str, Dict[str, Any]] = {}
-_owner_count: Dict[str, int] = {}
-_end_deadline: Dict[str, float] = {}
+
+
+def _owner_count(game_code: str) -> int:
+    return get_store().get_int(f"owners:{game_code}")
+
+
+def _end_deadline(game_code: str) -> Optional[str]:
+    return get_store().get(f"end_deadline:{game_code}")
 
 def _get_sid() -> str:
     # type: ignore: request.sid exists in Socket.IO context
     return request.sid  # type: ignore
 
 def _end_session(game_code: str) -> None:
-    """End the session: notify clients and cleanup DB rows for the game."""
-    # Use socketio.emit since this may be called from a background task
-    socketio.emit('session_ended', {'game_code': game_code}, room=f"game:{game_code}", namespace='/ws')
+    end_session(game_code)
+
+def _release_owner(game_code: str) -> None:
+    """A session owner socket went away: end the game once none remain."""
+    get_store().decr(f"owners:{game_code}")
+    # In tests, end immediately for determinism; in prod, allow grace period
     try:
-        game = Game.query.filter_by(game_code=game_code).first()
-        if game:
-            # Break FK from game to story to avoid violations
-            if getattr(game, 'current_story_id', None):
-                game.current_story_id = None
-                db.session.add(game)
-                db.session.commit()
-            # Clean dependent rows
-            try:
-                for story in list(game.stories) if hasattr(game.stories, '__iter__') else []:
-                    Guess.query.filter_by(story_id=story.id).delete()
-            except Exception:
-                # If relationship is dynamic, skip iteration and rely on bulk deletes
-                pass
-            Story.query.filter_by(game_id=game.id).delete()
-            Player.query.filter_by(game_id=game.id).delete()
-            db.session.delete(game)
-            db.session.commit()
+        if current_app and current_app.config.get('TESTING'):
+            if _owner_count(game_code) == 0:
+                _end_session(game_code)
+            return
     except Exception:
-        db.session.rollback()
-    finally:
-        _owner_count.pop(game_code, None)
-        _end_deadline.pop(game_code, None)
+        pass
+    _schedule_end_if_no_owner(game_code)
 
 def _schedule_end_if_no_owner(game_code: str, delay_sec: float = 2.0) -> None:
-    if _owner_count.get(game_code, 0) > 0:
+    if _owner_count(game_code) > 0:
         return
-    _end_deadline[game_code] = time.time() + delay_sec
+    deadline = repr(time.time() + delay_sec)
+    get_store().set(f"end_deadline:{game_code}", deadline)
 
-    def _runner(code: str, deadline: float):
-        sleep_for = max(0.0, deadline - time.time())
+    def _runner(code: str, deadline: str):
+        sleep_for = max(0.0, float(deadline) - time.time())
         if sleep_for:
             time.sleep(sleep_for)
-        if _owner_count.get(code, 0) == 0 and _end_deadline.get(code) == deadline:
+        # Another worker may have seen the owner reconnect meanwhile
+        if _owner_count(code) == 0 and _end_deadline(code) == deadline:
             _end_session(code)
 
     try:
-        socketio.start_background_task(_runner, game_code, _end_deadline[game_code])
+        socketio.start_background_task(_runner, game_code, deadline)
     except Exception:
-        _runner(game_code, _end_deadline[game_code])
+        _runner(game_code, deadline)
 
 def _cancel_scheduled_end(game_code: str) -> None:
-    _end_deadline.pop(game_code, None)
+    get_store().delete(f"end_deadline:{game_code}")
     
 
 
@@ -139,6 +216,7 @@ def register_socketio_handlers(testing: bool = False) -> None:
     socketio.on_event('join_game', handle_join_game, namespace='/ws')
     socketio.on_event('leave_game', handle_leave_game, namespace='/ws')
     socketio.on_event('ping', handle_ping, namespace='/ws')
+    socketio.on_event('resync', handle_resync, namespace='/ws')
 
     if testing:
         # Test-only mirror on default namespace
@@ -147,5 +225,6 @@ def register_socketio_handlers(testing: bool = False) -> None:
         socketio.on_event('join_game', handle_join_game, namespace='/')
         socketio.on_event('leave_game', handle_leave_game, namespace='/')
         socketio.on_event('ping', handle_ping, namespace='/')
+        socketio.on_event('resync', handle_resync, namespace='/')
 
 
@@ -0,0 +1,314 @@
+"""Micro-benchmarks for the game hot paths, as JSON.
+
+Each benchmark runs against an in-memory SQLite app built like the test
+fixture (`create_app(TestConfig)`), seeded with an in-progress game of
+`--players` players with `--stories` stories each, everyone but the author
+having guessed the current story. Only the operation itself is timed; the
+state it changes is put back between iterations, outside the clock.
+
+    cd backend
+    python benchmarks/hot_paths.py --output before.json
+    # ... change something ...
+    python benchmarks/hot_paths.py --output after.json --baseline before.json
+
+Benchmarks: `to_dict` (load + serialize the state), `score_current_round`,
+`submit_guess` (POST /guess), `advance_round` (POST /advance out of
+guessing), `generate_game_code` and `stage_timer` (a timer firing the
+scoreboard -> next round transition). Every result carries ops/sec, the
+mean/p50/p95 time per op and the SQL statements per op.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+BENCHMARKS = ('to_dict', 'score_current_round', 'submit_guess', 'advance_round', 'generate_game_code', 'stage_timer')
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+class BenchConfig:
+    TESTING = True
+    SECRET_KEY = 'bench-secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    REHYDRATE_TIMERS_ON_START = False
+    GAME_REAPER_INTERVAL_SEC = 0
+
+
+class QueryCounter:
+    """Counts statements sent to the engine while `active`."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.active = False
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        if self.active:
+            self.count += 1
+
+
+def _seed(players, stories_per_player):
+    """Create an in-progress game in the guessing stage of round 1."""
+    from app import db
+    from app.models import Game, Guess, Player, Story
+
+    game = Game(game_mode='free_for_all', stories_per_player=stories_per_player)
+    db.session.add(game)
+    db.session.flush()
+    roster = [Player(name=f'P{i}', game_id=game.id, has_submitted_story=True) for i in range(players)]
+    db.session.add_all(roster)
+    db.session.flush()
+    stories = [
+        Story(content=f'Story {n} by {p.name}', author_id=p.id, game_id=game.id)
+        for p in roster
+        for n in range(stories_per_player)
+    ]
+    db.session.add_all(stories)
+    db.session.flush()
+    author = roster[0]
+    story = next(s for s in stories if s.author_id == author.id)
+    game.status = 'in_progress'
+    game.stage = 'guessing'
+    game.play_order = json.dumps([p.id for p in roster])
+    game.total_rounds = players
+    game.current_round = 1
+    game.current_story_id = story.id
+    # Everyone else has guessed; half of them correctly
+    db.session.add_all(
+        Guess(story_id=story.id, guesser_id=p.id, guessed_player_id=author.id if i % 2 else roster[(i + 1) % players].id)
+        for i, p in enumerate(roster[1:], start=1)
+    )
+    db.session.commit()
+    return game.id, game.game_code, story.id, [p.id for p in roster]
+
+
+def _reset_round(game_id, story_id, stage):
+    """Put the seeded game back into `stage` of round 1 on its first story."""
+    from sqlalchemy import update
+
+    from app import db
+    from app.models import Game, Player, RoundResult, Story
+
+    RoundResult.delete_for_game(game_id)
+    db.session.execute(update(Player).where(Player.game_id == game_id).values(score=0))
+    db.session.execute(update(Story).where(Story.game_id == game_id).values(is_read=False))
+    db.session.execute(
+        update(Game).where(Game.id == game_id).values(
+            status='in_progress', stage=stage, current_round=1, current_story_id=story_id, stage_deadline=None
+        )
+    )
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def _make_cases(app, client, game_id, code, story_id, player_ids):
+    """name -> (setup, op, teardown); only `op` is timed."""
+    from sqlalchemy import delete
+
+    from app import db
+    from app.models import Game, Guess, generate_game_code
+    from app.services.games.scheduler import _fire_stage_timer
+    from app.services.games.scoring import score_current_round
+    from app.services.games.snapshot import load_game_for_snapshot
+
+    controller_id = min(player_ids)
+    guessers = player_ids[1:]
+    turn = {'i': 0, 'guesser': None, 'game': None}
+
+    def noop():
+        pass
+
+    def expunge():
+        db.session.expunge_all()
+
+    def to_dict():
+        load_game_for_snapshot(code).to_dict()
+
+    def score_setup():
+        db.session.expunge_all()
+        turn['game'] = db.session.get(Game, game_id)
+
+    def score():
+        score_current_round(turn['game'])
+
+    def score_undo():
+        db.session.rollback()
+
+    def guess_setup():
+        guesser = guessers[turn['i'] % len(guessers)]
+        turn['i'] += 1
+        turn['guesser'] = guesser
+        db.session.execute(delete(Guess).where(Guess.story_id == story_id, Guess.guesser_id == guesser))
+        db.session.commit()
+        db.session.expunge_all()
+
+    def guess():
+        res = client.post(f'/api/games/{code}/guess', json={'guesser_id': turn['guesser'], 'guessed_player_id': controller_id})
+        if res.status_code != 200:
+            raise RuntimeError(f"/guess returned {res.status_code}: {res.get_json()}")
+
+    def advance_setup():
+        _reset_round(game_id, story_id, 'guessing')
+
+    def advance():
+        res = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id})
+        if res.status_code != 200:
+            raise RuntimeError(f"/advance returned {res.status_code}: {res.get_json()}")
+
+    def timer_setup():
+        _reset_round(game_id, story_id, 'scoreboard')
+
+    def timer():
+        _fire_stage_timer(app, game_id, 'scoreboard', 1)
+
+    return {
+        'to_dict': (expunge, to_dict, noop),
+        'score_current_round': (score_setup, score, score_undo),
+        'submit_guess': (guess_setup, guess, noop),
+        'advance_round': (advance_setup, advance, noop),
+        'generate_game_code': (noop, generate_game_code, noop),
+        'stage_timer': (timer_setup, timer, noop),
+    }
+
+
+def run_case(setup, op, teardown, counter, min_time, max_iterations):
+    timings = []
+    queries = 0
+    total = 0.0
+    while len(timings) < max_iterations and (total < min_time or len(timings) < 3):
+        setup()
+        counter.count = 0
+        counter.active = True
+        t0 = time.perf_counter()
+        op()
+        elapsed = time.perf_counter() - t0
+        counter.active = False
+        teardown()
+        queries += counter.count
+        timings.append(elapsed)
+        total += elapsed
+    ms = [x * 1000.0 for x in timings]
+    return {
+        'ops': len(timings),
+        'ops_per_sec': len(timings) / total if total else 0.0,
+        'mean_ms': statistics.fmean(ms),
+        'p50_ms': _percentile(ms, 50),
+        'p95_ms': _percentile(ms, 95),
+        'queries_per_op': queries / len(timings),
+    }
+
+
+def run_suite(benchmarks, player_counts, story_counts, min_time, max_iterations):
+    from app import create_app, db
+    from app import models  # noqa: F401  (tables for create_all)
+
+    results = []
+    for stories in story_counts:
+        for players in player_counts:
+            app = create_app(BenchConfig)
+            with app.app_context():
+                db.create_all()
+                client = app.test_client()
+                counter = QueryCounter(db.engine)
+                game_id, code, story_id, player_ids = _seed(players, stories)
+                cases = _make_cases(app, client, game_id, code, story_id, player_ids)
+                for name in benchmarks:
+                    setup, op, teardown = cases[name]
+                    # Warm up statement caches and lazy imports
+                    setup()
+                    op()
+                    teardown()
+                    result = run_case(setup, op, teardown, counter, min_time, max_iterations)
+                    results.append({'benchmark': name, 'players': players, 'stories_per_player': stories, **result})
+                    print(
+                        f"{name:<22}players={players:<4}stories={stories:<2}"
+                        f"{result['ops_per_sec']:>10.1f} ops/s{result['queries_per_op']:>7.1f} q/op",
+                        file=sys.stderr,
+                    )
+                    _reset_round(game_id, story_id, 'guessing')
+                db.session.remove()
+                db.drop_all()
+    return results
+
+
+def compare(results, baseline_path):
+    """Print ops/sec and query-count changes against an earlier run."""
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+    before = {(r['benchmark'], r['players'], r['stories_per_player']): r for r in baseline.get('results', [])}
+    print(f"\n{'benchmark':<22}{'players':>8}{'stories':>8}{'ops/s':>12}{'change':>9}{'q/op':>8}{'was':>6}", file=sys.stderr)
+    for r in results:
+        old = before.get((r['benchmark'], r['players'], r['stories_per_player']))
+        if not old:
+            continue
+        change = (r['ops_per_sec'] / old['ops_per_sec'] - 1.0) if old['ops_per_sec'] else 0.0
+        print(
+            f"{r['benchmark']:<22}{r['players']:>8}{r['stories_per_player']:>8}{r['ops_per_sec']:>12.1f}"
+            f"{change:>+9.1%}{r['queries_per_op']:>8.1f}{old['queries_per_op']:>6.1f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--players', default='2,8,32,128', help='comma-separated player counts')
+    parser.add_argument('--stories', default='1,3', help='comma-separated stories per player (1-3)')
+    parser.add_argument('--min-time', type=float, default=0.5, help='timed seconds per benchmark and size')
+    parser.add_argument('--max-iterations', type=int, default=2000)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON output to compare against')
+    args = parser.parse_args(argv)
+    benchmarks = [b.strip() for b in args.benchmarks.split(',') if b.strip()]
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    sys.path.insert(0, BACKEND_ROOT)
+    import sqlalchemy
+
+    results = run_suite(
+        benchmarks,
+        [int(n) for n in args.players.split(',') if n.strip()],
+        [int(n) for n in args.stories.split(',') if n.strip()],
+        args.min_time,
+        args.max_iterations,
+    )
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'min_time_sec': args.min_time,
+        },
+        'results': results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(body + '\n')
+    else:
+        print(body)
+    if args.baseline:
+        compare(results, args.baseline)
+    return report
+
+
+if __name__ == '__main__':
+    main()
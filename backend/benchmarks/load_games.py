@@ -0,0 +1,321 @@
+"""Load-test a running server with whole games played by bot players.
+
+Each game is created through `/api/games/create`; its bots join, connect to
+`/ws`, submit their stories and the controller starts it. From then on the
+stage timers drive the game and every bot guesses during each `guessing`
+stage, until the game finishes and its session owner leaves (which deletes
+the game). Game counts ramp through `--games`; each step runs that many
+games at once and reports:
+
+- p50/p95/p99 latency and error counts per endpoint
+- socket delivery lag: `guess` is the time from sending a guess to the bot
+  seeing it in a `state_update`; `stage` is the time from a stage deadline
+  to the bot seeing the timer-driven transition
+- the error rate over all requests, and how many games finished
+
+Start the server with short stages so games finish quickly, then run:
+
+    cd backend
+    ROUND_INTRO_DURATION_SEC=1 GUESS_DURATION_SEC=3 SCOREBOARD_DURATION_SEC=1 \
+        FINAL_SCREEN_DURATION_SEC=60 python run.py
+    python benchmarks/load_games.py --url http://127.0.0.1:5000 --games 1,5,10,20 --bots 4
+
+The bots need a Socket.IO client: pip install "python-socketio[client]".
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+class Stats:
+    """Thread-safe latency, lag and error samples for one ramp step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)  # endpoint -> seconds
+        self.errors = defaultdict(int)  # endpoint -> failed requests
+        self.lag = defaultdict(list)  # 'guess' | 'stage' -> seconds
+        self.games_finished = 0
+        self.games_failed = 0
+
+    def request(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latency[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def add_lag(self, kind, seconds):
+        with self._lock:
+            self.lag[kind].append(seconds)
+
+    def game_done(self, finished):
+        with self._lock:
+            if finished:
+                self.games_finished += 1
+            else:
+                self.games_failed += 1
+
+
+class Http:
+    def __init__(self, base_url, stats, timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+
+    def call(self, method, endpoint, path, body=None, expected=()):
+        """Send a request; `endpoint` is the label latency is recorded under.
+
+        Status codes in `expected` (besides 2xx) do not count as errors.
+        """
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method, headers={'Content-Type': 'application/json'}
+        )
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                status, raw = res.status, res.read()
+        except urllib.error.HTTPError as exc:
+            status, raw = exc.code, exc.read()
+        except Exception:
+            self.stats.request(endpoint, time.perf_counter() - t0, False)
+            return None, None
+        self.stats.request(endpoint, time.perf_counter() - t0, 200 <= status < 300 or status in expected)
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+
+def apply_state_update(current, message):
+    """Python port of the frontend's `applyStateUpdate`; None means resync."""
+    if message.get('state'):
+        return message['state']
+    if not current or current.get('state_version') != message.get('base_version'):
+        return None
+    patch = dict(message.get('patch') or {})
+    players_patch = patch.pop('players', None)
+    nxt = {**current, **patch}
+    if players_patch:
+        removed = set(players_patch.get('remove') or [])
+        by_id = {p['id']: p for p in current.get('players') or [] if p['id'] not in removed}
+        for p in players_patch.get('upsert') or []:
+            by_id[p['id']] = {**by_id.get(p['id'], {}), **p}
+        nxt['players'] = list(by_id.values())
+    return nxt
+
+
+class Bot:
+    """One player: a Socket.IO connection that guesses whenever it can."""
+
+    def __init__(self, game, player, is_owner):
+        import socketio
+
+        self.game = game
+        self.player = player
+        self.is_owner = is_owner
+        self.state = None
+        self.guessed_story = None
+        self.guess_sent_at = None
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('state_snapshot', self._on_snapshot, namespace='/ws')
+        self.sio.on('state_update', self._on_update, namespace='/ws')
+        self.sio.on('session_ended', lambda data: self.game.finished.set(), namespace='/ws')
+
+    def connect(self, url):
+        self.sio.connect(url, namespaces=['/ws'], wait_timeout=10)
+        self.sio.emit('join_game', {'game_code': self.game.code, 'is_session_owner': self.is_owner}, namespace='/ws')
+
+    def close(self):
+        try:
+            if self.is_owner:
+                self.sio.emit('leave_game', {'game_code': self.game.code}, namespace='/ws')
+                time.sleep(0.2)
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+    def _on_snapshot(self, message):
+        self._set_state(message.get('state'))
+
+    def _on_update(self, message):
+        state = apply_state_update(self.state, message)
+        if state is None:
+            self.sio.emit('resync', {'game_code': self.game.code}, namespace='/ws')
+            return
+        self._set_state(state)
+
+    def _set_state(self, state):
+        if not state:
+            return
+        now = time.time()
+        prev = self.state
+        self.state = state
+        if prev and prev.get('stage') != state.get('stage'):
+            deadline = prev.get('stage_deadline')
+            # Only timer-driven transitions; early advances beat the deadline
+            if deadline and now >= deadline:
+                self.game.stats.add_lag('stage', now - deadline)
+        story = state.get('current_story') or {}
+        if self.guess_sent_at is not None and story.get('id') == self.guessed_story:
+            me = next((p for p in state.get('players') or [] if p['id'] == self.player['id']), None)
+            if me and me.get('has_guessed_current'):
+                self.game.stats.add_lag('guess', time.perf_counter() - self.guess_sent_at)
+                self.guess_sent_at = None
+        if state.get('status') == 'finished':
+            self.game.finished.set()
+        elif (
+            state.get('stage') == 'guessing'
+            and story.get('id')
+            and story.get('id') != self.guessed_story
+            and story.get('author_id') != self.player['id']
+        ):
+            self.guessed_story = story['id']
+            self.sio.start_background_task(self._guess, state)
+
+    def _guess(self, state):
+        others = [p['id'] for p in state.get('players') or [] if p['id'] != self.player['id']]
+        if not others:
+            return
+        self.guess_sent_at = time.perf_counter()
+        status, _ = self.game.http.call(
+            'POST', 'POST /guess', f'/api/games/{self.game.code}/guess',
+            {'guesser_id': self.player['id'], 'guessed_player_id': random.choice(others)},
+            # The stage can end while the guess is in flight
+            expected=(400,),
+        )
+        if status != 200:
+            self.guess_sent_at = None
+
+
+class GameRun:
+    def __init__(self, url, stats, bots, timeout):
+        self.url = url
+        self.stats = stats
+        self.http = Http(url, stats)
+        self.n_bots = bots
+        self.timeout = timeout
+        self.code = None
+        self.bots = []
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            self._play()
+            ok = self.finished.wait(self.timeout)
+        except Exception as exc:
+            print(f"[load] game={self.code} failed: {exc}", file=sys.stderr)
+            ok = False
+        finally:
+            for bot in self.bots:
+                bot.close()
+        self.stats.game_done(ok)
+
+    def _play(self):
+        status, body = self.http.call('POST', 'POST /create', '/api/games/create', {})
+        if status != 201:
+            raise RuntimeError(f"create returned {status}")
+        self.code = body['game_code']
+        players = []
+        for i in range(self.n_bots):
+            status, player = self.http.call('POST', 'POST /join', '/api/games/join', {'game_code': self.code, 'name': f'Bot{i}'})
+            if status != 201:
+                raise RuntimeError(f"join returned {status}")
+            players.append(player)
+        for i, player in enumerate(players):
+            bot = Bot(self, player, is_owner=(i == 0))
+            self.bots.append(bot)
+            bot.connect(self.url)
+        for player in players:
+            self.http.call(
+                'POST', 'POST /stories', f'/api/games/{self.code}/stories',
+                {'player_id': player['id'], 'story': f"A story by {player['name']}"},
+            )
+        self.http.call('GET', 'GET /state', f'/api/games/{self.code}/state')
+        controller_id = min(p['id'] for p in players)
+        status, _ = self.http.call('POST', 'POST /start', f'/api/games/{self.code}/start', {'controller_id': controller_id})
+        if status != 200:
+            raise RuntimeError(f"start returned {status}")
+
+
+def run_step(url, games, bots, timeout):
+    stats = Stats()
+    runs = [GameRun(url, stats, bots, timeout) for _ in range(games)]
+    threads = [threading.Thread(target=r.run, daemon=True) for r in runs]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats, time.perf_counter() - started
+
+
+def report(games, stats, elapsed):
+    total = sum(len(v) for v in stats.latency.values())
+    errors = sum(stats.errors.values())
+    print(
+        f"\n== {games} game(s): finished={stats.games_finished} failed={stats.games_failed} "
+        f"requests={total} error_rate={(errors / total if total else 0.0):.2%} elapsed={elapsed:.1f}s"
+    )
+    print(f"{'endpoint':<16}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint in sorted(stats.latency):
+        ms = [x * 1000.0 for x in stats.latency[endpoint]]
+        print(
+            f"{endpoint:<16}{len(ms):>8}{stats.errors[endpoint]:>8}"
+            f"{_percentile(ms, 50):>10.1f}{_percentile(ms, 95):>10.1f}{_percentile(ms, 99):>10.1f}"
+        )
+    for kind in ('guess', 'stage'):
+        ms = [x * 1000.0 for x in stats.lag[kind]]
+        print(
+            f"{'lag ' + kind:<16}{len(ms):>8}{'':>8}"
+            f"{_percentile(ms, 50):>10.1f}{_percentile(ms, 95):>10.1f}{_percentile(ms, 99):>10.1f}"
+        )
+    return {
+        'games': games,
+        'finished': stats.games_finished,
+        'failed': stats.games_failed,
+        'requests': total,
+        'errors': errors,
+        'elapsed_sec': elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--games', default='1,5,10', help='comma-separated concurrent game counts to ramp through')
+    parser.add_argument('--bots', type=int, default=4, help='players per game')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds a game may take to finish')
+    args = parser.parse_args(argv)
+    try:
+        import requests  # noqa: F401  (socketio.Client's HTTP transport)
+        import socketio  # noqa: F401
+    except ImportError:
+        parser.error('the bots need a Socket.IO client: pip install "python-socketio[client]"')
+    if args.bots < 2:
+        parser.error('a game needs at least 2 bots')
+
+    results = []
+    for games in [int(n) for n in args.games.split(',') if n.strip()]:
+        stats, elapsed = run_step(args.url, games, args.bots, args.timeout)
+        results.append(report(games, stats, elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""JSON vs MessagePack for state payloads: encode time and size, as JSON.
+
+Builds the `GET /state` payload of a seeded in-progress game (see
+`hot_paths.py`) for each `--players` count and times encoding it:
+
+- `http`: the /state body (Flask's JSON provider vs `msgpack.packb`)
+- `socketio`: a `state_update` event packet on /ws (the default Socket.IO
+  parser vs the msgpack parser used with SOCKETIO_SERIALIZER=msgpack)
+
+plus decoding each body back, since clients pay that side. Needs the
+optional `msgpack` package.
+
+    cd backend
+    python benchmarks/state_encoding.py --players 8,32,128
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _time(op, min_time, max_iterations):
+    timings = []
+    total = 0.0
+    while len(timings) < max_iterations and (total < min_time or len(timings) < 3):
+        t0 = time.perf_counter()
+        op()
+        elapsed = time.perf_counter() - t0
+        timings.append(elapsed)
+        total += elapsed
+    return statistics.fmean(timings) * 1e6
+
+
+def _encoders(app, payload):
+    """(layer, format) -> (encode, decode) over the same payload."""
+    import msgpack
+    from socketio import msgpack_packet, packet
+
+    from app.services.games.encoding import encode_state
+
+    def sio_json():
+        return packet.Packet(packet.EVENT, data=['state_update', payload], namespace='/ws').encode()
+
+    def sio_msgpack():
+        return msgpack_packet.MsgPackPacket(packet.EVENT, data=['state_update', payload], namespace='/ws').encode()
+
+    return {
+        ('http', 'json'): (lambda: encode_state(payload, 'json')[0], app.json.loads),
+        ('http', 'msgpack'): (lambda: encode_state(payload, 'msgpack')[0], msgpack.unpackb),
+        ('socketio', 'json'): (sio_json, lambda raw: packet.Packet(encoded_packet=raw)),
+        ('socketio', 'msgpack'): (sio_msgpack, lambda raw: msgpack_packet.MsgPackPacket(encoded_packet=raw)),
+    }
+
+
+def run_suite(player_counts, stories, min_time, max_iterations):
+    from app import create_app, db
+    from app import models  # noqa: F401  (tables for create_all)
+    from app.services.games.snapshot import build_state_payload, load_game_for_snapshot
+    from hot_paths import BenchConfig, _seed
+
+    results = []
+    for players in player_counts:
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            _game_id, code, _story_id, _player_ids = _seed(players, stories)
+            payload = build_state_payload(load_game_for_snapshot(code))
+            for (layer, fmt), (encode, decode) in _encoders(app, payload).items():
+                raw = encode()
+                result = {
+                    'layer': layer,
+                    'format': fmt,
+                    'players': players,
+                    'bytes': len(raw),
+                    'encode_us': _time(encode, min_time, max_iterations),
+                    'decode_us': _time(lambda: decode(raw), min_time, max_iterations),
+                }
+                results.append(result)
+                print(
+                    f"{layer:<10}{fmt:<9}players={players:<5}{result['bytes']:>9} B"
+                    f"{result['encode_us']:>10.1f} us enc{result['decode_us']:>10.1f} us dec",
+                    file=sys.stderr,
+                )
+            db.session.remove()
+            db.drop_all()
+    return results
+
+
+def summarize(results):
+    """Print msgpack relative to JSON for each layer and size."""
+    by_key = {(r['layer'], r['format'], r['players']): r for r in results}
+    print(f"\n{'layer':<10}{'players':>8}{'size':>9}{'encode':>9}{'decode':>9}  (msgpack vs json)", file=sys.stderr)
+    for (layer, fmt, players), packed in by_key.items():
+        plain = by_key.get((layer, 'json', players))
+        if fmt != 'msgpack' or not plain:
+            continue
+        print(
+            f"{layer:<10}{players:>8}"
+            f"{packed['bytes'] / plain['bytes'] - 1.0:>+9.1%}"
+            f"{packed['encode_us'] / plain['encode_us'] - 1.0:>+9.1%}"
+            f"{packed['decode_us'] / plain['decode_us'] - 1.0:>+9.1%}",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--players', default='8,32,128', help='comma-separated player counts')
+    parser.add_argument('--stories', type=int, default=3, help='stories per player (1-3)')
+    parser.add_argument('--min-time', type=float, default=0.3, help='timed seconds per encoder and size')
+    parser.add_argument('--max-iterations', type=int, default=20000)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_ROOT)
+    try:
+        import msgpack
+    except ImportError:
+        parser.error('the msgpack package is required (pip install msgpack)')
+
+    results = run_suite(
+        [int(n) for n in args.players.split(',') if n.strip()],
+        args.stories,
+        args.min_time,
+        args.max_iterations,
+    )
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'msgpack': '.'.join(str(part) for part in msgpack.version),
+            'min_time_sec': args.min_time,
+        },
+        'results': results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(body + '\n')
+    else:
+        print(body)
+    summarize(results)
+    return report
+
+
+if __name__ == '__main__':
+    main()
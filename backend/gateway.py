@@ -0,0 +1,5 @@
+from app.services.realtime.gateway import main
+
+if __name__ == '__main__':
+    # Standalone asyncio process owning the /ws sockets; see the module docstring
+    main()
@@ -107,6 +107,11 @@ with app.app_context():
         connectable = get_engine()
 
         with connectable.connect() as connection:
+            if connection.dialect.name == 'sqlite':
+                # The app turns foreign keys on for SQLite; batch migrations
+                # recreate tables and need them off (outside a transaction)
+                connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+                connection.commit()
             context.configure(
                 connection=connection,
                 target_metadata=get_metadata(),
@@ -0,0 +1,76 @@
+"""cascade game-owned foreign keys; add game.updated_at for the reaper
+
+Revision ID: a3c9d7e1f284
+Revises: f17c3a9b5d42
+Create Date: 2026-10-17 15:00:00
+"""
+
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9d7e1f284'
+down_revision = 'f17c3a9b5d42'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table, ondelete)
+FOREIGN_KEYS = [
+    ('player', 'game_id', 'game', 'CASCADE'),
+    ('story', 'game_id', 'game', 'CASCADE'),
+    ('story', 'author_id', 'player', 'CASCADE'),
+    ('guess', 'story_id', 'story', 'CASCADE'),
+    ('guess', 'guesser_id', 'player', 'CASCADE'),
+    ('guess', 'guessed_player_id', 'player', 'CASCADE'),
+    ('round_result', 'game_id', 'game', 'CASCADE'),
+    ('round_guess', 'round_result_id', 'round_result', 'CASCADE'),
+    ('game', 'current_story_id', 'story', 'SET NULL'),
+]
+
+# Names for constraints the database did not name (SQLite)
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _replace_foreign_keys(cascade):
+    insp = sa.inspect(op.get_bind())
+    tables = []
+    for table, *_ in FOREIGN_KEYS:
+        if table not in tables:
+            tables.append(table)
+    for table in tables:
+        existing = {tuple(fk['constrained_columns']): fk.get('name') for fk in insp.get_foreign_keys(table)}
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for t, column, referred, ondelete in FOREIGN_KEYS:
+                if t != table:
+                    continue
+                name = existing.get((column,)) or f"fk_{table}_{column}_{referred}"
+                if (column,) in existing:
+                    batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(
+                    name, referred, [column], ['id'], ondelete=ondelete if cascade else None
+                )
+
+
+def upgrade():
+    _replace_foreign_keys(cascade=True)
+
+    insp = sa.inspect(op.get_bind())
+    if 'updated_at' not in {c['name'] for c in insp.get_columns('game')}:
+        with op.batch_alter_table('game') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.Float(), nullable=True))
+        # Existing games count as active now; the reaper ages them from here
+        op.execute(sa.text('UPDATE game SET updated_at = :now').bindparams(now=time.time()))
+    existing = {ix['name'] for ix in insp.get_indexes('game')}
+    if 'ix_game_status_updated_at' not in existing:
+        op.create_index('ix_game_status_updated_at', 'game', ['status', 'updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_game_status_updated_at', table_name='game')
+    with op.batch_alter_table('game') as batch_op:
+        batch_op.drop_column('updated_at')
+    _replace_foreign_keys(cascade=False)
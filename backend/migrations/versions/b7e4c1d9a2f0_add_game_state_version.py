@@ -0,0 +1,30 @@
+"""add state_version to game
+
+Revision ID: b7e4c1d9a2f0
+Revises: merge_20250827, 8f1b2c3a4d5e
+Create Date: 2026-10-17 09:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c1d9a2f0'
+down_revision = ('merge_20250827', '8f1b2c3a4d5e')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    cols = {c['name'] for c in insp.get_columns('game')}
+    if 'state_version' not in cols:
+        with op.batch_alter_table('game') as batch_op:
+            batch_op.add_column(sa.Column('state_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('game') as batch_op:
+        batch_op.drop_column('state_version')
@@ -0,0 +1,28 @@
+"""index game (status, stage_deadline) for timer rehydration
+
+Revision ID: c41d7e2f9b10
+Revises: b7e4c1d9a2f0
+Create Date: 2026-10-17 10:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e2f9b10'
+down_revision = 'b7e4c1d9a2f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    existing = {ix['name'] for ix in insp.get_indexes('game')}
+    if 'ix_game_status_stage_deadline' not in existing:
+        op.create_index('ix_game_status_stage_deadline', 'game', ['status', 'stage_deadline'])
+
+
+def downgrade():
+    op.drop_index('ix_game_status_stage_deadline', table_name='game')
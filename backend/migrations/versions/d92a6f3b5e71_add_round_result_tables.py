@@ -0,0 +1,108 @@
+"""add round_result and round_guess; backfill from game.round_history
+
+Revision ID: d92a6f3b5e71
+Revises: c41d7e2f9b10
+Create Date: 2026-10-17 11:00:00
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd92a6f3b5e71'
+down_revision = 'c41d7e2f9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    existing_tables = set(insp.get_table_names())
+
+    if 'round_result' not in existing_tables:
+        op.create_table(
+            'round_result',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('game_id', sa.Integer(), sa.ForeignKey('game.id'), nullable=False),
+            sa.Column('round', sa.Integer(), nullable=False),
+            sa.Column('story_id', sa.Integer(), nullable=True),
+            sa.Column('author_id', sa.Integer(), nullable=True),
+            sa.Column('author_points_awarded', sa.Integer(), nullable=False, server_default='0'),
+        )
+        op.create_index('ix_round_result_game_id_id', 'round_result', ['game_id', 'id'])
+    if 'round_guess' not in existing_tables:
+        op.create_table(
+            'round_guess',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('round_result_id', sa.Integer(), sa.ForeignKey('round_result.id'), nullable=False),
+            sa.Column('guesser_id', sa.Integer(), nullable=False),
+            sa.Column('guessed_player_id', sa.Integer(), nullable=False),
+            sa.Column('correct', sa.Boolean(), nullable=False, server_default=sa.false()),
+        )
+        op.create_index('ix_round_guess_round_result_id', 'round_guess', ['round_result_id'])
+
+    # Backfill from the legacy JSON column, one append per recorded round
+    game = sa.table('game', sa.column('id', sa.Integer), sa.column('round_history', sa.Text))
+    round_result = sa.table(
+        'round_result',
+        sa.column('id', sa.Integer),
+        sa.column('game_id', sa.Integer),
+        sa.column('round', sa.Integer),
+        sa.column('story_id', sa.Integer),
+        sa.column('author_id', sa.Integer),
+        sa.column('author_points_awarded', sa.Integer),
+    )
+    round_guess = sa.table(
+        'round_guess',
+        sa.column('round_result_id', sa.Integer),
+        sa.column('guesser_id', sa.Integer),
+        sa.column('guessed_player_id', sa.Integer),
+        sa.column('correct', sa.Boolean),
+    )
+    already = {row[0] for row in bind.execute(sa.select(round_result.c.game_id).distinct())}
+    rows = bind.execute(sa.select(game.c.id, game.c.round_history).where(game.c.round_history.isnot(None))).fetchall()
+    for game_id, raw in rows:
+        if game_id in already:
+            continue
+        try:
+            history = json.loads(raw) or []
+        except Exception:
+            continue
+        for entry in history:
+            if not isinstance(entry, dict):
+                continue
+            author_id = entry.get('author_id')
+            result_id = bind.execute(
+                round_result.insert()
+                .values(
+                    game_id=game_id,
+                    round=int(entry.get('round') or 0),
+                    story_id=entry.get('story_id'),
+                    author_id=author_id,
+                    author_points_awarded=int(entry.get('author_points_awarded') or 0),
+                )
+                .returning(round_result.c.id)
+            ).scalar()
+            guesses = [
+                {
+                    'round_result_id': result_id,
+                    'guesser_id': g.get('guesser_id'),
+                    'guessed_player_id': g.get('guessed_player_id'),
+                    'correct': g.get('guessed_player_id') == author_id,
+                }
+                for g in entry.get('guesses') or []
+                if g.get('guesser_id') is not None and g.get('guessed_player_id') is not None
+            ]
+            if guesses:
+                bind.execute(round_guess.insert(), guesses)
+
+
+def downgrade():
+    op.drop_index('ix_round_guess_round_result_id', table_name='round_guess')
+    op.drop_table('round_guess')
+    op.drop_index('ix_round_result_game_id_id', table_name='round_result')
+    op.drop_table('round_result')
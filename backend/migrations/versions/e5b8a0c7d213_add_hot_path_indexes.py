@@ -0,0 +1,63 @@
+"""add composite indexes for hot game queries
+
+Revision ID: e5b8a0c7d213
+Revises: d92a6f3b5e71
+Create Date: 2026-10-17 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8a0c7d213'
+down_revision = 'd92a6f3b5e71'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_player_game_id', 'player', ['game_id'], False),
+    ('ix_story_game_author_read', 'story', ['game_id', 'author_id', 'is_read'], False),
+    ('uq_guess_story_guesser', 'guess', ['story_id', 'guesser_id'], True),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # The unique index cannot be built over duplicate guesses; keep the first one
+    op.execute(
+        "DELETE FROM guess WHERE id NOT IN ("
+        "SELECT MIN(id) FROM guess GROUP BY story_id, guesser_id)"
+    )
+
+    missing = []
+    for name, table, cols, unique in INDEXES:
+        existing = {ix['name'] for ix in insp.get_indexes(table)}
+        if name not in existing:
+            missing.append((name, table, cols, unique))
+    if not missing:
+        return
+
+    if is_postgres:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, table, cols, unique in missing:
+                op.create_index(name, table, cols, unique=unique, postgresql_concurrently=True)
+    else:
+        for name, table, cols, unique in missing:
+            op.create_index(name, table, cols, unique=unique)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _cols, _unique in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _cols, _unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
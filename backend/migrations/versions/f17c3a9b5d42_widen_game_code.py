@@ -0,0 +1,26 @@
+"""widen game.game_code for configurable code length
+
+Revision ID: f17c3a9b5d42
+Revises: e5b8a0c7d213
+Create Date: 2026-10-17 14:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f17c3a9b5d42'
+down_revision = 'e5b8a0c7d213'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game') as batch_op:
+        batch_op.alter_column('game_code', existing_type=sa.String(length=4), type_=sa.String(length=8))
+
+
+def downgrade():
+    with op.batch_alter_table('game') as batch_op:
+        batch_op.alter_column('game_code', existing_type=sa.String(length=8), type_=sa.String(length=4))
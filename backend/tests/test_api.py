@@ -1,3 +1,6 @@
+import pytest
+
+
 def test_create_game(client):
     res = client.post('/api/games/create')
     assert res.status_code == 201
@@ -121,3 +124,288 @@ def test_guess_and_scoring_flow(client):
         assert players[author_id]['score'] == 1
 
 
+
+
+def _count_state_queries(flask_app, client, code, query=''):
+    from sqlalchemy import event
+    from app import db
+    statements = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _on_execute)
+    try:
+        res = client.get(f'/api/games/{code}/state{query}')
+        assert res.status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', _on_execute)
+    return len(statements)
+
+
+def _setup_guessing_game(client, n_players):
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [
+        client.post('/api/games/join', json={'game_code': code, 'name': f'P{i}'}).get_json()
+        for i in range(n_players)
+    ]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': f"story {p['id']}"})
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    adv = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}).get_json()
+    author_id = adv['play_order'][0]
+    for p in players:
+        if p['id'] != author_id:
+            client.post(f'/api/games/{code}/guess', json={'guesser_id': p['id'], 'guessed_player_id': author_id})
+    return code
+
+
+def test_state_query_count_constant_in_player_count(flask_app, client):
+    small = _count_state_queries(flask_app, client, _setup_guessing_game(client, 2))
+    large = _count_state_queries(flask_app, client, _setup_guessing_game(client, 12))
+    assert small == large
+    assert large <= 4
+
+
+def test_state_projections_and_field_selection(flask_app, client):
+    from app.services.games.snapshot import STATE_PROJECTIONS
+
+    code = _setup_guessing_game(client, 6)
+    full = client.get(f'/api/games/{code}/state')
+    player = client.get(f'/api/games/{code}/state?role=player')
+    assert player.status_code == 200
+    assert set(player.get_json()) == STATE_PROJECTIONS['player']
+    assert 'round_history' not in player.get_json()
+    assert len(player.get_data()) < len(full.get_data())
+    # Each projection has its own ETag and cache entry
+    assert player.headers['ETag'] != full.headers['ETag']
+    assert _count_state_queries(flask_app, client, code, '?role=player') == 0
+
+    # A countdown poll needs the game row only
+    assert _count_state_queries(flask_app, client, code, '?fields=stage,stage_deadline') == 1
+    minimal = client.get(f'/api/games/{code}/state?fields=stage,stage_deadline').get_json()
+    assert set(minimal) == {'id', 'game_code', 'state_version', 'stage', 'stage_deadline'}
+    assert minimal['stage'] == 'guessing'
+
+    display = client.get(f'/api/games/{code}/state?role=display&fields=players,play_order').get_json()
+    assert set(display) == {'id', 'game_code', 'state_version', 'players', 'play_order'}
+    assert all('has_guessed_current' in p for p in display['players'])
+    assert client.get(f'/api/games/{code}/state?role=referee').status_code == 400
+    assert client.get(f'/api/games/{code}/state?fields=stage,secret').status_code == 400
+
+
+def test_state_msgpack_negotiation(client):
+    msgpack = pytest.importorskip('msgpack')
+
+    code = _setup_guessing_game(client, 4)
+    as_json = client.get(f'/api/games/{code}/state')
+    packed = client.get(f'/api/games/{code}/state', headers={'Accept': 'application/msgpack'})
+    assert packed.status_code == 200
+    assert packed.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(packed.get_data(), raw=False) == as_json.get_json()
+    assert len(packed.get_data()) < len(as_json.get_data())
+    # Encodings are cached and validated separately
+    assert packed.headers['ETag'] != as_json.headers['ETag']
+    assert 'Accept' in packed.headers['Vary']
+    again = client.get(f'/api/games/{code}/state', headers={'Accept': 'application/msgpack'})
+    assert again.get_data() == packed.get_data()
+    # JSON wins when the client accepts both
+    either = client.get(f'/api/games/{code}/state', headers={'Accept': 'application/json, application/msgpack'})
+    assert either.mimetype == 'application/json'
+
+
+def test_state_gzip_cached_per_version(flask_app, client, monkeypatch):
+    import gzip
+    import json
+
+    from app.services.games import compression
+
+    code = _setup_guessing_game(client, 12)
+    plain = client.get(f'/api/games/{code}/state')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.get_data()) >= 1024  # the default COMPRESS_MIN_BYTES
+
+    calls = []
+    compress_body = compression.compress_body
+    monkeypatch.setattr(
+        'app.api.games.compress_body', lambda body, coding: calls.append(coding) or compress_body(body, coding)
+    )
+    headers = {'Accept-Encoding': 'gzip'}
+    res = client.get(f'/api/games/{code}/state', headers=headers)
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in res.headers['Vary']
+    assert gzip.decompress(res.get_data()) == plain.get_data()
+    assert res.headers['ETag'] == plain.headers['ETag'].rstrip('"') + '-gzip"'
+    # Repeat polls reuse the compressed bytes, and revalidate against either ETag
+    assert client.get(f'/api/games/{code}/state', headers=headers).get_data() == res.get_data()
+    assert calls == ['gzip']
+    for etag in (res.headers['ETag'], plain.headers['ETag']):
+        assert client.get(f'/api/games/{code}/state', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    # Below the threshold bodies go out as they are
+    small = client.get(f'/api/games/{code}/state?fields=stage', headers=headers)
+    assert 'Content-Encoding' not in small.headers
+    # Other JSON responses of the blueprint are compressed by the after_request hook
+    controller_id = min(p['id'] for p in plain.get_json()['players'])
+    adv = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}, headers=headers)
+    assert adv.status_code == 200
+    assert adv.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(adv.get_data()))['stage'] == 'scoreboard'
+
+
+def test_state_version_never_moves_backwards(flask_app, client):
+    from app.models import Game
+    from app.services.games.state import known_state_version, note_state_version
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'})
+    game_id, latest = known_state_version(code)
+    # A slow request noting the version it loaded earlier must not win
+    stale = Game(id=game_id, game_code=code, state_version=latest - 1)
+    assert note_state_version(stale) == latest - 1
+    assert known_state_version(code) == (game_id, latest)
+    # A GET answers with the latest ETag, not the stale one
+    assert client.get(f'/api/games/{code}/state').headers['ETag'] == f'"{game_id}-{latest}"'
+    # A newer game (higher id) reusing the code replaces the entry
+    newer = Game(id=game_id + 1, game_code=code, state_version=0)
+    note_state_version(newer)
+    assert known_state_version(code) == (game_id + 1, 0)
+
+
+def test_state_etag_and_version_bumps(client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    res = client.get(f'/api/games/{code}/state')
+    etag = res.headers['ETag']
+    v0 = res.get_json()['state_version']
+    # Unchanged state revalidates with a 304
+    res = client.get(f'/api/games/{code}/state', headers={'If-None-Match': etag})
+    assert res.status_code == 304
+    # A mutation bumps the version and invalidates the ETag
+    client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'})
+    res = client.get(f'/api/games/{code}/state', headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    assert res.headers['ETag'] != etag
+    state = res.get_json()
+    assert state['state_version'] > v0
+    assert any(p['name'] == 'Alice' for p in state['players'])
+
+
+def test_state_served_from_cache_without_queries(flask_app, client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'})
+    first = client.get(f'/api/games/{code}/state').get_json()
+    assert _count_state_queries(flask_app, client, code) == 0
+    assert client.get(f'/api/games/{code}/state').get_json() == first
+
+
+def test_score_current_round_set_based(client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in ('A', 'B', 'C', 'D')]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    adv = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}).get_json()
+    author_id = adv['play_order'][0]
+    others = [p['id'] for p in players if p['id'] != author_id]
+    # One correct guess, one wrong guess, one missing guess
+    client.post(f'/api/games/{code}/guess', json={'guesser_id': others[0], 'guessed_player_id': author_id})
+    client.post(f'/api/games/{code}/guess', json={'guesser_id': others[1], 'guessed_player_id': others[0]})
+
+    # guessing -> scoreboard scores the round in the transition's transaction
+    client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id})
+
+    state = client.get(f'/api/games/{code}/state').get_json()
+    assert state['stage'] == 'scoreboard'
+    scores = {p['id']: p['score'] for p in state['players']}
+    assert scores[others[0]] == 1
+    assert scores[others[1]] == 0
+    assert scores[author_id] == 2
+    summary = state['round_history'][-1]
+    assert summary['correct_guessers'] == [others[0]]
+    assert summary['author_points_awarded'] == 2
+    assert len(summary['guesses']) == 2
+
+
+def test_round_results_recorded_and_paged(client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in ('A', 'B')]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    state = None
+    for _ in range(6):
+        state = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}).get_json()
+    assert state['status'] == 'finished'
+    # Finished games carry the full recap
+    assert [r['round'] for r in state['round_history']] == [1, 2]
+
+    page1 = client.get(f'/api/games/{code}/rounds?limit=1').get_json()
+    assert [r['round'] for r in page1['rounds']] == [1]
+    page2 = client.get(f"/api/games/{code}/rounds?limit=1&after={page1['next_cursor']}").get_json()
+    assert [r['round'] for r in page2['rounds']] == [2]
+    assert page2['next_cursor'] is None
+
+
+def test_guessing_transition_commits_once(flask_app, client):
+    from sqlalchemy import event
+    from app import db
+
+    code = _setup_guessing_game(client, 3)
+    controller_id = min(p['id'] for p in client.get(f'/api/games/{code}/state').get_json()['players'])
+    commits = []
+
+    def _on_commit(conn):
+        commits.append(conn)
+
+    event.listen(db.engine, 'commit', _on_commit)
+    try:
+        res = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id})
+    finally:
+        event.remove(db.engine, 'commit', _on_commit)
+    assert res.get_json()['stage'] == 'scoreboard'
+    # Scoring, marking the story read and the stage change share one transaction
+    assert len(commits) == 1
+
+
+def test_guess_tracker_decides_without_queries(flask_app, client):
+    from sqlalchemy import event
+    from app import db
+    from app.models import Game, Story
+    from app.services.games.guesses import clear_guess_tracker, record_guess
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in ('A', 'B', 'C', 'D')]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id})
+    game = Game.query.filter_by(game_code=code).first()
+    story_id = game.current_story_id
+    author_id = db.session.get(Story, story_id).author_id
+    others = [p['id'] for p in players if p['id'] != author_id]
+
+    # The first guess seeds the tracker from the database...
+    assert record_guess(game, story_id, author_id, others[0]) is False
+    statements = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _on_execute)
+    try:
+        # ...after which each guess is a set insert, duplicates included
+        assert record_guess(game, story_id, author_id, others[1]) is False
+        assert record_guess(game, story_id, author_id, others[1]) is False
+        assert record_guess(game, story_id, author_id, others[2]) is True
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _on_execute)
+    assert statements == []
+
+    clear_guess_tracker(code, story_id)
+    # A cleared tracker reseeds from the (empty) guess table
+    assert record_guess(game, story_id, author_id, others[0]) is False
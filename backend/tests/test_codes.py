@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.services.games.codes import CodeAllocator
+
+
+def test_code_allocator_walks_every_code_once():
+    alloc = CodeAllocator(length=2, rng=random.Random(7))
+    codes = [alloc.allocate() for _ in range(alloc.size)]
+    assert len(set(codes)) == alloc.size == 36 ** 2
+    assert all(len(c) == 2 for c in codes)
+    with pytest.raises(RuntimeError):
+        alloc.allocate()
+    # Released codes go back to the pool
+    alloc.release(codes[10])
+    assert alloc.allocate() == codes[10]
+
+
+def test_next_codes_cannot_be_derived_from_previous_ones():
+    alloc = CodeAllocator(length=4, rng=random.Random(3))
+    numbers = [alloc.decode(alloc.allocate()) for _ in range(6)]
+    step = numbers[1] - numbers[0]
+    # An affine walk would give numbers[0] + k * step for every later code
+    predicted = [(numbers[1] + k * step) % alloc.size for k in range(1, 5)]
+    assert all(p != n for p, n in zip(predicted, numbers[2:]))
+    assert len({b - a for a, b in zip(numbers, numbers[1:])}) == len(numbers) - 1
+    # Another process (another key) walks a different order
+    other = CodeAllocator(length=4, rng=random.Random(4))
+    assert [other.decode(other.allocate()) for _ in range(6)] != numbers
+
+
+def test_code_allocator_skips_codes_already_in_db():
+    taken = ['AA', 'AB', 'ZZ']
+    stored = list(taken)
+    calls = []
+
+    def load_used():
+        calls.append(1)
+        return stored
+
+    alloc = CodeAllocator(length=2, load_used=load_used, rng=random.Random(1))
+    for _ in range(alloc.size - len(taken)):
+        stored.append(alloc.allocate())
+    assert len(set(stored)) == alloc.size
+    # Loaded once up front, once more when the pool runs dry
+    assert len(calls) == 1
+    with pytest.raises(RuntimeError):
+        alloc.allocate()
+    assert len(calls) == 2
+
+
+def test_create_uses_configured_code_length(flask_app, client):
+    flask_app.config['GAME_CODE_LENGTH'] = 6
+    code = client.post('/api/games/create').get_json()['game_code']
+    assert len(code) == 6
+    assert client.get(f'/api/games/{code}/state').status_code == 200
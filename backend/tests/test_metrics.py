@@ -0,0 +1,68 @@
+from app.services.metrics.http import REQUEST_LATENCY, REQUEST_SQL_SECONDS, REQUEST_SQL_STATEMENTS
+from app.services.metrics.registry import Registry
+
+
+def test_state_requests_record_latency_and_sql(flask_app, client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    client.post('/api/games/join', json={'game_code': code, 'name': 'A'})
+    endpoint = 'games.get_game_state'
+    before = REQUEST_SQL_STATEMENTS.count(endpoint=endpoint)
+    before_sql = REQUEST_SQL_STATEMENTS.sum(endpoint=endpoint)
+
+    from app.services.games.state import forget_game
+    forget_game(code)
+    assert client.get(f'/api/games/{code}/state').status_code == 200
+    assert REQUEST_SQL_STATEMENTS.count(endpoint=endpoint) == before + 1
+    # The uncached snapshot hits the database; the statements were counted
+    assert REQUEST_SQL_STATEMENTS.sum(endpoint=endpoint) > before_sql
+    assert REQUEST_SQL_SECONDS.count(endpoint=endpoint) == before + 1
+    assert REQUEST_LATENCY.count(endpoint=endpoint, method='GET', status=200) >= 1
+
+    res = client.get('/metrics')
+    assert res.status_code == 200
+    assert res.mimetype == 'text/plain'
+    body = res.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_sql_statements_count{endpoint="games.get_game_state"}' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="games.get_game_state",method="GET",status="200",le="+Inf"}' in body
+
+
+def test_metrics_token(flask_app, client):
+    flask_app.config['METRICS_TOKEN'] = 'scrape'
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).status_code == 200
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.histogram('op_seconds', 'Op time.', ('op',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(value, op='x')
+    registry.gauge('queue_depth', 'Depth.', func=lambda: 7)
+    lines = registry.render().splitlines()
+    assert 'op_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 'op_seconds_bucket{op="x",le="1"} 3' in lines
+    assert 'op_seconds_bucket{op="x",le="+Inf"} 4' in lines
+    assert 'op_seconds_count{op="x"} 4' in lines
+    assert 'op_seconds_sum{op="x"} 4.05' in lines
+    assert 'queue_depth 7' in lines
+
+
+def test_socketio_emits_record_fanout(client, sio_client):
+    from app.services.metrics.realtime import EMIT_PAYLOAD_BYTES, EMIT_RECIPIENTS, EMITS
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    sio_client.emit('join_game', {'game_code': code}, namespace='/ws')
+    before = EMITS.value(event='state_update')
+    recipients_before = EMIT_RECIPIENTS.sum(event='state_update')
+
+    client.post('/api/games/join', json={'game_code': code, 'name': 'A'})
+    assert EMITS.value(event='state_update') == before + 1
+    # The room held the one test socket
+    assert EMIT_RECIPIENTS.sum(event='state_update') == recipients_before + 1
+    assert EMIT_PAYLOAD_BYTES.sum(event='state_update') > 0
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'socketio_connected_sockets 1' in body
+    assert 'socketio_rooms 1' in body
+    assert 'socketio_emits_total{event="state_update"}' in body
@@ -0,0 +1,23 @@
+from sqlalchemy import select, text
+
+from app import db
+from app.models import Guess, Player, Story
+
+
+def _plan(stmt):
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def test_hot_queries_use_indexes(flask_app):
+    cases = [
+        (select(Story.id).where(Story.game_id == 1, Story.author_id == 2, Story.is_read.is_(False)), 'ix_story_game_author_read'),
+        (select(Guess.id).where(Guess.story_id == 1, Guess.guesser_id == 2), 'uq_guess_story_guesser'),
+        (select(Guess.id, Guess.guesser_id).where(Guess.story_id == 1), 'uq_guess_story_guesser'),
+        (select(Player.id).where(Player.game_id == 1), 'ix_player_game_id'),
+    ]
+    for stmt, index_name in cases:
+        plan = _plan(stmt)
+        assert f'USING INDEX {index_name}' in plan or f'USING COVERING INDEX {index_name}' in plan, plan
+        assert 'SCAN' not in plan.replace(f'INDEX {index_name}', ''), plan
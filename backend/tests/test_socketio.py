@@ -47,3 +47,298 @@ def test_host_disconnect_ends_session(flask_app, sio_client, client):
     assert got
 
 
+
+
+def test_state_patches_and_resync(client, sio_client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    alice = client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'}).get_json()
+
+    sio_client.get_received('/ws')  # flush
+    sio_client.emit('join_game', {'game_code': code}, namespace='/ws')
+    snapshots = [e for e in sio_client.get_received('/ws') if e['name'] == 'state_snapshot']
+    assert snapshots
+    snap = snapshots[0]['args'][0]
+    assert snap['state']['players'][0]['name'] == 'Alice'
+
+    # A mutation arrives as a patch on top of the snapshot version
+    client.post(f'/api/games/{code}/stories', json={'player_id': alice['id'], 'story': 'Once'})
+    updates = [e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_update']
+    assert len(updates) == 1
+    upd = updates[0]
+    assert upd['base_version'] == snap['version']
+    assert upd['version'] > snap['version']
+    assert upd['patch']['players'] == {
+        'upsert': [{'id': alice['id'], 'has_submitted_story': True}],
+        'remove': [],
+    }
+    assert 'status' not in upd['patch']
+
+    # Explicit resync returns the latest full snapshot
+    sio_client.emit('resync', {'game_code': code}, namespace='/ws')
+    resynced = [e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_snapshot']
+    assert resynced[0]['version'] == upd['version']
+    assert resynced[0]['state']['players'][0]['has_submitted_story'] is True
+
+
+
+def test_late_older_state_update_is_dropped(flask_app, client, sio_client):
+    from app import db
+    from app.models import Game
+    from app.services.games import state
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    sio_client.emit('join_game', {'game_code': code}, namespace='/ws')
+    client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'})
+    sio_client.get_received('/ws')  # flush
+    game = db.session.query(Game).filter_by(game_code=code).one()
+    latest = game.state_version
+
+    # An emit for an older version that lost the race reaches nobody
+    state._broadcast_state(game, latest - 1)
+    assert sio_client.get_received('/ws') == []
+    assert state._last_broadcast[game.id][0] == latest
+    sio_client.emit('resync', {'game_code': code}, namespace='/ws')
+    snap = next(e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_snapshot')
+    assert snap['version'] == latest
+
+
+def test_spectators_share_one_frame_per_state_change(flask_app, client, sio_client):
+    from app import socketio as _sio
+    from app.services.games.audience import viewer_count
+    from app.services.metrics.realtime import EMITS
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    alice = client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'}).get_json()
+    sio_client.emit('join_game', {'game_code': code}, namespace='/ws')
+    sio_client.get_received('/ws')  # flush
+
+    viewers = [_sio.test_client(flask_app, namespace='/ws') for _ in range(3)]
+    for n, viewer in enumerate(viewers, start=1):
+        viewer.emit('join_game', {'game_code': code, 'role': 'spectator'}, namespace='/ws')
+        events = viewer.get_received('/ws')
+        joined = next(e['args'][0] for e in events if e['name'] == 'joined')
+        assert joined == {'room': f'game:{code}:audience', 'role': 'spectator', 'viewers': n}
+        # Late joiners start from the current state frame
+        assert any(e['name'] == 'audience_state' for e in events)
+    assert viewer_count(code) == 3
+    # No Player rows were created
+    assert len(client.get(f'/api/games/{code}/state').get_json()['players']) == 1
+
+    frames_before = EMITS.value(event='audience_state')
+    client.post(f'/api/games/{code}/stories', json={'player_id': alice['id'], 'story': 'Once'})
+    # One broadcast for the whole audience
+    assert EMITS.value(event='audience_state') == frames_before + 1
+    body = client.get(f'/api/games/{code}/state').get_data()
+    for viewer in viewers:
+        events = viewer.get_received('/ws')
+        assert [e['name'] for e in events] == ['audience_state']
+        assert events[0]['args'][0] == body
+    # Players keep getting patches, never the audience frame
+    assert [e['name'] for e in sio_client.get_received('/ws')] == ['state_update']
+
+    viewers[0].emit('leave_game', {'game_code': code}, namespace='/ws')
+    viewers[1].disconnect(namespace='/ws')
+    assert viewer_count(code) == 1
+    viewers[2].disconnect(namespace='/ws')
+    assert viewer_count(code) == 0
+
+
+def test_owner_switching_to_spectator_releases_ownership(flask_app, client, sio_client):
+    from app import socketio as _sio
+    from app.services.games.audience import viewer_count
+    from app.socketio_events import _owner_count
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    alice = client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'}).get_json()
+    sio_client.emit('join_game', {'game_code': code, 'is_session_owner': True}, namespace='/ws')
+    owner = _sio.test_client(flask_app, namespace='/ws')
+    owner.emit('join_game', {'game_code': code, 'is_session_owner': True}, namespace='/ws')
+    assert _owner_count(code) == 2
+
+    owner.emit('join_game', {'game_code': code, 'role': 'spectator'}, namespace='/ws')
+    assert _owner_count(code) == 1
+    assert viewer_count(code) == 1
+    owner.get_received('/ws')  # flush
+    sio_client.get_received('/ws')  # flush
+
+    # Out of the players' room: frames only, no patches
+    client.post(f'/api/games/{code}/stories', json={'player_id': alice['id'], 'story': 'Once'})
+    assert [e['name'] for e in owner.get_received('/ws')] == ['audience_state']
+    assert [e['name'] for e in sio_client.get_received('/ws')] == ['state_update']
+
+    # Disconnecting as a spectator no longer touches the owner count
+    owner.disconnect(namespace='/ws')
+    assert _owner_count(code) == 1
+    assert viewer_count(code) == 0
+
+
+def test_spectator_switching_to_player_releases_viewer(flask_app, client, sio_client):
+    from app import socketio as _sio
+    from app.services.games.audience import viewer_count
+
+    code = client.post('/api/games/create').get_json()['game_code']
+    alice = client.post('/api/games/join', json={'game_code': code, 'name': 'Alice'}).get_json()
+    viewer = _sio.test_client(flask_app, namespace='/ws')
+    viewer.emit('join_game', {'game_code': code, 'role': 'spectator'}, namespace='/ws')
+    assert viewer_count(code) == 1
+
+    viewer.emit('join_game', {'game_code': code}, namespace='/ws')
+    assert viewer_count(code) == 0
+    viewer.get_received('/ws')  # flush
+
+    # Out of the audience room: patches only, no frames
+    client.post(f'/api/games/{code}/stories', json={'player_id': alice['id'], 'story': 'Once'})
+    assert [e['name'] for e in viewer.get_received('/ws')] == ['state_update']
+
+    viewer.disconnect(namespace='/ws')
+    assert viewer_count(code) == 0
+
+
+def test_state_updates_coalesce_per_room(flask_app, client, sio_client, monkeypatch):
+    from app import socketio as _sio
+    from app.services.games.state import (
+        STATE_CHANGES_PER_GAME,
+        STATE_UPDATE_EMITS_PER_GAME,
+        STATE_UPDATES,
+        forget_game,
+        room_emits,
+    )
+
+    flask_app.config['STATE_EMIT_COALESCE_MS'] = 500
+    deferred = []
+    monkeypatch.setattr(_sio, 'start_background_task', lambda fn, *args: deferred.append((fn, args)))
+    code = client.post('/api/games/create').get_json()['game_code']
+    sio_client.emit('join_game', {'game_code': code}, namespace='/ws')
+    sio_client.get_received('/ws')  # flush
+    coalesced = STATE_UPDATES.value(outcome='coalesced')
+
+    # The first change goes out at once; the rest of the burst waits for the window
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': f'P{i}'}).get_json() for i in range(5)]
+    updates = [e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_update']
+    assert len(updates) == 1
+    assert len(deferred) == 1
+    assert STATE_UPDATES.value(outcome='coalesced') == coalesced + 4
+
+    fn, args = deferred.pop()
+    fn(*args)
+    updates += [e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_update']
+    assert len(updates) == 2
+    latest = client.get(f'/api/games/{code}/state').get_json()
+    assert updates[1]['base_version'] == updates[0]['version']
+    assert updates[1]['version'] == latest['state_version']
+    assert len(updates[1]['patch']['players']['upsert']) == 4
+
+    # Stage changes are never held back, and carry the stories submitted meanwhile
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    sio_client.get_received('/ws')
+    deferred.clear()
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    started = [e['args'][0] for e in sio_client.get_received('/ws') if e['name'] == 'state_update']
+    assert started[-1]['patch']['status'] == 'in_progress'
+    assert started[-1]['version'] == client.get(f'/api/games/{code}/state').get_json()['state_version']
+    assert not deferred
+
+    # 11 changes (5 joins, 5 stories, start) went out as 3 broadcasts
+    assert room_emits[code] == [11, 3]
+    changes, emits = STATE_CHANGES_PER_GAME.sum(), STATE_UPDATE_EMITS_PER_GAME.sum()
+    forget_game(code)
+    assert STATE_CHANGES_PER_GAME.sum() == changes + 11
+    assert STATE_UPDATE_EMITS_PER_GAME.sum() == emits + 3
+    # Per-game figures are histograms, never a label per game code
+    body = client.get('/metrics').get_data(as_text=True)
+    assert code not in body
+    assert 'state_update_emits_per_game_count' in body
+
+
+def test_memory_message_queue_fans_out_across_workers():
+    import time
+    import socketio as python_socketio
+    from app.services.realtime.pubsub import create_client_manager
+
+    # Worker A holds a socket in room game:WXYZ
+    worker_a = python_socketio.Server(client_manager=create_client_manager('memory://test-fanout'), async_mode='threading')
+    delivered = []
+    worker_a._send_packet = lambda eio_sid, pkt: delivered.append((eio_sid, pkt.data))
+    worker_a._send_eio_packet = lambda eio_sid, pkt: delivered.append((eio_sid, pkt))
+    worker_a.manager.initialize()
+    sid = worker_a.manager.connect('eio-a', '/ws')
+    worker_a.manager.enter_room(sid, '/ws', 'game:WXYZ')
+
+    # Worker B emits through the same queue without owning any sockets
+    worker_b = create_client_manager('memory://test-fanout', write_only=True)
+    worker_b.emit('state_update', {'game_code': 'WXYZ', 'version': 7}, room='game:WXYZ', namespace='/ws')
+
+    deadline = time.time() + 3.0
+    while time.time() < deadline and not delivered:
+        time.sleep(0.05)
+    worker_a.manager.close()
+    assert delivered and delivered[0][0] == 'eio-a'
+
+
+def test_realtime_gateway_receives_emits_over_ipc(tmp_path):
+    import asyncio
+    import json
+    import threading
+    import time
+    from app.services.realtime.gateway import RealtimeGateway
+    from app.services.realtime.pubsub import create_client_manager
+
+    ipc_url = f"unix://{tmp_path / 'gw.sock'}"
+    gateway = RealtimeGateway(ipc_url, 'http://127.0.0.1:9', end_grace_sec=0)
+    delivered = []
+    ended = []
+
+    async def _send_eio_packet(eio_sid, eio_pkt):
+        delivered.append((eio_sid, json.loads(eio_pkt.data[eio_pkt.data.index('['):])))
+
+    gateway.sio._send_eio_packet = _send_eio_packet
+    gateway._fetch_state = lambda code: {'game_code': code, 'state_version': 3}
+    gateway._post_end_session = ended.append
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(5)
+
+    async def _start():
+        await gateway.start()
+        sid = await gateway.sio.manager.connect('eio-1', '/ws')
+        await gateway.on_join_game(sid, {'game_code': 'wxyz', 'is_session_owner': True})
+        return sid
+
+    sid = run(_start())
+    # join_game answers with `joined` and a snapshot fetched from the app
+    assert [d[1][0] for d in delivered] == ['joined', 'state_snapshot']
+    assert delivered[1][1][1]['version'] == 3
+
+    # An app worker emits through the IPC channel; the gateway fans it out
+    publisher = create_client_manager(ipc_url)
+    deadline = time.time() + 3.0
+    while time.time() < deadline and len(delivered) < 3:
+        publisher.emit('state_update', {'game_code': 'WXYZ', 'version': 4}, room='game:WXYZ', namespace='/ws')
+        time.sleep(0.1)
+    assert delivered[2] == ('eio-1', ['state_update', {'game_code': 'WXYZ', 'version': 4}])
+
+    # The last owner leaving ends the session through the app
+    run(gateway.on_disconnect(sid))
+    deadline = time.time() + 3.0
+    while time.time() < deadline and not ended:
+        time.sleep(0.05)
+    assert ended == ['WXYZ']
+    publisher.close()
+    run(gateway.manager.close())
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_gateway_end_session_requires_token(flask_app, client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    assert client.post(f'/api/games/{code}/session/end').status_code == 404
+    flask_app.config['REALTIME_GATEWAY_TOKEN'] = 'secret'
+    res = client.post(f'/api/games/{code}/session/end', headers={'X-Gateway-Token': 'wrong'})
+    assert res.status_code == 404
+    res = client.post(f'/api/games/{code}/session/end', headers={'X-Gateway-Token': 'secret'})
+    assert res.status_code == 200
+    assert client.get(f'/api/games/{code}/state').status_code == 404
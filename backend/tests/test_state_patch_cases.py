@@ -0,0 +1,20 @@
+import json
+import os
+import sys
+
+import pytest
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CASES_PATH = os.path.join(BACKEND_ROOT, '..', 'shared', 'state_patch_cases.json')
+sys.path.insert(0, os.path.join(BACKEND_ROOT, 'benchmarks'))
+
+from load_games import apply_state_update  # noqa: E402
+
+with open(CASES_PATH) as fh:
+    CASES = json.load(fh)
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['name'] for case in CASES])
+def test_apply_state_update_matches_shared_cases(case):
+    # The frontend and electron clients run the same cases (shared/)
+    assert apply_state_update(case['current'], case['message']) == case['expected']
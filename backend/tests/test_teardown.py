@@ -0,0 +1,86 @@
+import time
+
+
+def _played_game(client, names=('A', 'B', 'C')):
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in names]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    controller_id = min(p['id'] for p in players)
+    client.post(f'/api/games/{code}/start', json={'controller_id': controller_id})
+    adv = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}).get_json()
+    author_id = adv['play_order'][0]
+    for p in players:
+        if p['id'] != author_id:
+            client.post(f'/api/games/{code}/guess', json={'guesser_id': p['id'], 'guessed_player_id': author_id})
+    client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id})
+    return code, players
+
+
+def _row_counts():
+    from app import db
+    from app.models import Game, Guess, Player, RoundGuess, RoundResult, Story
+    return {m.__tablename__: db.session.query(m).count() for m in (Game, Player, Story, Guess, RoundResult, RoundGuess)}
+
+
+def test_delete_games_cascades_in_one_statement(flask_app, client):
+    from app.models import Game
+    from app.services.games.teardown import delete_games
+
+    code, _players = _played_game(client)
+    keep, _ = _played_game(client, names=('X', 'Y'))
+    game = Game.query.filter_by(game_code=code).first()
+    counts = delete_games([(game.id, game.game_code, game.current_story_id)])
+    assert counts == {'players': 3, 'stories': 3, 'guesses': 2, 'round_results': 1, 'games': 1}
+    # Only the other game's rows are left
+    assert _row_counts() == {'game': 1, 'player': 2, 'story': 2, 'guess': 1, 'round_result': 1, 'round_guess': 1}
+    assert client.get(f'/api/games/{code}/state').status_code == 404
+    assert client.get(f'/api/games/{keep}/state').status_code == 200
+
+
+def test_reaper_deletes_finished_and_idle_games_in_batches(flask_app, client):
+    from app import db
+    from app.models import Game
+    from app.services.games.teardown import REAPER_ROWS, REAPER_RUNS, reap_dead_games
+
+    now = time.time()
+    finished, _ = _played_game(client)
+    idle = client.post('/api/games/create').get_json()['game_code']
+    fresh = client.post('/api/games/create').get_json()['game_code']
+    Game.query.filter_by(game_code=finished).update({'status': 'finished', 'updated_at': now - 7200})
+    Game.query.filter_by(game_code=idle).update({'updated_at': now - 86400})
+    db.session.commit()
+
+    flask_app.config['GAME_REAP_BATCH_SIZE'] = 1
+    runs = REAPER_RUNS.value()
+    reclaimed = {table: REAPER_ROWS.value(table=table) for table in ('game', 'player', 'guess')}
+    totals = reap_dead_games(flask_app, now=now)
+    assert totals['games'] == 2
+    assert totals['players'] == 3
+    assert totals['guesses'] == 2
+    assert [g.game_code for g in Game.query.all()] == [fresh]
+
+    # The reclaimed rows are reported on /metrics
+    body = client.get('/metrics').get_data(as_text=True)
+    assert f'reaper_runs_total {runs + 1:g}' in body
+    assert f'reaper_rows_reclaimed_total{{table="game"}} {reclaimed["game"] + 2:g}' in body
+    assert f'reaper_rows_reclaimed_total{{table="player"}} {reclaimed["player"] + 3:g}' in body
+    assert f'reaper_rows_reclaimed_total{{table="guess"}} {reclaimed["guess"] + 2:g}' in body
+    assert '# TYPE reaper_last_run_duration_seconds gauge' in body
+
+
+def test_replay_reset_clears_round_rows(flask_app, client):
+    code, players = _played_game(client, names=('A', 'B'))
+    controller_id = min(p['id'] for p in players)
+    # Play the second round out
+    state = client.get(f'/api/games/{code}/state').get_json()
+    while state['status'] != 'finished':
+        state = client.post(f'/api/games/{code}/advance', json={'controller_id': controller_id}).get_json()
+    for p in players:
+        client.post(f'/api/games/{code}/replay/vote', json={'player_id': p['id']})
+    res = client.post(f'/api/games/{code}/replay/start', json={'controller_id': controller_id})
+    assert res.status_code == 200
+    state = client.get(f'/api/games/{code}/state').get_json()
+    assert state['status'] == 'lobby'
+    assert all(p['score'] == 0 and not p['has_submitted_story'] for p in state['players'])
+    assert _row_counts() == {'game': 1, 'player': 2, 'story': 0, 'guess': 0, 'round_result': 0, 'round_guess': 0}
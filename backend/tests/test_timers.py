@@ -0,0 +1,217 @@
+import threading
+import time
+
+from app.services.games.timers import TimerScheduler
+
+
+def test_timer_scheduler_replace_cancel_and_batch():
+    sched = TimerScheduler(tick=0.05)
+    fired = []
+    sched.schedule(1, 10.0, fired.append, 'game1-intro')
+    sched.schedule(2, 10.02, fired.append, 'game2')
+    # Re-arming a key replaces its pending timer
+    sched.schedule(1, 12.0, fired.append, 'game1-guessing')
+    sched.schedule(3, 11.0, fired.append, 'game3')
+    assert sched.cancel(3)
+    assert not sched.cancel(3)
+    assert sched.pending() == 2
+    assert sched.next_deadline() == 10.02
+
+    assert sched.run_due(now=9.9) == 0
+    # Everything due by the same tick fires together, in deadline order
+    assert sched.run_due(now=12.0) == 2
+    assert fired == ['game2', 'game1-guessing']
+    assert sched.pending() == 0
+
+
+def test_timer_scheduler_loop_wakes_for_earlier_deadline():
+    sched = TimerScheduler(tick=0.01)
+    done = threading.Event()
+
+    def spawn(fn, *args):
+        t = threading.Thread(target=fn, args=args, daemon=True)
+        t.start()
+        return t
+
+    sched.schedule('late', time.time() + 60, lambda: None)
+    sched.ensure_started(spawn)
+    # Inserting an earlier deadline must wake the sleeping loop
+    sched.schedule('soon', time.time() + 0.05, done.set)
+    assert done.wait(2.0)
+    assert sched.pending() == 1
+
+
+def _start_game(client):
+    code = client.post('/api/games/create').get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in ('A', 'B')]
+    for p in players:
+        client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': 's'})
+    controller_id = min(p['id'] for p in players)
+    return client.post(f'/api/games/{code}/start', json={'controller_id': controller_id}).get_json()
+
+
+def test_rehydrate_arms_future_and_fires_overdue(flask_app, client):
+    from app import db
+    from app.models import Game
+    from app.services.games.scheduler import rehydrate_stage_timers, stage_timers
+
+    overdue = _start_game(client)
+    future = _start_game(client)
+    db.session.get(Game, overdue['id']).stage_deadline = time.time() - 5
+    db.session.get(Game, future['id']).stage_deadline = time.time() + 3600
+    db.session.commit()
+
+    stage_timers.clear()
+    try:
+        result = rehydrate_stage_timers(flask_app, spawn=lambda fn, *args: fn(*args))
+        assert result == {'armed': 1, 'overdue': 1}
+        assert stage_timers.pending_tag(future['id'])[0] == 'round_intro'
+        assert stage_timers.pending_tag(overdue['id']) is None
+        state = client.get(f"/api/games/{overdue['game_code']}/state").get_json()
+        assert state['stage'] == 'guessing'
+    finally:
+        stage_timers.clear()
+
+
+def test_rehydrated_timers_expect_the_current_story(flask_app, client, monkeypatch):
+    from app import db
+    from app.models import Game
+    from app.services.games import scheduler
+
+    overdue = _start_game(client)
+    future = _start_game(client)
+    db.session.get(Game, overdue['id']).stage_deadline = time.time() - 5
+    db.session.get(Game, future['id']).stage_deadline = time.time() + 3600
+    db.session.commit()
+
+    fired = []
+    monkeypatch.setattr(scheduler, '_fire_stage_timer', lambda app, *args: fired.append(args))
+    scheduler.stage_timers.clear()
+    try:
+        scheduler.rehydrate_stage_timers(flask_app, spawn=lambda fn, *args: fn(*args))
+        scheduler.stage_timers.run_due(now=time.time() + 7200)
+    finally:
+        scheduler.stage_timers.clear()
+    # Both paths carry the story, so a stale fire cannot claim the next one's stage
+    assert sorted(fired) == sorted(
+        (g['id'], 'round_intro', 1, g['current_story']['id']) for g in (overdue, future)
+    )
+
+
+def test_rehydrate_skips_only_while_another_instance_holds_the_lock(flask_app, client):
+    from app import db
+    from app.models import Game
+    from app.services.games.scheduler import rehydrate_stage_timers, stage_timers
+    from app.services.realtime.store import get_store
+
+    game = _start_game(client)
+    db.session.get(Game, game['id']).stage_deadline = time.time() + 3600
+    db.session.commit()
+
+    stage_timers.clear()
+    try:
+        assert rehydrate_stage_timers(flask_app)['armed'] == 1
+        # The lock was released: a restart right after still arms the timers
+        stage_timers.clear()
+        assert rehydrate_stage_timers(flask_app)['armed'] == 1
+        assert stage_timers.pending_tag(game['id'])[0] == 'round_intro'
+
+        # Another instance rehydrating meanwhile leaves the timers to it
+        stage_timers.clear()
+        assert get_store().acquire('timer_rehydrate', 60)
+        try:
+            assert rehydrate_stage_timers(flask_app)['skipped']
+            assert stage_timers.pending_tag(game['id']) is None
+        finally:
+            get_store().delete('timer_rehydrate')
+    finally:
+        stage_timers.clear()
+
+
+def test_stage_transition_applies_once_when_fired_twice(flask_app, client):
+    from app.services.games.scheduler import _fire_stage_timer
+
+    game = _start_game(client)
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1)
+    _fire_stage_timer(flask_app, game['id'], 'guessing', 1)
+    state = client.get(f"/api/games/{game['game_code']}/state").get_json()
+    # A duplicate fire for the same stage is a no-op: no second scoring pass
+    _fire_stage_timer(flask_app, game['id'], 'guessing', 1)
+    again = client.get(f"/api/games/{game['game_code']}/state").get_json()
+    assert state['stage'] == 'scoreboard'
+    assert again['state_version'] == state['state_version']
+    assert [p['score'] for p in again['players']] == [p['score'] for p in state['players']]
+    assert len(again['round_history']) == 1
+
+
+def test_stage_transition_claim_rejects_stale_game(flask_app, client):
+    from app import db
+    from app.models import Game
+    from app.services.games.transitions import advance_stage
+
+    game = _start_game(client)
+    controller_id = min(p['id'] for p in game['players'])
+    client.post(f"/api/games/{game['game_code']}/advance", json={'controller_id': controller_id})
+    stale = db.session.get(Game, game['id'])
+    assert stale.stage == 'guessing'
+    # Another worker (here: the controller) wins the guessing transition first
+    client.post(f"/api/games/{game['game_code']}/advance", json={'controller_id': controller_id})
+    assert advance_stage(flask_app, stale, 'guessing', 1) is False
+    assert len(client.get(f"/api/games/{game['game_code']}/rounds").get_json()['rounds']) == 1
+
+
+def test_stale_timer_for_previous_story_does_not_advance(flask_app, client):
+    from app.services.games.scheduler import _fire_stage_timer
+
+    code = client.post('/api/games/create', json={'stories_per_player': 2}).get_json()['game_code']
+    players = [client.post('/api/games/join', json={'game_code': code, 'name': n}).get_json() for n in ('A', 'B')]
+    for p in players:
+        for story in ('one', 'two'):
+            client.post(f'/api/games/{code}/stories', json={'player_id': p['id'], 'story': story})
+    game = client.post(f'/api/games/{code}/start', json={'controller_id': min(p['id'] for p in players)}).get_json()
+    first_story = game['current_story']['id']
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1, first_story)
+    _fire_stage_timer(flask_app, game['id'], 'guessing', 1, first_story)
+    state = client.get(f'/api/games/{code}/state').get_json()
+    # Same round, same stage, the author's next story
+    assert (state['stage'], state['current_round']) == ('round_intro', 1)
+    assert state['current_story']['id'] != first_story
+
+    # A late round_intro timer armed for the first story is stale
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1, first_story)
+    again = client.get(f'/api/games/{code}/state').get_json()
+    assert again['stage'] == 'round_intro'
+    assert again['state_version'] == state['state_version']
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1, state['current_story']['id'])
+    assert client.get(f'/api/games/{code}/state').get_json()['stage'] == 'guessing'
+
+
+def test_stage_timer_metrics(flask_app, client):
+    from app import db
+    from app.models import Game
+    from app.services.games.scheduler import (
+        TIMER_FIRE_LAG, TIMER_FIRES, TIMER_TRANSITION_SECONDS, _fire_stage_timer,
+    )
+
+    game = _start_game(client)
+    db.session.get(Game, game['id']).stage_deadline = time.time() - 0.5
+    db.session.commit()
+    lag_count = TIMER_FIRE_LAG.count(stage='round_intro')
+    lag_sum = TIMER_FIRE_LAG.sum(stage='round_intro')
+    advanced = TIMER_FIRES.value(stage='round_intro', outcome='advanced')
+    mismatched = TIMER_FIRES.value(stage='round_intro', outcome='mismatch')
+
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1)
+    # Fired half a second after the deadline
+    assert TIMER_FIRE_LAG.count(stage='round_intro') == lag_count + 1
+    assert TIMER_FIRE_LAG.sum(stage='round_intro') - lag_sum >= 0.5
+    assert TIMER_FIRES.value(stage='round_intro', outcome='advanced') == advanced + 1
+    assert TIMER_TRANSITION_SECONDS.count(stage='round_intro') >= 1
+
+    # A stale timer for the stage already left counts as a mismatch
+    _fire_stage_timer(flask_app, game['id'], 'round_intro', 1)
+    assert TIMER_FIRES.value(stage='round_intro', outcome='mismatch') == mismatched + 1
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'stage_timers_pending ' in body
+    assert 'stage_timer_fire_lag_seconds_bucket{stage="round_intro",le="1"}' in body
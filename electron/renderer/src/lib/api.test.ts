@@ -0,0 +1,14 @@
+// Run with `npm test` (node's built-in test runner through tsx).
+import assert from 'node:assert/strict';
+import { test } from 'node:test';
+
+import cases from '../../../../shared/state_patch_cases.json';
+import { applyStateUpdate, type GameState, type StateUpdateMessage } from './api';
+
+// Shared with the backend and frontend clients, which run the same cases
+for (const c of cases) {
+    test(`applyStateUpdate: ${c.name}`, () => {
+        const actual = applyStateUpdate(c.current as GameState | null, c.message as StateUpdateMessage);
+        assert.deepStrictEqual(actual, c.expected);
+    });
+}
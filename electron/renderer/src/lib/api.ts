@@ -34,6 +34,7 @@ export type GameState = {
     current_story_guess_count?: number;
     durations?: { round_intro?: number; guessing?: number; scoreboard?: number };
     stage_deadline?: number; // unix timestamp seconds
+    state_version?: number;
     round_history?: Array<{
         round: number;
         story_id: number;
@@ -57,3 +58,28 @@ export async function getGameState(gameCode: string): Promise<GameState> {
 }
 
 
+
+export type StateUpdateMessage = {
+    game_code: string;
+    version: number;
+    base_version?: number;
+    patch?: Partial<GameState> & { players?: { upsert: Partial<Player>[]; remove: number[] } };
+    state?: GameState;
+};
+
+// Apply a `state_update` socket message; null means a version gap (resync needed).
+export function applyStateUpdate(current: GameState | null, message: StateUpdateMessage): GameState | null {
+    if (message.state) return message.state;
+    if (!current || current.state_version !== message.base_version) return null;
+    const { players: playersPatch, ...fields } = message.patch || {};
+    const next = { ...current, ...fields } as GameState;
+    if (playersPatch) {
+        const removed = new Set(playersPatch.remove || []);
+        const byId = new Map(current.players.filter((p) => !removed.has(p.id)).map((p) => [p.id, p] as [number, Player]));
+        for (const p of playersPatch.upsert || []) {
+            byId.set(p.id as number, { ...(byId.get(p.id as number) || {}), ...p } as Player);
+        }
+        next.players = Array.from(byId.values());
+    }
+    return next;
+}
@@ -1,7 +1,7 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Container, Title, Text, Group, Badge, Button, Stack, Paper, Divider, CopyButton, Tooltip, ActionIcon, List, Select, NumberInput } from '@mantine/core';
 import { io, Socket } from 'socket.io-client';
-import { createGame, getGameState, type GameState } from '../lib/api';
+import { applyStateUpdate, createGame, getGameState, type GameState, type StateUpdateMessage } from '../lib/api';
 import RoundIntro from './stages/RoundIntro';
 import Guessing from './stages/Guessing';
 import Scoreboard from './stages/Scoreboard';
@@ -14,6 +14,8 @@ export function App() {
     const [gameCode, setGameCode] = useState<string>(() => localStorage.getItem('game_code') || '');
     const [creating, setCreating] = useState(false);
     const [state, setState] = useState<GameState | null>(null);
+    // Latest state, readable synchronously when applying socket patches
+    const stateRef = useRef<GameState | null>(null);
     const [deadline, setDeadline] = useState<number | null>(null);
     const [nowTs, setNowTs] = useState<number>(Date.now());
     const [apiError, setApiError] = useState<string | null>(null);
@@ -30,25 +32,34 @@ export function App() {
             if (gameCode) s.emit('join_game', { game_code: gameCode, is_session_owner: true });
         });
         s.on('joined', (m: any) => setRoom(m?.room ?? ''));
-        s.on('state_update', async () => {
-            if (gameCode) {
-                try {
-                    const st = await getGameState(gameCode);
-                    setState(st);
-                    try {
-                        if ((st as any)?.stage_deadline) {
-                            setDeadline(Math.floor((st as any).stage_deadline * 1000));
-                        } else {
-                            setDeadline(Date.now() + ((st?.durations?.[st?.stage as any] || 0) * 1000));
-                        }
-                    } catch { }
-                } catch { /* ignore */ }
+        const applyState = (st: GameState) => {
+            stateRef.current = st;
+            setState(st);
+            try {
+                if ((st as any)?.stage_deadline) {
+                    setDeadline(Math.floor((st as any).stage_deadline * 1000));
+                } else {
+                    setDeadline(Date.now() + ((st?.durations?.[st?.stage as any] || 0) * 1000));
+                }
+            } catch { }
+        };
+        s.on('state_snapshot', (m: any) => {
+            if (m?.state) applyState(m.state);
+        });
+        s.on('state_update', (m: StateUpdateMessage) => {
+            // Server pushes versioned patches; on a gap ask for a full snapshot
+            const next = applyStateUpdate(stateRef.current, m);
+            if (!next) {
+                s.emit('resync', { game_code: gameCode });
+                return;
             }
+            applyState(next);
         });
         s.on('session_ended', () => {
             // If we receive this as host, reset UI to Start Game
             localStorage.removeItem('game_code');
             setGameCode('');
+            stateRef.current = null;
             setState(null);
             setRoom('');
         });
@@ -74,7 +85,9 @@ export function App() {
     useEffect(() => {
         if (!gameCode) return;
         localStorage.setItem('game_code', gameCode);
-        getGameState(gameCode).then(setState).catch(() => setState(null));
+        getGameState(gameCode)
+            .then((st) => { stateRef.current = st; setState(st); })
+            .catch(() => { stateRef.current = null; setState(null); });
     }, [gameCode]);
 
     const handleCreate = async () => {
@@ -96,6 +109,7 @@ export function App() {
         } catch { }
         localStorage.removeItem('game_code');
         setGameCode('');
+        stateRef.current = null;
         setState(null);
         setRoom('');
     };
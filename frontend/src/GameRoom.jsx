@@ -22,6 +22,8 @@ export function GameRoom() {
     const [error, setError] = useState('');
     const [loading, setLoading] = useState(false);
     const socketRef = useRef(null);
+    // Latest state, readable synchronously when applying socket patches
+    const gameRef = useRef(null);
 
     // Attempt to get player ID from session storage
     const [playerId, setPlayerId] = useState(() => sessionStorage.getItem(`player_id_${gameCode}`));
@@ -30,6 +32,7 @@ export function GameRoom() {
         const fetchGameState = async () => {
             try {
                 const gameState = await api.getGameState(gameCode);
+                gameRef.current = gameState;
                 setGame(gameState);
                 // initialize deadline from server if present
                 try {
@@ -59,21 +62,29 @@ export function GameRoom() {
         socket.on('connect', () => {
             socket.emit('join_game', { game_code: gameCode });
         });
-        socket.on('state_update', async () => {
+        const applyState = (next) => {
+            gameRef.current = next;
+            setGame(next);
+            // prefer server deadline when available, else fallback to durations map
             try {
-                const updated = await api.getGameState(gameCode);
-                setGame(updated);
-                // prefer server deadline when available, else fallback to durations map
-                try {
-                    if (updated?.stage_deadline) {
-                        setDeadline(Math.floor(updated.stage_deadline * 1000));
-                    } else {
-                        setDeadline(Date.now() + ((updated?.durations?.[updated?.stage] || 0) * 1000));
-                    }
-                } catch { }
-            } catch (e) {
-                console.error('Failed to refresh state after socket update', e);
+                if (next?.stage_deadline) {
+                    setDeadline(Math.floor(next.stage_deadline * 1000));
+                } else {
+                    setDeadline(Date.now() + ((next?.durations?.[next?.stage] || 0) * 1000));
+                }
+            } catch { }
+        };
+        socket.on('state_snapshot', (m) => {
+            if (m?.state) applyState(m.state);
+        });
+        socket.on('state_update', (m) => {
+            // Server pushes versioned patches; on a gap ask for a full snapshot
+            const next = api.applyStateUpdate(gameRef.current, m);
+            if (!next) {
+                socket.emit('resync', { game_code: gameCode });
+                return;
             }
+            applyState(next);
         });
         socket.on('session_ended', () => {
             setError('Session ended');
@@ -118,6 +129,7 @@ export function GameRoom() {
             setPlayerId(newPlayer.id);
             // Immediately fetch game state to reflect the new player
             const gameState = await api.getGameState(gameCode);
+            gameRef.current = gameState;
             setGame(gameState);
         } catch (err) {
             console.error("Failed to join game:", err);
@@ -223,6 +235,7 @@ export function GameRoom() {
                                 setError('');
                                 await api.startGame(gameCode, currentPlayer.id);
                                 const updated = await api.getGameState(gameCode);
+                                gameRef.current = updated;
                                 setGame(updated);
                             } catch (e) {
                                 setError(e.message || 'Could not start game');
@@ -261,6 +274,7 @@ export function GameRoom() {
                                     try {
                                         await api.advanceRound(gameCode, currentPlayer.id);
                                         const updated = await api.getGameState(gameCode);
+                                        gameRef.current = updated;
                                         setGame(updated);
                                     } catch (e) {
                                         setError(e.message || 'Could not advance');
@@ -1,4 +1,4 @@
-const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000';
+const API_URL = import.meta.env?.VITE_API_URL || 'http://localhost:5000';
 
 async function request(endpoint, options = {}) {
     const response = await fetch(`${API_URL}${endpoint}`, {
@@ -94,4 +94,23 @@ export const startReplay = (game_code, controller_id) => {
         method: 'POST',
         body: JSON.stringify({ controller_id }),
     });
-};
\ No newline at end of file
+};
+// Apply a `state_update` socket message to the current state.
+// Returns the next state, or null when the message does not build on
+// `current` (version gap) and the caller should request a resync.
+export const applyStateUpdate = (current, message) => {
+    if (!message) return null;
+    if (message.state) return message.state;
+    if (!current || current.state_version !== message.base_version) return null;
+    const { players: playersPatch, ...fields } = message.patch || {};
+    const next = { ...current, ...fields };
+    if (playersPatch) {
+        const removed = new Set(playersPatch.remove || []);
+        const byId = new Map((current.players || []).filter((p) => !removed.has(p.id)).map((p) => [p.id, p]));
+        for (const p of playersPatch.upsert || []) {
+            byId.set(p.id, { ...(byId.get(p.id) || {}), ...p });
+        }
+        next.players = Array.from(byId.values());
+    }
+    return next;
+};
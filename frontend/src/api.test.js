@@ -0,0 +1,15 @@
+// Run with `npm test` (node's built-in test runner).
+import assert from 'node:assert/strict';
+import { readFileSync } from 'node:fs';
+import { test } from 'node:test';
+
+import { applyStateUpdate } from './api.js';
+
+// Shared with the backend and electron clients, which run the same cases
+const cases = JSON.parse(readFileSync(new URL('../../shared/state_patch_cases.json', import.meta.url), 'utf8'));
+
+for (const c of cases) {
+    test(`applyStateUpdate: ${c.name}`, () => {
+        assert.deepStrictEqual(applyStateUpdate(c.current, c.message), c.expected);
+    });
+}